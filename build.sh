@@ -8,6 +8,12 @@ pip install -r requirements.txt
 echo "Running migrations..."
 python manage.py migrate
 
+echo "Creating cache table (CACHE_BACKEND=db, the default with several workers)..."
+python manage.py createcachetable
+
+echo "Backfilling sales facts (only sales that have none)..."
+python manage.py backfill_sales_facts
+
 echo "Collecting static files..."
 python manage.py collectstatic --no-input
 
@@ -0,0 +1,109 @@
+"""
+Gunicorn configuration for the Render deployment.
+
+    gunicorn -c gunicorn.conf.py helmet_inventory.wsgi:application
+
+The free plan spins the service down when idle, so every wake-up is a
+cold start. The application and its URLconf are imported once in the
+master (preload_app) and shared by the forked workers. Each worker then
+compiles the templates and connects to the database before it takes
+traffic. Boot logs the import time, the warm-up time and each worker's
+first-request latency.
+"""
+
+import os
+import shutil
+import time
+
+CONFIG_LOADED = time.perf_counter()
+
+
+def env_int(name, default):
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+# =========================
+# SERVER
+# =========================
+
+bind = f"0.0.0.0:{os.getenv('PORT', '10000')}"
+
+# WSGI with threads: each thread keeps its database connection between
+# requests (CONN_MAX_AGE), so a sale or checkout POST does not open a new
+# TLS connection to Postgres. The async dashboards still gather their
+# aggregates concurrently (Django runs them in an event loop per request).
+# "uvicorn.workers.UvicornWorker" serves helmet_inventory.asgi instead,
+# but connections are then not reused between requests.
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+
+# The free instance has 512 MB and a fraction of a CPU: two workers by default
+workers = env_int("WEB_CONCURRENCY", 2)
+# Read by settings.py (loaded after this file): several workers need a
+# cache they all share (CACHE_BACKEND "db" by default)
+os.environ["WEB_CONCURRENCY"] = str(workers)
+# Request threads per worker (gthread)
+threads = env_int("GUNICORN_THREADS", 4)
+
+# Import Django and the app once, before forking
+preload_app = True
+
+# Room for the warm-up and a slow first database connection
+timeout = env_int("GUNICORN_TIMEOUT", 60)
+graceful_timeout = env_int("GUNICORN_GRACEFUL_TIMEOUT", 30)
+keepalive = env_int("GUNICORN_KEEPALIVE", 5)
+
+accesslog = os.getenv("GUNICORN_ACCESS_LOG", "-")
+errorlog = "-"
+loglevel = os.getenv("GUNICORN_LOG_LEVEL", "info")
+
+
+# =========================
+# HOOKS
+# =========================
+
+def on_starting(server):
+    # Django imports the URLconf, and so every view module, on the first
+    # request; do it here so the forked workers inherit it
+    from inventory.warmup import load_urls
+    load_urls()
+    server.log.info("Application imported in %.2f s (preloaded)", time.perf_counter() - CONFIG_LOADED)
+
+    # Metrics files of a previous run belong to processes that no longer
+    # exist; start the counters from zero rather than merging them forever.
+    from django.conf import settings
+    if settings.METRICS_DIR:
+        shutil.rmtree(settings.METRICS_DIR, ignore_errors=True)
+
+
+def pre_fork(server, worker):
+    # Nothing may hold a connection across fork: children would share the socket
+    from django.db import connections
+    connections.close_all()
+
+
+def post_fork(server, worker):
+    from inventory.warmup import warm_up, report_first_request
+
+    booted_at = time.perf_counter()
+    # Only the sync worker serves requests on this (the main) thread;
+    # gthread and uvicorn open connections on their request threads
+    single_threaded = worker.cfg.worker_class_str == 'sync'
+    try:
+        timings = warm_up(keep_connections=single_threaded)
+    except Exception:
+        # A database that is still waking up must not stop the worker
+        worker.log.exception("Warm-up failed; the first request will pay for it")
+    else:
+        worker.log.info(
+            "Worker %s warmed up: URLs in %.0f ms, %d templates in %.0f ms, %d database(s) in %.0f ms",
+            worker.pid,
+            timings['urls_seconds'] * 1000,
+            timings['templates'], timings['templates_seconds'] * 1000,
+            timings['databases'], timings['database_seconds'] * 1000,
+        )
+    report_first_request(worker.log.info, booted_at)
+
+
+def when_ready(server):
+    server.log.info("Ready to serve %.2f s after the configuration was loaded", time.perf_counter() - CONFIG_LOADED)
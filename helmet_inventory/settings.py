@@ -5,7 +5,9 @@ Django settings for helmet_inventory project.
 from pathlib import Path
 from dotenv import load_dotenv
 import os
+import tempfile
 import dj_database_url
+from django.core.exceptions import ImproperlyConfigured
 
 # Load environment variables from .env (local) or Render env vars
 load_dotenv()
@@ -53,6 +55,13 @@ INSTALLED_APPS = [
 # =========================
 
 MIDDLEWARE = [
+    # Per-view latency / query metrics (first, so it times everything below)
+    "inventory.metrics.MetricsMiddleware",
+    # Sampled cProfile/pyinstrument capture (inactive unless PROFILE_SAMPLE_RATE > 0)
+    "inventory.instrumentation.ProfilingMiddleware",
+    # N+1 / query budget checks (inactive unless QUERY_CHECK is "warn" or "strict")
+    "inventory.querycheck.QueryCheckMiddleware",
+
     "django.middleware.security.SecurityMiddleware",
 
     # Whitenoise for Render static files
@@ -122,6 +131,146 @@ else:
         }
     }
 
+# Optional read-only copy (replica or snapshot) for dashboards, exports
+# and reports; see inventory/routers.py. Locally, e.g.
+# REPORTING_DATABASE_URL=sqlite:///reporting.sqlite3 kept in sync by
+# "python manage.py sync_reporting_db --interval 5". Only used with a
+# shared cache (CACHE_BACKEND "db" or "file"), which holds the last-write
+# time its staleness guard checks.
+REPORTING_DATABASE_URL = os.getenv("REPORTING_DATABASE_URL", "")
+if REPORTING_DATABASE_URL:
+    DATABASES["reporting"] = dj_database_url.parse(
+        REPORTING_DATABASE_URL,
+        conn_max_age=600,
+        conn_health_checks=True,
+        ssl_require=not REPORTING_DATABASE_URL.startswith("sqlite"),
+        # Tests use one database: "reporting" is the same connection as "default"
+        test_options={"MIRROR": "default"},
+    )
+
+DATABASE_ROUTERS = ["inventory.routers.ReportingRouter"]
+
+# Reads stay on the primary for this many seconds after any write,
+# i.e. the replication lag the reporting copy is allowed to have
+REPORTING_MAX_LAG = float(os.getenv("REPORTING_MAX_LAG", "10"))
+
+
+# =========================
+# CACHE
+# =========================
+
+# Dashboard / bank summaries are cached under versioned keys (inventory/cache.py).
+# CACHE_BACKEND: "locmem" (per process), "file" (per machine) or "db" (shared).
+# Besides the payloads the cache holds the version counters and last-write
+# times (stored without a timeout) that invalidate them, the product API's
+# ETags and the reporting database's staleness guard. Every process must
+# see the same ones: with "locmem" a write handled by one gunicorn worker
+# is never seen by the others. So "db" is the default whenever several
+# workers run (WEB_CONCURRENCY, exported by gunicorn.conf.py); "locmem"
+# is for a single process (runserver). With "db" and "file" the version
+# counters are kept in the inventory_cacheversion table instead, as those
+# backends cannot increment atomically.
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY") or 1)
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "db" if WEB_CONCURRENCY > 1 else "locmem")
+
+if CACHE_BACKEND == "file":
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": os.getenv("CACHE_LOCATION", "/tmp/helmet_inventory_cache"),
+        }
+    }
+elif CACHE_BACKEND == "db":
+    # Requires: python manage.py createcachetable (run by build.sh)
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+            "LOCATION": os.getenv("CACHE_LOCATION", "inventory_cache"),
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "helmet-inventory",
+        }
+    }
+    if WEB_CONCURRENCY > 1:
+        # Each worker would keep its own versions: stale dashboards, and
+        # ETags that differ per worker and answer 304 for changed stock
+        raise ImproperlyConfigured(
+            f"CACHE_BACKEND=locmem is per process but WEB_CONCURRENCY={WEB_CONCURRENCY}; use \"db\" or \"file\""
+        )
+
+# Seconds a cached summary may live
+INVENTORY_CACHE_TIMEOUT = int(os.getenv("CACHE_TIMEOUT", "300"))
+
+
+# =========================
+# METRICS
+# =========================
+
+# Each worker writes its numbers here; /metrics merges them.
+# Empty = report only the worker that answers the scrape.
+METRICS_DIR = os.getenv("METRICS_DIR", os.path.join(tempfile.gettempdir(), "helmet-inventory-metrics"))
+METRICS_FLUSH_SECONDS = float(os.getenv("METRICS_FLUSH_SECONDS", "5"))
+
+# Lets Prometheus scrape /metrics with "Authorization: Bearer <token>"
+# (logged-in users can always open it)
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+# Time every signal receiver and count its queries (see
+# inventory/instrumentation.py). Read once at startup; off, the receivers
+# run unwrapped.
+SIGNAL_METRICS = os.getenv("SIGNAL_METRICS", "False") == "True"
+
+# Fraction of requests to profile (0 = off, 0.01 = one in a hundred)
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(tempfile.gettempdir(), "helmet-inventory-profiles"))
+# "cprofile" or "pyinstrument" (if installed)
+PROFILER = os.getenv("PROFILER", "cprofile")
+
+
+# =========================
+# BACKGROUND JOBS
+# =========================
+
+# A job still "running" after this many seconds is assumed orphaned
+# by a dead worker and requeued when a worker starts
+JOB_STALE_AFTER = int(os.getenv("JOB_STALE_AFTER", "3600"))
+
+
+# =========================
+# QUERY CHECKS
+# =========================
+
+# "off", "warn" (log) or "strict" (raise): run staging and tests with strict
+QUERY_CHECK = os.getenv("QUERY_CHECK", "warn" if DEBUG else "off")
+# The same query this many times in one request is reported as an N+1
+QUERY_CHECK_THRESHOLD = int(os.getenv("QUERY_CHECK_THRESHOLD", "5"))
+
+# Maximum queries per request, by URL name (session and user lookups included)
+QUERY_BUDGETS = {
+    "dashboard": 10,
+    "bank_dashboard": 6,
+    "historical_sales_list": 6,
+    "product_list": 4,
+    "add_sale": 20,
+    "add_stock": 20,
+    "checkout": 30,
+    "receive_delivery": 20,
+    "reorder_plan": 6,
+    "profit_and_loss": 6,
+    "api_products": 6,
+    "api_bank_accounts": 6,
+    "match_bank_statement": 8,
+    "healthz": 0,
+}
+
+# Views that run the same statements once per submitted item by design
+# (only their budget, if any, is checked)
+QUERY_CHECK_BATCH_VIEWS = {"api_sync_sales"}
+
 
 # =========================
 # PASSWORD VALIDATION
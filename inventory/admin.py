@@ -1,6 +1,43 @@
-from django.contrib import admin
-from .models import Product
+from django.contrib import admin, messages
+from django.http import HttpResponseRedirect
+from .forms import SaleForm
+from .models import Product, StockOut
+from .services import InsufficientStock
 admin.site.register(Product)
 
 
+class StockOutAdminForm(SaleForm):
+    class Meta(SaleForm.Meta):
+        widgets = {}  # the admin's own selects instead of the search widgets
+
+
+@admin.register(StockOut)
+class StockOutAdmin(admin.ModelAdmin):
+    """
+    Sales can be recorded here like on the Add Sale page, and are then
+    read-only: stock, the rollups and bank entries follow a sale only
+    when it is created.
+    """
+    form = StockOutAdminForm
+    list_display = ['date', 'product', 'quantity', 'selling_price', 'payment_method', 'reference']
+    list_select_related = ['product']
+
+    def get_readonly_fields(self, request, obj=None):
+        if obj is not None:
+            return [field.name for field in StockOut._meta.fields]
+        return []
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+    def changeform_view(self, request, *args, **kwargs):
+        try:
+            return super().changeform_view(request, *args, **kwargs)
+        except InsufficientStock:
+            # The form checked the stock, but another till sold the last units
+            # before the sale was saved; nothing was written
+            self.message_user(request, "Not enough stock left for this sale. Nothing was saved.", messages.ERROR)
+            return HttpResponseRedirect(request.get_full_path())
+
+
 # Register your models here.
@@ -0,0 +1,319 @@
+import hashlib
+import json
+import math
+import time
+from datetime import datetime, timezone
+from django.contrib.auth.decorators import login_required
+from django.db import IntegrityError, transaction
+from django.http import JsonResponse
+from django.views.decorators.http import condition, require_GET, require_POST
+from .cache import get_version, last_changed, STOCK, BANK
+from .forms import CheckoutLineForm
+from .models import Product, BankAccount, Sale, IdempotencyKey
+from .pagination import keyset_page
+from .services import InsufficientStock, checkout
+
+# ---------------------------------------------------------
+# READ-ONLY JSON API
+# ---------------------------------------------------------
+# ETag and Last-Modified come from the cache change counters, which are
+# bumped on every relevant write. An unchanged poll is answered with
+# 304 Not Modified before the view runs, without querying the tables.
+# The counters live in the shared cache (CACHE_BACKEND), so every worker
+# hands out the same ETag and sees writes handled by the others.
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 500
+
+PRODUCT_FIELDS = {
+    # API field -> model fields needed to produce it
+    'id': ['id'],
+    'sku': ['sku'],
+    'name': ['name'],
+    'brand': ['brand'],
+    'model': ['model'],
+    'size': ['size'],
+    'color': ['color'],
+    'selling_price': ['selling_price'],
+    'quantity': ['quantity'],
+    'reorder_level': ['reorder_level'],
+    'reorder_status': ['quantity', 'reorder_level'],
+}
+DEFAULT_PRODUCT_FIELDS = ['id', 'sku', 'name', 'selling_price', 'quantity', 'reorder_status']
+
+BANK_ACCOUNT_FIELDS = {
+    'id': ['id'],
+    'name': ['name'],
+    'balance': ['balance'],
+}
+
+
+class BadRequest(Exception):
+    pass
+
+
+def etag_for(namespace):
+    """
+    '<namespace>-<version>-<query hash>': changes whenever the data
+    or the requested page/fields change.
+    """
+    def etag(request, *args, **kwargs):
+        query = hashlib.md5(request.GET.urlencode().encode()).hexdigest()[:12]
+        return f"{namespace}-{get_version(namespace)}-{query}"
+    return etag
+
+
+def last_modified_for(namespace):
+    """
+    Last change time, rounded up to the whole second of an HTTP date.
+    None (no Last-Modified, ETag only) until that second has passed:
+    a later write in the same second would get the same date, and a
+    client sending only If-Modified-Since would wrongly get a 304.
+    """
+    def last_modified(request, *args, **kwargs):
+        changed = math.ceil(last_changed(namespace))
+        if time.time() < changed:
+            return None
+        return datetime.fromtimestamp(changed, tz=timezone.utc)
+    return last_modified
+
+
+def selected_fields(request, available, default):
+    requested = request.GET.get('fields')
+    fields = [field.strip() for field in requested.split(',') if field.strip()] if requested else default
+    unknown = [field for field in fields if field not in available]
+    if unknown:
+        raise BadRequest(f"Unknown field(s): {', '.join(unknown)}. Available: {', '.join(available)}")
+    return fields
+
+
+def page_limit(request):
+    try:
+        limit = int(request.GET.get('limit', DEFAULT_LIMIT))
+    except ValueError:
+        raise BadRequest("limit must be an integer")
+    return max(1, min(limit, MAX_LIMIT))
+
+
+def serialize(obj, fields):
+    row = {}
+    for field in fields:
+        if field == 'reorder_status':
+            row[field] = 'low' if obj.quantity <= obj.reorder_level else 'ok'
+        else:
+            row[field] = getattr(obj, field)
+    return row
+
+
+def paginated(request, queryset, available, default):
+    """
+    Keyset page (newest id first) of the requested fields.
+    Follow 'next' by passing it back as ?after=.
+    """
+    fields = selected_fields(request, available, default)
+    columns = {column for field in fields for column in available[field]} | {'id'}
+    page = keyset_page(
+        queryset.only(*columns),
+        ('id',),
+        after=request.GET.get('after'),
+        size=page_limit(request),
+    )
+    return {
+        'results': [serialize(obj, fields) for obj in page['items']],
+        'next': page['next_cursor'],
+    }
+
+
+def api_view(namespace):
+    """
+    Login-protected GET endpoint with conditional-GET support.
+    """
+    def decorator(view):
+        def wrapper(request, *args, **kwargs):
+            try:
+                return JsonResponse(view(request, *args, **kwargs))
+            except BadRequest as exc:
+                return JsonResponse({'error': str(exc)}, status=400)
+        wrapper = condition(etag_func=etag_for(namespace), last_modified_func=last_modified_for(namespace))(wrapper)
+        return login_required(require_GET(wrapper))
+    return decorator
+
+
+@api_view(STOCK)
+def products(request):
+    return paginated(request, Product.objects.all(), PRODUCT_FIELDS, DEFAULT_PRODUCT_FIELDS)
+
+
+@api_view(BANK)
+def bank_accounts(request):
+    return paginated(request, BankAccount.objects.all(), BANK_ACCOUNT_FIELDS, list(BANK_ACCOUNT_FIELDS))
+
+
+# ---------------------------------------------------------
+# OFFLINE SALE SYNC
+# ---------------------------------------------------------
+# A till that lost its connection queues sales locally and sends them
+# all in one POST (session login and X-CSRFToken, like any form):
+#
+#   {"sales": [{"idempotency_key": "<uuid>", "payment_method": "cash",
+#               "bank_account": null, "reference": "...",
+#               "lines": [{"product": 12, "quantity": 2, "selling_price": "450.00"}]},
+#              ...]}
+#
+# The batch is one transaction with a savepoint per sale: a sale that
+# fails (out of stock, invalid) is rolled back on its own and reported,
+# the others are kept. An applied sale stores its key in IdempotencyKey,
+# so sending it again (e.g. after a timeout) returns the original result
+# as "duplicate" instead of recording it twice. Failed sales store
+# nothing and can be corrected and resent.
+
+MAX_SYNC_BATCH = 500
+
+
+class InvalidSale(Exception):
+    pass
+
+
+def sale_fingerprint(item):
+    content = {name: value for name, value in item.items() if name != 'idempotency_key'}
+    return hashlib.sha256(json.dumps(content, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def as_id(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def integer_ids(values):
+    return {as_id(value) for value in values} - {None}
+
+
+def parse_sale(item, list_prices, accounts):
+    """
+    Validate one queued sale. Returns the keyword arguments for
+    services.checkout, or raises InvalidSale.
+    """
+    payment_method = item.get('payment_method')
+    if payment_method not in dict(Sale.PAYMENT_METHODS):
+        raise InvalidSale(f"payment_method must be one of: {', '.join(dict(Sale.PAYMENT_METHODS))}")
+
+    bank_account = None
+    if item.get('bank_account') is not None:
+        bank_account = accounts.get(as_id(item['bank_account']))
+        if bank_account is None:
+            raise InvalidSale("bank_account: Select a valid bank account.")
+    if payment_method == 'transfer' and bank_account is None:
+        raise InvalidSale("bank_account: Bank Account is required for Transfer payments.")
+
+    reference = item.get('reference') or None
+    if reference is not None and (not isinstance(reference, str) or len(reference) > 100):
+        raise InvalidSale("reference: At most 100 characters.")
+
+    raw_lines = item.get('lines')
+    if not isinstance(raw_lines, list) or not raw_lines:
+        raise InvalidSale("lines: Add at least one item to the sale.")
+    lines = []
+    for number, raw_line in enumerate(raw_lines, start=1):
+        form = CheckoutLineForm(raw_line if isinstance(raw_line, dict) else {})
+        if not form.is_valid():
+            raise InvalidSale(f"line {number}: " + "; ".join(
+                f"{field}: {' '.join(messages)}" for field, messages in form.errors.items()
+            ))
+        product_id = form.cleaned_data['product']
+        if product_id not in list_prices:
+            raise InvalidSale(f"line {number}: product: Select a valid product.")
+        selling_price = form.cleaned_data['selling_price']
+        lines.append((
+            product_id,
+            form.cleaned_data['quantity'],
+            list_prices[product_id] if selling_price is None else selling_price,
+        ))
+
+    return {'lines': lines, 'payment_method': payment_method, 'bank_account': bank_account, 'reference': reference}
+
+
+def replayed(record, fingerprint):
+    if record.request_hash != fingerprint:
+        return {
+            'idempotency_key': record.key,
+            'status': 'conflict',
+            'error': "This idempotency key was already used for a different sale.",
+        }
+    return {'idempotency_key': record.key, 'status': 'duplicate', 'sale': record.sale_id}
+
+
+def apply_offline_sales(items, user=None):
+    """
+    Record a batch of queued sales. Returns one result per item, in order:
+    {'idempotency_key', 'status': 'created' | 'duplicate' | 'conflict' | 'error',
+     'sale' (created / duplicate) or 'error' (conflict / error)}.
+    """
+    keys = [item.get('idempotency_key') for item in items]
+    known = {
+        record.key: record
+        for record in IdempotencyKey.objects.filter(key__in=[key for key in keys if isinstance(key, str)])
+    }
+    # Products and accounts of the whole batch, one query each
+    list_prices = dict(
+        Product.objects.filter(pk__in=integer_ids(
+            line.get('product') for item in items if isinstance(item.get('lines'), list)
+            for line in item['lines'] if isinstance(line, dict)
+        )).values_list('pk', 'selling_price')
+    )
+    accounts = BankAccount.objects.in_bulk(integer_ids(item.get('bank_account') for item in items))
+
+    results = []
+    with transaction.atomic():
+        for key, item in zip(keys, items):
+            if not isinstance(key, str) or not 0 < len(key) <= 64:
+                results.append({'idempotency_key': key, 'status': 'error', 'error': "idempotency_key: 1 to 64 characters."})
+                continue
+            fingerprint = sale_fingerprint(item)
+            if key in known:
+                results.append(replayed(known[key], fingerprint))
+                continue
+
+            try:
+                sale_options = parse_sale(item, list_prices, accounts)
+                with transaction.atomic():
+                    record = IdempotencyKey.objects.create(key=key, request_hash=fingerprint, created_by=user)
+                    record.sale = checkout(**sale_options)
+                    record.save(update_fields=['sale'])
+            except (InvalidSale, InsufficientStock) as exc:
+                results.append({'idempotency_key': key, 'status': 'error', 'error': str(exc)})
+            except IntegrityError:
+                # Another request applied the same key meanwhile (it committed first)
+                record = IdempotencyKey.objects.filter(key=key).first()
+                if record is None:
+                    raise
+                known[key] = record
+                results.append(replayed(record, fingerprint))
+            else:
+                known[key] = record
+                results.append({'idempotency_key': key, 'status': 'created', 'sale': record.sale_id})
+    return results
+
+
+@login_required
+@require_POST
+def sync_sales(request):
+    try:
+        payload = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'error': "Body must be JSON"}, status=400)
+    items = payload.get('sales') if isinstance(payload, dict) else None
+    if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+        return JsonResponse({'error': "Expected {\"sales\": [{...}, ...]}"}, status=400)
+    if len(items) > MAX_SYNC_BATCH:
+        return JsonResponse({'error': f"At most {MAX_SYNC_BATCH} sales per request"}, status=400)
+
+    results = apply_offline_sales(items, request.user)
+    statuses = [result['status'] for result in results]
+    return JsonResponse({
+        'results': results,
+        'created': statuses.count('created'),
+        'duplicates': statuses.count('duplicate'),
+        'failed': statuses.count('error') + statuses.count('conflict'),
+    })
@@ -0,0 +1,349 @@
+import platform
+import random
+import statistics
+import time
+from datetime import datetime, time as day_time, timedelta
+from decimal import Decimal
+import django
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.db.models import OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from .models import (
+    Product, StockIn, StockOut, BankAccount, BankTransaction, OwnerDrawing,
+    HistoricalSale, DailySalesSummary, SalesFact,
+)
+from .cache import bump_now, NAMESPACES, DASHBOARD, BANK
+from .facts import backfill_sales_facts, sales_totals
+from .metrics import QueryTimer, wrapping_queries
+from .pagination import encode_cursor
+from .reconcile import reconcile_all, number_unposted
+from .rollups import rebuild_daily_summary
+from .services import checkout
+
+# ---------------------------------------------------------
+# SYNTHETIC DATA
+# ---------------------------------------------------------
+# Bulk-generated catalogue, stock movements, bank ledger and legacy
+# sales at a given scale. bulk_create skips the signals, so stock
+# levels, the daily rollup, bank balances and checkpoints are derived
+# in one pass at the end, exactly as the per-row signals would have.
+
+SCALES = {
+    '10k': 10_000,
+    '100k': 100_000,
+    '1m': 1_000_000,
+}
+SKU_PREFIX = 'BENCH-'
+REFERENCE = 'benchmark'
+
+BRANDS = ['Shoei', 'Arai', 'AGV', 'HJC', 'Bell', 'LS2', 'Nolan', 'Shark', 'Scorpion', 'Schuberth']
+MODELS = ['RF-1400', 'GT-Air 3', 'K6 S', 'RPHA 11', 'Star DLX', 'Storm-X', 'N87', 'Spartan', 'EXO-R1', 'C5']
+SIZES = ['XS', 'S', 'M', 'L', 'XL', 'XXL']
+COLORS = ['Black', 'Matte Black', 'White', 'Red', 'Blue', 'Hi-Vis', 'Silver', 'Graphite']
+SUPPLIERS = ['Moto Distribution', 'Helmet Direct', 'Rider Supply Co', 'Euro Moto Parts']
+EXPENSE_CATEGORIES = ['expense', 'inventory', 'owner_draw', 'transfer']
+
+
+def row_counts(rows):
+    """
+    How many records of each kind a scale generates.
+    """
+    return {
+        'products': max(rows // 50, 10),
+        'stock_ins': rows // 5,
+        'stock_outs': rows,
+        'bank_transactions': rows // 2,
+        'historical_sales': rows,
+    }
+
+
+def per_day(total, days):
+    """
+    Split `total` rows over `days` days as evenly as possible.
+    """
+    base, extra = divmod(total, days)
+    return [base + (1 if day < extra else 0) for day in range(days)]
+
+
+def create_dated(model, objects, moment, batch_size):
+    """
+    bulk_create records whose `date` is auto_now_add, then move them to `moment`.
+    """
+    created = model.objects.bulk_create(objects, batch_size=batch_size)
+    if created:
+        model.objects.filter(pk__gte=created[0].pk, pk__lte=created[-1].pk).update(date=moment)
+    return len(created)
+
+
+def seed_benchmark_data(rows, days=365, batch_size=5000, seed=0, log=None):
+    """
+    Generate `rows` sales (and proportional other records) spread over
+    the last `days` days. Returns the number of records created per kind.
+    """
+    if Product.objects.filter(sku__startswith=SKU_PREFIX).exists():
+        raise ValueError("Benchmark data is already present; seed a fresh database.")
+
+    log = log or (lambda message: None)
+    rng = random.Random(seed)
+    counts = row_counts(rows)
+    today = timezone.localdate()
+
+    log(f"Creating {counts['products']} products and 3 bank accounts")
+    with transaction.atomic():
+        accounts = [
+            BankAccount.objects.create(name=f"Benchmark {name}", balance=Decimal('250000.00'))
+            for name in ('Operating', 'Savings', 'Card Settlements')
+        ]
+        products = []
+        for number in range(counts['products']):
+            cost = Decimal(rng.randrange(4000, 60000)) / 100
+            products.append(Product(
+                sku=f"{SKU_PREFIX}{number:07d}",
+                name=f"{rng.choice(BRANDS)} {rng.choice(MODELS)}",
+                brand=rng.choice(BRANDS),
+                model=rng.choice(MODELS),
+                size=rng.choice(SIZES),
+                color=rng.choice(COLORS),
+                average_cost=cost,
+                selling_price=(cost * Decimal('1.6')).quantize(Decimal('0.01')),
+                reorder_level=rng.randrange(2, 10),
+            ))
+        products = Product.objects.bulk_create(products, batch_size=batch_size)
+
+    created = {'products': len(products), 'stock_ins': 0, 'stock_outs': 0, 'bank_transactions': 0}
+    stock_ins = per_day(counts['stock_ins'], days)
+    stock_outs = per_day(counts['stock_outs'], days)
+    bank_transactions = per_day(counts['bank_transactions'], days)
+
+    for offset in range(days):
+        day = today - timedelta(days=days - 1 - offset)
+        moment = timezone.make_aware(datetime.combine(day, day_time(12)))
+        with transaction.atomic():
+            receipts = []
+            for _ in range(stock_ins[offset]):
+                product = rng.choice(products)
+                receipts.append(StockIn(
+                    product=product,
+                    quantity=rng.randrange(20, 60),
+                    unit_cost=product.average_cost,
+                    supplier=rng.choice(SUPPLIERS),
+                ))
+            created['stock_ins'] += create_dated(StockIn, receipts, moment, batch_size)
+
+            sales = []
+            for _ in range(stock_outs[offset]):
+                product = rng.choice(products)
+                method = rng.choice(['cash', 'transfer'])
+                sales.append(StockOut(
+                    product=product,
+                    quantity=rng.randrange(1, 3),
+                    selling_price=product.selling_price,
+                    cost_at_sale=product.average_cost,
+                    payment_method=method,
+                    bank_account=accounts[0] if method == 'transfer' else None,
+                ))
+            created['stock_outs'] += create_dated(StockOut, sales, moment, batch_size)
+
+            ledger = []
+            for _ in range(bank_transactions[offset]):
+                incoming = rng.random() < 0.6
+                ledger.append(BankTransaction(
+                    bank_account=rng.choice(accounts),
+                    transaction_type='in' if incoming else 'out',
+                    category='sale' if incoming else rng.choice(EXPENSE_CATEGORIES),
+                    amount=Decimal(rng.randrange(1000, 200000)) / 100,
+                    description='Benchmark entry',
+                    reference=REFERENCE,
+                ))
+            created['bank_transactions'] += create_dated(BankTransaction, ledger, moment, batch_size)
+        if offset % 30 == 29 or offset == days - 1:
+            log(f"  {offset + 1}/{days} days generated")
+
+    log(f"Creating {counts['historical_sales']} historical sales")
+    history = []
+    created['historical_sales'] = 0
+    for _ in range(counts['historical_sales']):
+        cost = Decimal(rng.randrange(4000, 60000)) / 100
+        history.append(HistoricalSale(
+            date=today - timedelta(days=days + rng.randrange(days * 3)),
+            sku=f"LEGACY-{rng.randrange(counts['products']):07d}",
+            product_name=f"{rng.choice(BRANDS)} {rng.choice(MODELS)}",
+            quantity=rng.randrange(1, 4),
+            unit_cost=cost,
+            selling_price=(cost * Decimal('1.5')).quantize(Decimal('0.01')),
+            reference=REFERENCE,
+        ))
+        if len(history) >= batch_size:
+            created['historical_sales'] += len(HistoricalSale.objects.bulk_create(history))
+            history = []
+    if history:
+        created['historical_sales'] += len(HistoricalSale.objects.bulk_create(history))
+
+    log("Deriving stock levels, the daily rollup, sales facts and bank balances")
+    received = StockIn.objects.filter(product=OuterRef('pk')).values('product').annotate(total=Sum('quantity')).values('total')
+    sold = StockOut.objects.filter(product=OuterRef('pk')).values('product').annotate(total=Sum('quantity')).values('total')
+    Product.objects.filter(sku__startswith=SKU_PREFIX).update(
+        quantity=Greatest(Coalesce(Subquery(received), 0) - Coalesce(Subquery(sold), 0), Value(0)),
+    )
+    rebuild_daily_summary(batch_size=batch_size)
+    backfill_sales_facts(batch_size=batch_size)
+    number_unposted([account.pk for account in accounts])
+    reconcile_all(repair=True, checkpoint=True, account_ids=[account.pk for account in accounts])
+    bump_now(*NAMESPACES)
+    return created
+
+
+# ---------------------------------------------------------
+# BENCHMARK RUNNER
+# ---------------------------------------------------------
+# Every benchmark runs `repeat` times and records wall time and query
+# count. Writes (form posts, signal cascades, services) run inside a
+# transaction that is rolled back, so the data set is unchanged and
+# runs can be repeated and compared between releases.
+
+def rolled_back(action):
+    def run():
+        with transaction.atomic():
+            action()
+            transaction.set_rollback(True)
+    return run
+
+
+def measure(action, repeat, before=None):
+    timings = []
+    queries = []
+    for _ in range(repeat):
+        if before:
+            before()
+        # Counts the queries of pool threads too (the async dashboards)
+        with wrapping_queries(QueryTimer()) as timer:
+            started = time.perf_counter()
+            action()
+            timings.append((time.perf_counter() - started) * 1000)
+        queries.append(timer.count)
+    return {
+        'runs': repeat,
+        'min_ms': round(min(timings), 3),
+        'median_ms': round(statistics.median(timings), 3),
+        'max_ms': round(max(timings), 3),
+        'queries': queries[-1],
+        'first_run_queries': queries[0],
+    }
+
+
+def expect_status(client, method, url, status, data=None):
+    def request():
+        response = getattr(client, method)(url, data or {})
+        if response.status_code != status:
+            raise AssertionError(f"{method.upper()} {url} returned {response.status_code}, expected {status}")
+    return request
+
+
+def benchmark_cases(client):
+    """
+    (name, action, before-each-run) for every view, signal cascade and
+    analytics query.
+    """
+    product = Product.objects.order_by('-quantity').first()
+    account = BankAccount.objects.order_by('pk').first()
+    if product is None or account is None or product.quantity < 10:
+        raise ValueError("Benchmarks need stocked products and a bank account; run seed_benchmark_data first.")
+
+    middle = HistoricalSale.objects.order_by('-date', '-id')[HistoricalSale.objects.count() // 2:][:1]
+    deep_cursor = encode_cursor(middle[0], ('date', 'id')) if middle else ''
+    sale = {
+        'product': product.pk, 'quantity': 1, 'selling_price': product.selling_price,
+        'payment_method': 'transfer', 'bank_account': account.pk,
+    }
+    receipt = {
+        'product': product.pk, 'quantity': 5, 'unit_cost': product.average_cost,
+        'supplier': 'Benchmark', 'bank_account': account.pk,
+    }
+    cart = [(line.pk, 1, line.selling_price) for line in Product.objects.filter(quantity__gte=5)[:5]]
+
+    return [
+        ('view:dashboard:cold', expect_status(client, 'get', reverse('dashboard'), 200), lambda: bump_now(DASHBOARD)),
+        ('view:dashboard', expect_status(client, 'get', reverse('dashboard'), 200), None),
+        ('view:bank_dashboard:cold', expect_status(client, 'get', reverse('bank_dashboard'), 200), lambda: bump_now(BANK)),
+        ('view:bank_dashboard', expect_status(client, 'get', reverse('bank_dashboard'), 200), None),
+        ('view:historical_sales_list', expect_status(client, 'get', reverse('historical_sales_list'), 200), None),
+        ('view:historical_sales_list:deep', expect_status(
+            client, 'get', f"{reverse('historical_sales_list')}?after={deep_cursor}", 200), None),
+        ('view:add_sale:get', expect_status(client, 'get', reverse('add_sale'), 200), None),
+        ('view:add_sale:post', rolled_back(expect_status(client, 'post', reverse('add_sale'), 302, sale)), None),
+        ('view:add_stock:get', expect_status(client, 'get', reverse('add_stock'), 200), None),
+        ('view:add_stock:post', rolled_back(expect_status(client, 'post', reverse('add_stock'), 302, receipt)), None),
+        ('signal:stock_in', rolled_back(lambda: StockIn.objects.create(
+            product=product, quantity=5, unit_cost=product.average_cost, supplier='Benchmark', bank_account=account)), None),
+        ('signal:stock_out', rolled_back(lambda: StockOut.objects.create(
+            product=product, quantity=1, selling_price=product.selling_price,
+            payment_method='transfer', bank_account=account)), None),
+        ('signal:bank_transaction', rolled_back(lambda: BankTransaction.objects.create(
+            bank_account=account, transaction_type='out', category='expense',
+            amount=Decimal('10.00'), description='Benchmark')), None),
+        ('signal:owner_drawing', rolled_back(lambda: OwnerDrawing.objects.create(
+            bank_account=account, amount=Decimal('10.00'), description='Benchmark')), None),
+        ('signal:historical_sale', rolled_back(lambda: HistoricalSale.objects.create(
+            date=timezone.localdate(), sku='BENCH', product_name='Benchmark', quantity=1,
+            unit_cost=Decimal('10.00'), selling_price=Decimal('15.00'))), None),
+        ('service:checkout', rolled_back(lambda: checkout(cart, 'transfer', bank_account=account)), None),
+        ('query:sales_by_month_brand', lambda: list(sales_totals(['month', 'brand'])), None),
+        ('query:sales_by_brand_size', lambda: list(sales_totals(['brand', 'size'], brand=product.brand)), None),
+    ]
+
+
+def run_benchmarks(repeat=5, only=None, user=None):
+    """
+    Time every benchmark case; returns a JSON-serialisable report.
+    """
+    user = user or User.objects.filter(is_active=True).order_by('-is_superuser', 'pk').first()
+    if user is None:
+        raise ValueError("Benchmarks need an active user to log in as.")
+
+    with override_settings(ALLOWED_HOSTS=['testserver']):
+        client = Client()
+        client.force_login(user)
+        results = {}
+        for name, action, before in benchmark_cases(client):
+            if only and not any(name.startswith(prefix) for prefix in only):
+                continue
+            results[name] = measure(action, repeat, before)
+
+    return {
+        'generated_at': timezone.now().isoformat(),
+        'environment': {
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+        },
+        'rows': {
+            'products': Product.objects.count(),
+            'stock_ins': StockIn.objects.count(),
+            'stock_outs': StockOut.objects.count(),
+            'daily_sales_summaries': DailySalesSummary.objects.count(),
+            'sales_facts': SalesFact.objects.count(),
+            'bank_transactions': BankTransaction.objects.count(),
+            'historical_sales': HistoricalSale.objects.count(),
+        },
+        'results': results,
+    }
+
+
+def compare(baseline, current):
+    """
+    Per-benchmark (name, baseline median, current median, % change, query change).
+    """
+    rows = []
+    for name, result in current['results'].items():
+        before = baseline.get('results', {}).get(name)
+        if not before:
+            rows.append((name, None, result['median_ms'], None, None))
+            continue
+        change = (result['median_ms'] - before['median_ms']) * 100 / before['median_ms'] if before['median_ms'] else None
+        rows.append((name, before['median_ms'], result['median_ms'], change, result['queries'] - before['queries']))
+    return rows
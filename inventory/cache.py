@@ -0,0 +1,232 @@
+import threading
+import time
+from collections import Counter
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import F
+from .models import CacheVersion
+
+# ---------------------------------------------------------
+# VERSIONED SUMMARY CACHE
+# ---------------------------------------------------------
+# Summary payloads are stored under keys that embed a per-namespace
+# version number. A write never deletes anything: it just bumps the
+# version, and the next read misses and recomputes. Stale entries
+# expire on their own.
+#
+#   inventory:version:<namespace>              -> current version
+#   inventory:changed:<namespace>              -> time of the last bump
+#   inventory:changed:*                        -> time of the last bump of any namespace
+#   inventory:<namespace>:<name>:v<version>    -> cached payload
+#   inventory:stats:hits / misses              -> counters
+#
+# The versions and change times never expire and are read by every
+# process (API ETags, the reporting staleness guard, the product index),
+# so they are only meaningful in a cache all processes share; settings.py
+# refuses the per-process "locmem" backend with several workers.
+#
+# A bump must never be lost: two bumps collapsing into one would leave a
+# payload computed between them cached under the final version. The
+# database and file caches implement incr() as a read and a write back,
+# so with them the versions are CacheVersion rows, bumped with
+# UPDATE ... SET version = version + 1 on the primary database.
+
+DASHBOARD = 'dashboard'
+BANK = 'bank'
+PRODUCTS = 'products'  # catalogue changes (used by the autocomplete index)
+STOCK = 'stock'  # catalogue, quantity or cost changes (used by the product API)
+REPORTS = 'reports'  # changes to past sales (closed periods of the P&L report)
+NAMESPACES = [DASHBOARD, BANK, PRODUCTS, STOCK, REPORTS]
+ANY = '*'  # last_changed(ANY): the latest write of any kind (see inventory/routers.py)
+
+
+# Backends whose entries only the current process sees
+PROCESS_LOCAL_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def get_cache():
+    return caches[getattr(settings, 'INVENTORY_CACHE_ALIAS', 'default')]
+
+
+def is_shared():
+    """
+    Whether other processes (workers, management commands, the job
+    worker) see the versions and change times stored here.
+    """
+    alias = getattr(settings, 'INVENTORY_CACHE_ALIAS', 'default')
+    return settings.CACHES[alias]['BACKEND'] not in PROCESS_LOCAL_BACKENDS
+
+
+# Backends whose incr() is atomic
+ATOMIC_INCR_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.redis.RedisCache',
+    'django.core.cache.backends.memcached.PyMemcacheCache',
+    'django.core.cache.backends.memcached.PyLibMCCache',
+)
+
+
+def versions_in_database():
+    alias = getattr(settings, 'INVENTORY_CACHE_ALIAS', 'default')
+    return settings.CACHES[alias]['BACKEND'] not in ATOMIC_INCR_BACKENDS
+
+
+def version_key(namespace):
+    return f"inventory:version:{namespace}"
+
+
+def database_version(namespace):
+    # Start from the clock, so the counter never comes back to a number
+    # whose (stale) entries are still cached
+    row, _ = CacheVersion.objects.using(DEFAULT_DB_ALIAS).get_or_create(
+        namespace=namespace, defaults={'version': int(time.time() * 1000)}
+    )
+    return row.version
+
+
+def get_version(namespace):
+    if versions_in_database():
+        return database_version(namespace)
+    cache = get_cache()
+    version = cache.get(version_key(namespace))
+    if version is None:
+        # Start from the clock, so an evicted counter can never come back
+        # to a number whose (stale) entries are still cached.
+        cache.add(version_key(namespace), int(time.time() * 1000), timeout=None)
+        version = cache.get(version_key(namespace))
+    return version
+
+
+def bump_now(*namespaces):
+    cache = get_cache()
+    for namespace in namespaces:
+        if versions_in_database():
+            bumped = CacheVersion.objects.using(DEFAULT_DB_ALIAS).filter(namespace=namespace).update(
+                version=F('version') + 1
+            )
+            if not bumped:
+                database_version(namespace)
+            continue
+        try:
+            cache.incr(version_key(namespace))
+        except ValueError:
+            get_version(namespace)
+        cache.set(f"inventory:changed:{namespace}", time.time(), timeout=None)
+    cache.set(f"inventory:changed:{ANY}", time.time(), timeout=None)
+
+
+def last_changed(namespace):
+    """
+    Unix time of the namespace's last bump (now, if unknown).
+    """
+    changed = get_cache().get(f"inventory:changed:{namespace}")
+    if changed is None:
+        changed = time.time()
+        get_cache().add(f"inventory:changed:{namespace}", changed, timeout=None)
+    return changed
+
+
+def bump(*namespaces):
+    """
+    Invalidate namespaces once the current transaction commits
+    (immediately when not in a transaction). Bumping earlier would let
+    a concurrent reader cache pre-commit numbers under the new version.
+    """
+    transaction.on_commit(lambda: bump_now(*namespaces))
+
+
+# Hit / miss counts are kept per process and added to the shared
+# counters at most every STATS_FLUSH_SECONDS, so a cached read does not
+# also write to the cache (a database write with the "db" backend).
+STATS_FLUSH_SECONDS = 30
+
+
+class PendingStats:
+    def __init__(self):
+        self.counts = Counter()
+        self.flushed_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def add(self, stat):
+        with self.lock:
+            self.counts[stat] += 1
+            due = time.monotonic() - self.flushed_at >= STATS_FLUSH_SECONDS
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            counts, self.counts = self.counts, Counter()
+            self.flushed_at = time.monotonic()
+        cache = get_cache()
+        for stat, value in counts.items():
+            key = f"inventory:stats:{stat}"
+            try:
+                cache.incr(key, value)
+            except ValueError:
+                if not cache.add(key, value, timeout=None):
+                    cache.incr(key, value)
+
+
+pending_stats = PendingStats()
+
+
+def count(stat):
+    pending_stats.add(stat)
+
+
+def lookup(namespace, name):
+    """
+    (key, payload) for the namespace's current version; payload is None on a miss.
+    """
+    key = f"inventory:{namespace}:{name}:v{get_version(namespace)}"
+    payload = get_cache().get(key)
+    count('hits' if payload is not None else 'misses')
+    return key, payload
+
+
+def store(key, payload, timeout=None):
+    get_cache().set(key, payload, timeout=timeout if timeout is not None else settings.INVENTORY_CACHE_TIMEOUT)
+
+
+def cached(namespace, name, compute, timeout=None):
+    """
+    Return the payload cached for the namespace's current version,
+    computing and storing it on a miss.
+    """
+    key, payload = lookup(namespace, name)
+    if payload is None:
+        payload = compute()
+        store(key, payload, timeout)
+    return payload
+
+
+async def acached(namespace, name, compute, timeout=None):
+    """
+    cached() for async views: `compute` is a coroutine function, and the
+    cache itself is reached through sync_to_async (it may be the database).
+    """
+    key, payload = await sync_to_async(lookup)(namespace, name)
+    if payload is None:
+        payload = await compute()
+        await sync_to_async(store)(key, payload, timeout)
+    return payload
+
+
+def stats():
+    pending_stats.flush()
+    cache = get_cache()
+    hits = cache.get('inventory:stats:hits', 0)
+    misses = cache.get('inventory:stats:misses', 0)
+    lookups = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': round(hits / lookups, 4) if lookups else None,
+        'versions': {namespace: get_version(namespace) for namespace in NAMESPACES},
+    }
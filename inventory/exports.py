@@ -0,0 +1,94 @@
+import csv
+from .models import StockOut, StockIn, BankTransaction
+
+# ---------------------------------------------------------
+# STREAMING CSV EXPORTS
+# ---------------------------------------------------------
+# Rows are pulled from the database in chunks with values_list (joined
+# product / account names come back in the same query) and written out
+# one line at a time, so memory use does not depend on table size.
+
+EXPORTS = {
+    'sales': {
+        'model': StockOut,
+        'columns': [
+            ('date', 'Date'),
+            ('sale_id', 'Receipt #'),
+            ('product__sku', 'SKU'),
+            ('product__name', 'Product'),
+            ('quantity', 'Quantity'),
+            ('selling_price', 'Selling Price'),
+            ('cost_at_sale', 'Cost At Sale'),
+            ('payment_method', 'Payment Method'),
+            ('bank_account__name', 'Bank Account'),
+            ('reference', 'Reference'),
+        ],
+    },
+    'stock_in': {
+        'model': StockIn,
+        'columns': [
+            ('date', 'Date'),
+            ('product__sku', 'SKU'),
+            ('product__name', 'Product'),
+            ('quantity', 'Quantity'),
+            ('unit_cost', 'Unit Cost'),
+            ('supplier', 'Supplier'),
+            ('bank_account__name', 'Bank Account'),
+        ],
+    },
+    'bank_transactions': {
+        'model': BankTransaction,
+        'columns': [
+            ('date', 'Date'),
+            ('bank_account__name', 'Bank Account'),
+            ('transaction_type', 'Type'),
+            ('category', 'Category'),
+            ('amount', 'Amount'),
+            ('description', 'Description'),
+            ('reference', 'Reference'),
+        ],
+    },
+}
+
+
+class Echo:
+    """
+    File-like object whose write() just hands the line back,
+    so csv.writer can feed a generator instead of a buffer.
+    """
+    def write(self, value):
+        return value
+
+
+def export_queryset(kind, start=None, end=None, account=None, using=None):
+    """
+    values_list queryset for one export, filtered by an inclusive
+    date range and/or bank account. `using` pins the database alias
+    (default: routed when evaluated).
+    """
+    spec = EXPORTS[kind]
+    queryset = spec['model'].objects.using(using) if using else spec['model'].objects.all()
+    if start:
+        queryset = queryset.filter(date__date__gte=start)
+    if end:
+        queryset = queryset.filter(date__date__lte=end)
+    if account:
+        queryset = queryset.filter(bank_account=account)
+    return queryset.order_by('pk').values_list(*[field for field, _ in spec['columns']])
+
+
+def export_rows(kind, start=None, end=None, account=None, chunk_size=2000, using=None):
+    """
+    Header row followed by every data row, fetched chunk_size at a time.
+    """
+    yield [label for _, label in EXPORTS[kind]['columns']]
+    yield from export_queryset(kind, start, end, account, using).iterator(chunk_size=chunk_size)
+
+
+def stream_csv(rows):
+    """
+    Encode rows as CSV lines one at a time.
+    """
+    writer = csv.writer(Echo())
+    for row in rows:
+        yield writer.writerow(row)
@@ -0,0 +1,197 @@
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Sum
+from django.utils import timezone
+from .models import Product, StockOut, HistoricalSale, SalesFact
+
+# ---------------------------------------------------------
+# SALES FACT TABLE
+# ---------------------------------------------------------
+# SalesFact holds every sale line, live and historical, with the product
+# attributes analytics group by (sku, name, brand, size, color) copied in
+# and revenue / cost / profit precomputed. Ad-hoc questions ("units per
+# brand and size per month, all years") are then one GROUP BY over one
+# narrow, indexed table instead of a StockOut-Product join UNIONed with
+# HistoricalSale.
+#
+# Facts are written alongside their sale: per row by the StockOut and
+# HistoricalSale signals, in bulk by services.checkout and the historical
+# import. Catalogue edits are copied onto the product's facts. Anything
+# written around those paths is picked up by the backfill.
+
+LIVE, HISTORICAL = SalesFact.LIVE, SalesFact.HISTORICAL
+
+# Product columns a fact copies; load at least these to build one
+FACT_PRODUCT_FIELDS = ('sku', 'name', 'brand', 'size', 'color')
+
+# Columns that may be passed to sales_totals(group_by=...)
+FACT_DIMENSIONS = {'source', 'date', 'month', 'sku', 'product_name', 'brand', 'size', 'color', 'payment_method'}
+
+
+def fact(source, source_id, day, quantity, selling_price, unit_cost, **attributes):
+    revenue = quantity * selling_price
+    cost = quantity * unit_cost
+    return SalesFact(
+        source=source,
+        source_id=source_id,
+        date=day,
+        month=day.replace(day=1),
+        quantity=quantity,
+        revenue=revenue,
+        cost=cost,
+        profit=revenue - cost,
+        **attributes,
+    )
+
+
+def live_fact(stock_out, product):
+    return fact(
+        LIVE, stock_out.pk, timezone.localdate(stock_out.date),
+        stock_out.quantity, stock_out.selling_price, stock_out.cost_at_sale,
+        product_id=stock_out.product_id,
+        sku=product.sku,
+        product_name=product.name,
+        brand=product.brand,
+        size=product.size,
+        color=product.color,
+        payment_method=stock_out.payment_method,
+    )
+
+
+def historical_fact(sale, product=None):
+    """
+    Legacy sales keep their own SKU and name; brand, size and color come
+    from the catalogue product with the same SKU, if there is one.
+    """
+    return fact(
+        HISTORICAL, sale.pk, sale.date,
+        sale.quantity, sale.selling_price, sale.unit_cost,
+        product_id=product.pk if product else None,
+        sku=sale.sku,
+        product_name=sale.product_name,
+        brand=product.brand if product else '',
+        size=product.size if product else '',
+        color=product.color if product else '',
+    )
+
+
+def products_by_sku(skus):
+    return Product.objects.only(*FACT_PRODUCT_FIELDS).in_bulk(set(skus), field_name='sku')
+
+
+def record_live_facts(stock_outs, products=None):
+    """
+    Add facts for newly created StockOut rows (one bulk INSERT).
+    `products` ({pk: Product} with FACT_PRODUCT_FIELDS loaded) saves the lookup.
+    """
+    if products is None:
+        products = Product.objects.only(*FACT_PRODUCT_FIELDS).in_bulk({line.product_id for line in stock_outs})
+    SalesFact.objects.bulk_create([live_fact(line, products[line.product_id]) for line in stock_outs])
+
+
+def record_historical_facts(sales):
+    """
+    Add facts for newly created HistoricalSale rows (one lookup, one bulk INSERT).
+    """
+    # Rows bulk-created on a database that does not return primary keys
+    # have none; the backfill writes their facts later
+    sales = [sale for sale in sales if sale.pk is not None]
+    products = products_by_sku(sale.sku for sale in sales)
+    SalesFact.objects.bulk_create([historical_fact(sale, products.get(sale.sku)) for sale in sales])
+
+
+def save_fact(new_fact):
+    """
+    Insert or refresh one fact (a sale that was edited after the fact was written).
+    """
+    values = {
+        field.attname: getattr(new_fact, field.attname)
+        for field in SalesFact._meta.concrete_fields
+        if field.attname not in ('id', 'source', 'source_id')
+    }
+    SalesFact.objects.update_or_create(source=new_fact.source, source_id=new_fact.source_id, defaults=values)
+
+
+def delete_fact(source, source_id):
+    SalesFact.objects.filter(source=source, source_id=source_id).delete()
+
+
+def refresh_product_facts(product):
+    """
+    Copy a product's catalogue attributes onto its facts. Historical
+    facts keep the SKU and name they were sold under.
+    """
+    facts = SalesFact.objects.filter(product_id=product.pk)
+    facts.filter(source=LIVE).update(sku=product.sku, product_name=product.name)
+    facts.update(brand=product.brand, size=product.size, color=product.color)
+
+
+def write_facts(source, sales):
+    if source == LIVE:
+        SalesFact.objects.bulk_create([live_fact(sale, sale.product) for sale in sales])
+    else:
+        record_historical_facts(sales)
+    return len(sales)
+
+
+def backfill_sales_facts(sources=(LIVE, HISTORICAL), rebuild=False, batch_size=2000):
+    """
+    Write the facts of sales that have none (all of them with
+    rebuild=True, after deleting the existing ones). Each source is done
+    in one transaction. Returns {source: facts written}.
+    """
+    written = {}
+    for source in sources:
+        facts = SalesFact.objects.filter(source=source)
+        if source == LIVE:
+            sales = StockOut.objects.select_related('product').only(
+                'date', 'quantity', 'selling_price', 'cost_at_sale', 'payment_method',
+                'product', *(f'product__{field}' for field in FACT_PRODUCT_FIELDS),
+            )
+        else:
+            sales = HistoricalSale.objects.only(
+                'date', 'sku', 'product_name', 'quantity', 'unit_cost', 'selling_price',
+            )
+        if not rebuild:
+            sales = sales.filter(~Exists(facts.filter(source_id=OuterRef('pk'))))
+
+        written[source] = 0
+        with transaction.atomic():
+            if rebuild:
+                facts.delete()
+            batch = []
+            for sale in sales.order_by('pk').iterator(chunk_size=batch_size):
+                batch.append(sale)
+                if len(batch) >= batch_size:
+                    written[source] += write_facts(source, batch)
+                    batch = []
+            if batch:
+                written[source] += write_facts(source, batch)
+    return written
+
+
+def sales_totals(group_by=('month',), start=None, end=None, **filters):
+    """
+    Units, revenue, cost and profit from SalesFact grouped by the given
+    columns (see FACT_DIMENSIONS), optionally for an inclusive date range
+    and filtered by exact column values, e.g.
+    sales_totals(['month', 'size'], start=date(2023, 1, 1), brand='Shoei').
+    """
+    unknown = set(group_by) - FACT_DIMENSIONS
+    if unknown:
+        raise ValueError(f"Cannot group sales by: {', '.join(sorted(unknown))}")
+    facts = SalesFact.objects.filter(**filters)
+    # The month bounds let the (month, ...) indexes narrow the scan
+    if start:
+        facts = facts.filter(month__gte=start.replace(day=1), date__gte=start)
+    if end:
+        facts = facts.filter(month__lte=end.replace(day=1), date__lte=end)
+    return (
+        facts.values(*group_by)
+        .annotate(
+            units=Sum('quantity'),
+            revenue=Sum('revenue'),
+            cost=Sum('cost'),
+            profit=Sum('profit'),
+        )
+        .order_by(*group_by)
+    )
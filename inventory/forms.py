@@ -1,12 +1,21 @@
 from django import forms
-from .models import StockOut, StockIn, BankTransaction, OwnerDrawing, BankAccount
+from .models import StockOut, StockIn, BankTransaction, OwnerDrawing, BankAccount, Product
+from .widgets import AutocompleteSelect
+
+def product_search():
+    return AutocompleteSelect('product_lookup', Product)
+
+def bank_account_search():
+    return AutocompleteSelect('bank_account_lookup', BankAccount)
 
 class SaleForm(forms.ModelForm):
     class Meta:
         model = StockOut
         fields = ['product', 'quantity', 'selling_price', 'payment_method', 'bank_account', 'reference']
         widgets = {
-             # Hide bank_account initially or let user leave blank if Cash
+            # Search widgets instead of <select>s listing every product / account
+            'product': product_search(),
+            'bank_account': bank_account_search(),
         }
 
     def clean(self):
@@ -39,6 +48,8 @@ class StockInForm(forms.ModelForm):
         model = StockIn
         fields = ['product', 'quantity', 'unit_cost', 'supplier', 'bank_account']
         widgets = {
+            'product': product_search(),
+            'bank_account': bank_account_search(),
             'unit_cost': forms.NumberInput(attrs={'step': '0.01', 'min': '0'}),
         }
         labels = {
@@ -98,3 +109,149 @@ class HistoricalSaleForm(forms.ModelForm):
         if qty is not None and qty <= 0:
             raise forms.ValidationError("Quantity must be positive.")
         return qty
+
+# ---------------------------------------------------------
+# CART CHECKOUT
+# ---------------------------------------------------------
+from collections import Counter
+from .models import Sale
+
+class CheckoutForm(forms.ModelForm):
+    class Meta:
+        model = Sale
+        fields = ['payment_method', 'bank_account', 'reference']
+        widgets = {
+            'bank_account': bank_account_search(),
+        }
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if cleaned_data.get('payment_method') == 'transfer' and not cleaned_data.get('bank_account'):
+            self.add_error('bank_account', 'Bank Account is required for Transfer payments.')
+        return cleaned_data
+
+class CheckoutLineForm(forms.Form):
+    # A plain id (validated for the whole cart in one query by the formset)
+    # instead of a ModelChoiceField, which would query once per line.
+    product = forms.IntegerField(widget=product_search())
+    quantity = forms.IntegerField(min_value=1)
+    selling_price = forms.DecimalField(
+        max_digits=10, decimal_places=2, min_value=0, required=False,
+        widget=forms.NumberInput(attrs={'step': '0.01', 'min': '0', 'placeholder': 'List price'}),
+    )
+
+class BaseCheckoutLineFormSet(forms.BaseFormSet):
+    def clean(self):
+        """
+        Check every line against stock with a single query.
+        Blank selling prices default to the product's list price.
+        """
+        if any(self.errors):
+            return
+        lines = [form for form in self.forms if form.cleaned_data and not self._should_delete_form(form)]
+        if not lines:
+            raise forms.ValidationError("Add at least one item to the cart.")
+
+        wanted = Counter()
+        for form in lines:
+            wanted[form.cleaned_data['product']] += form.cleaned_data['quantity']
+
+        stock = {
+            pk: (quantity, price)
+            for pk, quantity, price in Product.objects.filter(pk__in=wanted).values_list('pk', 'quantity', 'selling_price')
+        }
+        for form in lines:
+            product_id = form.cleaned_data['product']
+            if product_id not in stock:
+                form.add_error('product', "Select a valid product.")
+                continue
+            available, list_price = stock[product_id]
+            if wanted[product_id] > available:
+                form.add_error('quantity', f"Only {available} items available in stock.")
+            if form.cleaned_data.get('selling_price') is None:
+                form.cleaned_data['selling_price'] = list_price
+
+    @property
+    def lines(self):
+        return [
+            (form.cleaned_data['product'], form.cleaned_data['quantity'], form.cleaned_data['selling_price'])
+            for form in self.forms if form.cleaned_data
+        ]
+
+CheckoutLineFormSet = forms.formset_factory(CheckoutLineForm, formset=BaseCheckoutLineFormSet, extra=3)
+
+class HistoricalSaleImportForm(forms.Form):
+    file = forms.FileField(
+        help_text="CSV with columns: date, sku, product_name, quantity, unit_cost, selling_price, reference (optional)"
+    )
+    batch_size = forms.IntegerField(min_value=1, max_value=10000, initial=1000)
+
+class DeliveryForm(forms.Form):
+    supplier = forms.CharField(max_length=100)
+    bank_account = forms.ModelChoiceField(
+        queryset=BankAccount.objects.all(),
+        required=False,
+        label='Paid From Account (Optional)'
+    )
+    file = forms.FileField(help_text="Delivery manifest CSV with columns: sku, quantity, unit_cost")
+
+class ExportFilterForm(forms.Form):
+    start = forms.DateField(required=False, widget=forms.DateInput(attrs={'type': 'date'}))
+    end = forms.DateField(required=False, widget=forms.DateInput(attrs={'type': 'date'}))
+    account = forms.ModelChoiceField(queryset=BankAccount.objects.all(), required=False)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        start, end = cleaned_data.get('start'), cleaned_data.get('end')
+        if start and end and start > end:
+            raise forms.ValidationError("Start date must not be after end date.")
+        return cleaned_data
+
+class HistoricalSaleFilterForm(forms.Form):
+    start = forms.DateField(required=False, widget=forms.DateInput(attrs={'type': 'date'}))
+    end = forms.DateField(required=False, widget=forms.DateInput(attrs={'type': 'date'}))
+    sku = forms.CharField(max_length=50, required=False, label='SKU')
+    product_name = forms.CharField(max_length=100, required=False, label='Product Name')
+
+    def filter(self, queryset):
+        data = self.cleaned_data
+        if data.get('start'):
+            queryset = queryset.filter(date__gte=data['start'])
+        if data.get('end'):
+            queryset = queryset.filter(date__lte=data['end'])
+        if data.get('sku'):
+            queryset = queryset.filter(sku=data['sku'])
+        if data.get('product_name'):
+            queryset = queryset.filter(product_name__icontains=data['product_name'])
+        return queryset
+
+from .reorder import DEFAULT_LEAD_TIME_DAYS, DEFAULT_COVER_DAYS
+
+class ReorderPlanForm(forms.Form):
+    lead_time_days = forms.IntegerField(min_value=0, max_value=365, initial=DEFAULT_LEAD_TIME_DAYS, required=False, label='Lead time (days)')
+    cover_days = forms.IntegerField(min_value=1, max_value=365, initial=DEFAULT_COVER_DAYS, required=False, label='Days of cover to order')
+    show_all = forms.BooleanField(required=False, label='Include products that need no order')
+
+class ProfitAndLossForm(forms.Form):
+    PERIOD_CHOICES = [('month', 'Monthly'), ('week', 'Weekly'), ('day', 'Daily')]
+
+    period = forms.ChoiceField(choices=PERIOD_CHOICES, initial='month', required=False)
+    start = forms.DateField(required=False, widget=forms.DateInput(attrs={'type': 'date'}))
+    end = forms.DateField(required=False, widget=forms.DateInput(attrs={'type': 'date'}))
+
+    def clean(self):
+        cleaned_data = super().clean()
+        start, end = cleaned_data.get('start'), cleaned_data.get('end')
+        if start and end and start > end:
+            raise forms.ValidationError("Start date must not be after end date.")
+        return cleaned_data
+
+class BankStatementForm(forms.Form):
+    bank_account = forms.ModelChoiceField(queryset=BankAccount.objects.all())
+    file = forms.FileField(
+        help_text="CSV with columns: date, amount (deposits positive) or credit and debit, reference and description (optional)"
+    )
+    window_days = forms.IntegerField(
+        min_value=0, max_value=31, required=False, label='Date window (days)',
+        help_text="How many days a statement date may differ from the ledger date"
+    )
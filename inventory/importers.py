@@ -0,0 +1,135 @@
+import csv
+from decimal import Decimal, InvalidOperation
+from django.db import transaction
+from .forms import HistoricalSaleForm
+from .models import HistoricalSale, Product
+from .cache import bump, DASHBOARD, REPORTS
+from .facts import record_historical_facts
+
+# ---------------------------------------------------------
+# BULK HISTORICAL SALE IMPORT
+# ---------------------------------------------------------
+# The CSV is read one row at a time and written in batches, so memory
+# stays flat no matter how large the file is. Bad rows are reported
+# and skipped; they never abort the rest of the file.
+
+HISTORICAL_SALE_COLUMNS = HistoricalSaleForm.Meta.fields
+REQUIRED_COLUMNS = [column for column in HISTORICAL_SALE_COLUMNS if column != 'reference']
+
+# Only the first errors are kept in full; the rest are just counted
+MAX_REPORTED_ERRORS = 1000
+
+
+class ImportFormatError(Exception):
+    """
+    Raised when the file itself is unusable (e.g. missing columns).
+    """
+
+
+def format_errors(form):
+    return "; ".join(
+        f"{field}: {' '.join(messages)}" for field, messages in form.errors.items()
+    )
+
+
+def import_historical_sales(stream, batch_size=1000, on_batch=None):
+    """
+    Import HistoricalSale rows from a text CSV stream.
+
+    Each row is validated with HistoricalSaleForm (the same rules as the
+    manual entry page) and valid rows are saved with bulk_create,
+    `batch_size` at a time, each batch in its own transaction.
+
+    Returns a dict: {'rows', 'created', 'error_count', 'errors'} where
+    'errors' lists (line number, message) for the first failures.
+    """
+    reader = csv.DictReader(stream)
+    missing = [column for column in REQUIRED_COLUMNS if column not in (reader.fieldnames or [])]
+    if missing:
+        raise ImportFormatError(f"Missing column(s): {', '.join(missing)}")
+
+    result = {'rows': 0, 'created': 0, 'error_count': 0, 'errors': []}
+    batch = []
+
+    def flush():
+        with transaction.atomic():
+            HistoricalSale.objects.bulk_create(batch)
+            record_historical_facts(batch)
+            bump(DASHBOARD, REPORTS)
+        result['created'] += len(batch)
+        batch.clear()
+        if on_batch:
+            on_batch(result)
+
+    # Header is line 1, so data starts on line 2
+    for line_number, row in enumerate(reader, start=2):
+        result['rows'] += 1
+        form = HistoricalSaleForm({column: (row.get(column) or '').strip() for column in HISTORICAL_SALE_COLUMNS})
+        if not form.is_valid():
+            result['error_count'] += 1
+            if len(result['errors']) < MAX_REPORTED_ERRORS:
+                result['errors'].append((line_number, format_errors(form)))
+            continue
+
+        batch.append(form.save(commit=False))
+        if len(batch) >= batch_size:
+            flush()
+
+    if batch:
+        flush()
+    return result
+
+
+# ---------------------------------------------------------
+# SUPPLIER DELIVERY MANIFEST
+# ---------------------------------------------------------
+# A delivery is all-or-nothing (it is paid with one bank debit), so the
+# whole manifest is validated before anything is written.
+
+DELIVERY_COLUMNS = ['sku', 'quantity', 'unit_cost']
+
+
+def read_delivery_manifest(stream):
+    """
+    Parse a delivery CSV (sku, quantity, unit_cost).
+    SKUs are resolved with one query for the whole file.
+
+    Returns (lines, errors): lines as (product_id, quantity, unit_cost)
+    ready for services.receive_delivery, errors as (line number, message).
+    """
+    reader = csv.DictReader(stream)
+    missing = [column for column in DELIVERY_COLUMNS if column not in (reader.fieldnames or [])]
+    if missing:
+        raise ImportFormatError(f"Missing column(s): {', '.join(missing)}")
+
+    rows, errors = [], []
+    for line_number, row in enumerate(reader, start=2):
+        sku = (row.get('sku') or '').strip()
+        try:
+            quantity = int(row.get('quantity') or '')
+            if quantity <= 0:
+                raise ValueError
+        except ValueError:
+            errors.append((line_number, "quantity: Quantity must be greater than zero."))
+            continue
+        try:
+            unit_cost = Decimal((row.get('unit_cost') or '').strip())
+            if not unit_cost.is_finite() or unit_cost < 0 or unit_cost.as_tuple().exponent < -2:
+                raise InvalidOperation
+        except InvalidOperation:
+            errors.append((line_number, "unit_cost: Enter a non-negative amount with at most 2 decimal places."))
+            continue
+        rows.append((line_number, sku, quantity, unit_cost))
+
+    product_ids = dict(
+        Product.objects.filter(sku__in={sku for _, sku, _, _ in rows}).values_list('sku', 'pk')
+    )
+    lines = []
+    for line_number, sku, quantity, unit_cost in rows:
+        if sku not in product_ids:
+            errors.append((line_number, f"sku: Unknown SKU '{sku}'."))
+            continue
+        lines.append((product_ids[sku], quantity, unit_cost))
+
+    errors.sort()
+    return lines, errors
@@ -0,0 +1,112 @@
+import cProfile
+import functools
+import os
+import random
+import time
+from contextlib import ExitStack
+from pathlib import Path
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from .metrics import registry, label_string, QueryTimer
+
+# ---------------------------------------------------------
+# SIGNAL RECEIVER INSTRUMENTATION
+# ---------------------------------------------------------
+# @instrumented under @receiver records, per receiver and sender:
+#
+#   inventory_signal_receiver_calls_total{receiver, sender}
+#   inventory_signal_receiver_duration_seconds{receiver, sender}  histogram
+#   inventory_signal_receiver_queries_total{receiver, sender}
+#
+# Times and queries are inclusive: a receiver that saves another model
+# also pays for the receivers that save triggers (e.g. process_stock_out
+# includes update_bank_balance for the sale's deposit).
+#
+# Only when SIGNAL_METRICS is on or requests are being profiled, decided
+# once when signals.py is imported: otherwise @instrumented returns the
+# receiver itself and a save pays nothing for it.
+
+ENABLED = settings.SIGNAL_METRICS or settings.PROFILE_SAMPLE_RATE > 0
+
+
+def instrumented(receiver_function):
+    if not ENABLED:
+        return receiver_function
+    name = receiver_function.__name__
+
+    @functools.wraps(receiver_function)
+    def wrapper(sender, **kwargs):
+        labels = label_string(receiver=name, sender=getattr(sender, '__name__', str(sender)))
+        timer = QueryTimer()
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(timer))
+                return receiver_function(sender, **kwargs)
+        finally:
+            registry.inc('inventory_signal_receiver_calls_total', labels)
+            registry.observe('inventory_signal_receiver_duration_seconds', labels, time.perf_counter() - started)
+            registry.inc('inventory_signal_receiver_queries_total', labels, timer.count)
+    return wrapper
+
+
+# ---------------------------------------------------------
+# SAMPLED REQUEST PROFILING
+# ---------------------------------------------------------
+# Off unless PROFILE_SAMPLE_RATE > 0. A sampled request runs under
+# cProfile (or pyinstrument, if PROFILER = "pyinstrument" and it is
+# installed) and the result is written to PROFILE_DIR:
+#
+#   <time>-<pid>-<view>.prof   open with: python -m pstats / snakeviz
+#   <time>-<pid>-<view>.html   pyinstrument's call tree
+
+
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        self.rate = getattr(settings, 'PROFILE_SAMPLE_RATE', 0)
+        if not self.rate:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.directory = Path(settings.PROFILE_DIR)
+        self.profiler = getattr(settings, 'PROFILER', 'cprofile')
+        if self.profiler == 'pyinstrument':
+            try:
+                import pyinstrument  # noqa: F401
+            except ImportError:
+                self.profiler = 'cprofile'
+
+    def __call__(self, request):
+        if random.random() >= self.rate:
+            return self.get_response(request)
+
+        if self.profiler == 'pyinstrument':
+            from pyinstrument import Profiler
+            profiler = Profiler()
+            profiler.start()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.stop()
+            self.save(request, '.html', lambda path: path.write_text(profiler.output_html()))
+        else:
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+            self.save(request, '.prof', lambda path: profiler.dump_stats(str(path)))
+        registry.inc('inventory_profiles_captured_total', label_string(profiler=self.profiler))
+        return response
+
+    def save(self, request, suffix, write):
+        match = getattr(request, 'resolver_match', None)
+        view = (match.view_name if match and match.view_name else 'unresolved').replace(':', '-')
+        stamp = time.strftime('%Y%m%d-%H%M%S')
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            write(self.directory / f"{stamp}-{os.getpid()}-{view}{suffix}")
+        except OSError:
+            pass  # a profile is never worth failing the request
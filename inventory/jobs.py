@@ -0,0 +1,232 @@
+import csv
+import gzip
+import io
+import logging
+import os
+import socket
+import time
+import zlib
+from datetime import date, timedelta
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import F
+from django.utils import timezone
+from .models import Job, JobChunk, BankAccount
+from .exports import EXPORTS, export_queryset
+from .reports import profit_and_loss
+from .routers import reporting_reads
+
+logger = logging.getLogger(__name__)
+
+# ---------------------------------------------------------
+# BACKGROUND JOBS
+# ---------------------------------------------------------
+# Heavy exports and reports are queued as Job rows instead of being
+# built inside a web request. `manage.py run_worker` claims queued jobs
+# with a conditional UPDATE (so two workers never run the same job),
+# runs them in a process pool and stores the gzip-compressed file as
+# numbered JobChunk rows, from where it is downloaded later. Rows are
+# compressed and stored as they are written, and decompressed as they
+# are downloaded, so neither side holds the whole file in memory.
+#
+# A handler takes (job, progress, output), writes the file to the text
+# stream `output` and returns (file name, content type); progress(percent)
+# records how far it got.
+
+PROGRESS_INTERVAL = 1.0  # seconds between progress writes
+CHUNK_SIZE = 1024 * 1024  # compressed bytes per JobChunk row
+
+
+def parse_date(value):
+    return date.fromisoformat(value) if value else None
+
+
+def export_job(job, progress, output):
+    params = job.params
+    account = BankAccount.objects.filter(pk=params['account']).first() if params.get('account') else None
+    queryset = export_queryset(params['kind'], parse_date(params.get('start')), parse_date(params.get('end')), account)
+    total = queryset.count() or 1
+
+    writer = csv.writer(output)
+    writer.writerow([label for _, label in EXPORTS[params['kind']]['columns']])
+    for number, row in enumerate(queryset.iterator(chunk_size=2000), start=1):
+        writer.writerow(row)
+        if number % 2000 == 0:
+            progress(number * 100 // total)
+    return f"{params['kind']}.csv", 'text/csv'
+
+
+def profit_and_loss_job(job, progress, output):
+    params = job.params
+    report = profit_and_loss(params.get('period', 'month'), parse_date(params.get('start')), parse_date(params.get('end')))
+    progress(90)
+
+    writer = csv.writer(output)
+    writer.writerow(['Period', 'Units', 'Revenue', 'COGS', 'Profit', 'Margin %'])
+    for row in report['rows'] + [dict(report['totals'], period='Total')]:
+        writer.writerow([row['period'], row['units'], row['revenue'], row['cogs'], row['profit'], row['margin'] or ''])
+    return f"pnl-{report['period']}-{report['start']}-{report['end']}.csv", 'text/csv'
+
+
+HANDLERS = {
+    'export': export_job,
+    'profit_and_loss': profit_and_loss_job,
+}
+
+
+def enqueue(kind, params, user=None):
+    if kind not in HANDLERS:
+        raise ValueError(f"Unknown job kind '{kind}'")
+    return Job.objects.create(kind=kind, params=params, created_by=user)
+
+
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def claim_next(worker):
+    """
+    Mark the oldest queued job as running and return its id (None if the queue is empty).
+    The status condition in the UPDATE makes the claim atomic across workers.
+    """
+    candidates = Job.objects.filter(status=Job.QUEUED).order_by('created_at', 'pk').values_list('pk', flat=True)[:5]
+    for pk in candidates:
+        claimed = Job.objects.filter(pk=pk, status=Job.QUEUED).update(
+            status=Job.RUNNING,
+            worker=worker,
+            started_at=timezone.now(),
+            attempts=F('attempts') + 1,
+            progress=0,
+        )
+        if claimed:
+            return pk
+    return None
+
+
+def requeue_stale(max_attempts=3):
+    """
+    Jobs left running by a worker that died: back to the queue, or
+    failed once they have used up their attempts. Returns how many were reset.
+    """
+    cutoff = timezone.now() - timedelta(seconds=settings.JOB_STALE_AFTER)
+    stale = Job.objects.filter(status=Job.RUNNING, started_at__lt=cutoff)
+    failed = stale.filter(attempts__gte=max_attempts).update(
+        status=Job.FAILED, message="Worker stopped responding", finished_at=timezone.now(),
+    )
+    requeued = stale.update(status=Job.QUEUED, worker='')
+    return failed + requeued
+
+
+def fail(job_id, message):
+    failed = Job.objects.filter(pk=job_id).exclude(status=Job.DONE).update(
+        status=Job.FAILED, message=message[:255], finished_at=timezone.now(),
+    )
+    if failed:
+        # Whatever part of the file was written is of no use
+        JobChunk.objects.filter(job_id=job_id).delete()
+
+
+class ChunkWriter(io.RawIOBase):
+    """
+    Binary stream storing what is written to it as the job's JobChunk
+    rows, CHUNK_SIZE bytes each.
+    """
+
+    def __init__(self, job_id):
+        super().__init__()
+        self.job_id = job_id
+        self.buffer = bytearray()
+        self.chunks = 0
+        self.size = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.buffer += data
+        self.size += len(data)
+        while len(self.buffer) >= CHUNK_SIZE:
+            self.store(self.buffer[:CHUNK_SIZE])
+            del self.buffer[:CHUNK_SIZE]
+        return len(data)
+
+    def store(self, data):
+        JobChunk.objects.create(job_id=self.job_id, number=self.chunks, data=bytes(data))
+        self.chunks += 1
+
+    def close(self):
+        if not self.closed and self.buffer:
+            self.store(self.buffer)
+            self.buffer.clear()
+        super().close()
+
+
+def run_job(job_id):
+    """
+    Run one claimed job to completion (called in a worker process).
+    """
+    last_write = [0.0]
+
+    def progress(percent):
+        now = time.monotonic()
+        if now - last_write[0] >= PROGRESS_INTERVAL:
+            last_write[0] = now
+            Job.objects.filter(pk=job_id).update(progress=min(int(percent), 99))
+
+    kind = None
+    try:
+        job = Job.objects.get(pk=job_id)
+        kind = job.kind
+        # A retried job starts its file over
+        JobChunk.objects.filter(job_id=job_id).delete()
+        chunks = ChunkWriter(job_id)
+        with gzip.GzipFile(fileobj=chunks, mode='wb') as compressed:
+            with io.TextIOWrapper(compressed, encoding='utf-8', newline='') as output:
+                # Handlers only read (progress updates are writes, so they stay on the primary)
+                with reporting_reads():
+                    name, content_type = HANDLERS[kind](job, progress, output)
+        chunks.close()
+    except Exception as exc:
+        logger.exception("Job %s (%s) failed", job_id, kind)
+        fail(job_id, str(exc) or exc.__class__.__name__)
+        return Job.FAILED
+
+    Job.objects.filter(pk=job_id).update(
+        status=Job.DONE,
+        progress=100,
+        message=f"{chunks.size} bytes compressed",
+        result_name=name,
+        content_type=content_type,
+        finished_at=timezone.now(),
+    )
+    return Job.DONE
+
+
+def execute(job_id):
+    """
+    Pool entry point: run the job, then release this process's connections.
+    """
+    close_old_connections()
+    try:
+        return run_job(job_id)
+    finally:
+        close_old_connections()
+
+
+def read_result(job, chunk_size=64 * 1024):
+    """
+    Decompressed result file, at most `chunk_size` bytes at a time;
+    stored chunks are loaded one by one.
+    """
+    decompressor = zlib.decompressobj(wbits=16 + zlib.MAX_WBITS)  # gzip container
+    stored = JobChunk.objects.filter(job=job).order_by('number').values_list('data', flat=True)
+    for data in stored.iterator(chunk_size=1):
+        data = bytes(data)
+        while data:
+            chunk = decompressor.decompress(data, chunk_size)
+            data = decompressor.unconsumed_tail
+            if chunk:
+                yield chunk
+    tail = decompressor.flush()
+    if tail:
+        yield tail
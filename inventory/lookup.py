@@ -0,0 +1,108 @@
+import threading
+import time
+from bisect import bisect_left
+from .cache import get_version, is_shared, PRODUCTS
+from .models import Product
+
+# ---------------------------------------------------------
+# PRODUCT AUTOCOMPLETE INDEX
+# ---------------------------------------------------------
+# Each worker keeps a sorted list of (token, product id) built from
+# sku, name, brand and model. A prefix search is a binary search plus
+# a short scan, so lookups never touch the product table.
+# The index is rebuilt lazily whenever the 'products' cache version
+# changes (bumped by the Product save/delete signals). That version is
+# shared by every worker only with a shared cache; with a per-process
+# cache (single-process development) catalogue changes made by other
+# processes (shell, management commands, the job worker) never bump it,
+# so there the index is also rebuilt once it is LOCAL_MAX_AGE seconds old.
+
+INDEXED_FIELDS = ['sku', 'name', 'brand', 'model']
+LOCAL_MAX_AGE = 60
+
+
+def tokenize(*values):
+    """
+    Lower-cased whole values plus their individual words,
+    so "Shoei GT-Air" is found by "sho", "gt" and "gt-air".
+    """
+    tokens = set()
+    for value in values:
+        value = (value or '').lower().strip()
+        if value:
+            tokens.add(value)
+            tokens.update(value.split())
+    return tokens
+
+
+class ProductIndex:
+    def __init__(self, version):
+        self.version = version
+        self.built_at = time.monotonic()
+        self.entries = {}  # id -> result payload
+        tokens = []
+        rows = Product.objects.order_by('name').values_list('pk', 'selling_price', *INDEXED_FIELDS)
+        for pk, selling_price, sku, name, brand, model in rows.iterator(chunk_size=2000):
+            self.entries[pk] = {
+                'id': pk,
+                'text': f"{name} ({sku})",
+                'sku': sku,
+                'selling_price': str(selling_price),
+            }
+            tokens.extend((token, pk) for token in tokenize(sku, name, brand, model))
+        tokens.sort()
+        self.tokens = tokens
+        self.keys = [token for token, _ in tokens]
+        # Position of each product in name order, for stable result ordering
+        self.rank = {pk: position for position, pk in enumerate(self.entries)}
+
+    def prefix(self, term):
+        """
+        Ids of products with any token starting with `term`.
+        """
+        matches = set()
+        position = bisect_left(self.keys, term)
+        while position < len(self.keys) and self.keys[position].startswith(term):
+            matches.add(self.tokens[position][1])
+            position += 1
+        return matches
+
+    def search(self, query, limit=20):
+        terms = query.lower().split()
+        if not terms:
+            return []
+        # Every word of the query must prefix-match some token; start from the rarest
+        candidates = sorted((self.prefix(term) for term in terms), key=len)
+        matches = set.intersection(*candidates)
+        ordered = sorted(matches, key=self.rank.__getitem__)[:limit]
+        return [self.entries[pk] for pk in ordered]
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def product_index():
+    """
+    The current index, rebuilt if products changed since it was built.
+    """
+    global _index
+    version = get_version(PRODUCTS)
+    max_age = None if is_shared() else LOCAL_MAX_AGE
+
+    def stale(index):
+        if index is None or index.version != version:
+            return True
+        return max_age is not None and time.monotonic() - index.built_at > max_age
+
+    index = _index
+    if stale(index):
+        with _index_lock:
+            if stale(_index):
+                _index = ProductIndex(version)
+            index = _index
+    return index
+
+
+def search_products(query, limit=20):
+    return product_index().search(query, limit)
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+from inventory.facts import LIVE, HISTORICAL, backfill_sales_facts
+
+
+class Command(BaseCommand):
+    help = "Write the SalesFact rows missing for live and historical sales (or rebuild them all)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--source", choices=[LIVE, HISTORICAL], help="Only this kind of sale (default: both)")
+        parser.add_argument("--rebuild", action="store_true", help="Delete and recompute every fact, not just the missing ones")
+        parser.add_argument("--batch-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be at least 1")
+
+        sources = [options["source"]] if options["source"] else [LIVE, HISTORICAL]
+        written = backfill_sales_facts(sources, rebuild=options["rebuild"], batch_size=options["batch_size"])
+        for source, count in written.items():
+            self.stdout.write(self.style.SUCCESS(f"Wrote {count} {source} sales facts"))
@@ -0,0 +1,40 @@
+import sys
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+from inventory.exports import EXPORTS, export_rows, stream_csv
+from inventory.routers import reporting_reads
+
+
+def parse_date(value):
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise CommandError(f"Invalid date '{value}', expected YYYY-MM-DD")
+
+
+class Command(BaseCommand):
+    help = "Stream sales, stock receipts or the bank ledger to CSV"
+
+    def add_arguments(self, parser):
+        parser.add_argument("kind", choices=sorted(EXPORTS))
+        parser.add_argument("--start", type=parse_date, help="First day to include (YYYY-MM-DD)")
+        parser.add_argument("--end", type=parse_date, help="Last day to include (YYYY-MM-DD)")
+        parser.add_argument("--account", type=int, help="Only rows for this BankAccount id")
+        parser.add_argument("--output", "-o", help="File to write (default: stdout)")
+        parser.add_argument("--chunk-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        with reporting_reads():
+            rows = export_rows(
+                options["kind"],
+                options["start"],
+                options["end"],
+                options["account"],
+                chunk_size=options["chunk_size"],
+            )
+            if options["output"]:
+                with open(options["output"], "w", newline="", encoding="utf-8") as output:
+                    output.writelines(stream_csv(rows))
+                self.stderr.write(self.style.SUCCESS(f"Wrote {options['output']}"))
+            else:
+                sys.stdout.writelines(stream_csv(rows))
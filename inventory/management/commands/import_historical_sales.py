@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+from inventory.importers import import_historical_sales, ImportFormatError
+
+
+class Command(BaseCommand):
+    help = "Stream-import legacy sales from a CSV file into HistoricalSale"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV with columns: date, sku, product_name, quantity, unit_cost, selling_price[, reference]")
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--encoding", default="utf-8-sig")
+
+    def handle(self, *args, **options):
+        def progress(result):
+            self.stdout.write(f"  {result['created']} imported, {result['error_count']} rejected...")
+
+        try:
+            with open(options["path"], newline="", encoding=options["encoding"]) as stream:
+                result = import_historical_sales(stream, batch_size=options["batch_size"], on_batch=progress)
+        except (OSError, ImportFormatError) as exc:
+            raise CommandError(str(exc))
+
+        for line_number, message in result["errors"]:
+            self.stderr.write(f"Line {line_number}: {message}")
+        if result["error_count"] > len(result["errors"]):
+            self.stderr.write(f"... and {result['error_count'] - len(result['errors'])} more errors")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {result['created']} of {result['rows']} rows ({result['error_count']} rejected)"
+        ))
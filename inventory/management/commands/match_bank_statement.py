@@ -0,0 +1,59 @@
+import csv
+import time
+from django.core.management.base import BaseCommand, CommandError
+from inventory.importers import ImportFormatError
+from inventory.models import BankAccount
+from inventory.statements import match_statement, DEFAULT_WINDOW_DAYS
+
+
+class Command(BaseCommand):
+    help = "Match a bank statement CSV against an account's BankTransaction ledger and report unmatched items"
+
+    def add_arguments(self, parser):
+        parser.add_argument("account", type=int, help="BankAccount id the statement belongs to")
+        parser.add_argument("path", help="CSV with columns: date, amount (or credit and debit)[, reference, description]")
+        parser.add_argument("--window", type=int, default=DEFAULT_WINDOW_DAYS, help="Days a statement date may differ from the ledger")
+        parser.add_argument("--encoding", default="utf-8-sig")
+        parser.add_argument("--output", help="Write the unmatched items of both sides to this CSV file")
+
+    def handle(self, *args, **options):
+        if options["window"] < 0:
+            raise CommandError("--window must not be negative")
+        try:
+            account = BankAccount.objects.get(pk=options["account"])
+        except BankAccount.DoesNotExist:
+            raise CommandError(f"Bank account #{options['account']} does not exist")
+
+        started = time.perf_counter()
+        try:
+            with open(options["path"], newline="", encoding=options["encoding"]) as stream:
+                result = match_statement(stream, account, window_days=options["window"])
+        except (OSError, ImportFormatError, UnicodeDecodeError, csv.Error) as exc:
+            raise CommandError(str(exc))
+        elapsed = time.perf_counter() - started
+
+        for line_number, message in result["errors"]:
+            self.stderr.write(f"Line {line_number}: {message}")
+        if result["error_count"] > len(result["errors"]):
+            self.stderr.write(f"... and {result['error_count'] - len(result['errors'])} more errors")
+
+        if options["output"]:
+            with open(options["output"], "w", newline="") as output:
+                writer = csv.writer(output)
+                writer.writerow(["side", "line_or_transaction", "date", "amount", "reference", "description"])
+                for row in result["unmatched_statement"]:
+                    writer.writerow(["statement", *row])
+                for row in result["unmatched_ledger"]:
+                    writer.writerow(["ledger", *row])
+
+        self.stdout.write(
+            f"{result['lines']} statement lines, ledger {result['start']} to {result['end']}: "
+            f"{result['matched']} matched ({result['matched_by_reference']} by reference, "
+            f"{result['matched_by_amount']} by amount) in {elapsed:.2f} s"
+        )
+        unmatched = len(result["unmatched_statement"]) + len(result["unmatched_ledger"])
+        summary = (
+            f"{len(result['unmatched_statement'])} statement lines and "
+            f"{len(result['unmatched_ledger'])} ledger transactions unmatched"
+        )
+        self.stdout.write(self.style.SUCCESS(summary) if not unmatched else self.style.WARNING(summary))
@@ -0,0 +1,27 @@
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+from inventory.rollups import rebuild_daily_summary
+
+
+def parse_date(value):
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise CommandError(f"Invalid date '{value}', expected YYYY-MM-DD")
+
+
+class Command(BaseCommand):
+    help = "Rebuild the DailySalesSummary rollup from StockOut (all dates or a date range)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--start", type=parse_date, help="First day to rebuild (YYYY-MM-DD)")
+        parser.add_argument("--end", type=parse_date, help="Last day to rebuild (YYYY-MM-DD)")
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        start, end = options["start"], options["end"]
+        if start and end and start > end:
+            raise CommandError("--start must not be after --end")
+
+        written = rebuild_daily_summary(start, end, batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {written} daily summary rows"))
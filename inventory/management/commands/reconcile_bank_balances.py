@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from inventory.reconcile import reconcile_all
+
+
+class Command(BaseCommand):
+    help = "Verify (and optionally repair / checkpoint) bank balances by replaying transactions since the last checkpoint"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--account", type=int, action="append", help="BankAccount id (repeatable; default: all)")
+        parser.add_argument("--repair", action="store_true", help="Overwrite wrong balances with the replayed value")
+        parser.add_argument("--checkpoint", action="store_true", help="Save a new checkpoint for verified balances")
+
+    def handle(self, *args, **options):
+        results = reconcile_all(
+            repair=options["repair"],
+            checkpoint=options["checkpoint"],
+            account_ids=options["account"],
+        )
+        mismatches = 0
+        for result in results:
+            line = (
+                f"{result['name']} (#{result['account']}): stored {result['stored_balance']}, "
+                f"expected {result['expected']}, replayed {result['replayed_transactions']} transactions"
+            )
+            if result["ok"]:
+                self.stdout.write(self.style.SUCCESS(f"OK   {line}"))
+            else:
+                mismatches += 1
+                status = "FIXED" if result["repaired"] else "DIFF"
+                self.stdout.write(self.style.ERROR(f"{status} {line} (difference {result['difference']})"))
+            if result["checkpoint_created"]:
+                self.stdout.write(f"     checkpoint saved as of posting {result['checkpoint_as_of']}")
+
+        self.stdout.write(f"{len(results)} accounts checked, {mismatches} mismatched")
@@ -0,0 +1,40 @@
+import json
+from django.core.management.base import BaseCommand, CommandError
+from inventory.benchmarks import run_benchmarks, compare
+
+
+class Command(BaseCommand):
+    help = "Time the main views, signal cascades and services, with query counts, and write the results as JSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeat", type=int, default=5, help="Runs per benchmark")
+        parser.add_argument("--only", action="append", help="Only benchmarks whose name starts with this (repeatable), e.g. view:dashboard")
+        parser.add_argument("--output", "-o", help="JSON file to write (default: stdout)")
+        parser.add_argument("--compare", help="Earlier results file to compare against")
+
+    def handle(self, *args, **options):
+        try:
+            report = run_benchmarks(repeat=options["repeat"], only=options["only"])
+        except (ValueError, AssertionError) as exc:
+            raise CommandError(str(exc))
+
+        payload = json.dumps(report, indent=2, sort_keys=True)
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                output.write(payload + "\n")
+        else:
+            self.stdout.write(payload)
+
+        if options["compare"]:
+            try:
+                with open(options["compare"]) as baseline_file:
+                    baseline = json.load(baseline_file)
+            except (OSError, ValueError) as exc:
+                raise CommandError(f"Cannot read {options['compare']}: {exc}")
+            self.stdout.write(f"{'benchmark':<36} {'before':>10} {'after':>10} {'change':>8} {'queries':>8}")
+            for name, before, after, change, queries in compare(baseline, report):
+                self.stdout.write(
+                    f"{name:<36} {before if before is not None else '-':>10} {after:>10} "
+                    f"{f'{change:+.1f}%' if change is not None else '-':>8} "
+                    f"{f'{queries:+d}' if queries is not None else '-':>8}"
+                )
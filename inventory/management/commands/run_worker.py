@@ -0,0 +1,78 @@
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, close_old_connections, connections
+from inventory.jobs import claim_next, requeue_stale, worker_name, execute, fail
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs (exports, reports) in a pool of worker processes"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--processes", type=int, default=2, help="Jobs run in parallel")
+        parser.add_argument("--poll-interval", type=float, default=2.0, help="Seconds between queue checks when idle")
+        parser.add_argument("--once", action="store_true", help="Exit when the queue is empty")
+
+    def handle(self, *args, **options):
+        worker = worker_name()
+        reset = requeue_stale()
+        if reset:
+            self.stdout.write(f"Reset {reset} stale job(s)")
+        # Pool processes are spawned fresh: each sets Django up and opens
+        # its own database connections (none are shared with this process)
+        connections.close_all()
+
+        running = {}
+        with ProcessPoolExecutor(
+            max_workers=options["processes"],
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=django.setup,
+        ) as pool:
+            self.stdout.write(f"Worker {worker} started with {options['processes']} process(es)")
+            while True:
+                try:
+                    while len(running) < options["processes"]:
+                        job_id = claim_next(worker)
+                        if job_id is None:
+                            break
+                        self.stdout.write(f"Job #{job_id} started")
+                        running[pool.submit(execute, job_id)] = job_id
+                except DatabaseError as exc:
+                    # Database restarting or unreachable: retry after the poll interval
+                    self.stderr.write(self.style.ERROR(f"Could not claim jobs: {exc}"))
+                    close_old_connections()
+                    time.sleep(options["poll_interval"])
+                    continue
+
+                if not running:
+                    if options["once"]:
+                        break
+                    time.sleep(options["poll_interval"])
+                    continue
+
+                done, _ = wait(running, timeout=options["poll_interval"], return_when=FIRST_COMPLETED)
+                for future in done:
+                    job_id = running.pop(future)
+                    try:
+                        status = future.result()
+                    except BrokenProcessPool:
+                        # A pool process died (e.g. out of memory): the pool is unusable
+                        for job in [job_id, *running.values()]:
+                            fail(job, "Worker process crashed")
+                        raise CommandError(f"Worker process crashed while running job #{job_id}")
+                    except Exception as exc:
+                        # run_job could not even record the failure (e.g. a database error)
+                        status = self.record_failure(job_id, exc)
+                    style = self.style.SUCCESS if status == "done" else self.style.ERROR
+                    self.stdout.write(style(f"Job #{job_id} {status}"))
+
+    def record_failure(self, job_id, exc):
+        try:
+            fail(job_id, str(exc) or exc.__class__.__name__)
+        except DatabaseError:
+            # Still unreachable: requeue_stale() resets the job later
+            close_old_connections()
+        return "failed"
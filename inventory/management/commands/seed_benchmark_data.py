@@ -0,0 +1,33 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from inventory.benchmarks import SCALES, row_counts, seed_benchmark_data
+
+
+class Command(BaseCommand):
+    help = "Bulk-generate products, stock movements, bank transactions and legacy sales for benchmarking (use a scratch database)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--scale", choices=sorted(SCALES), default="10k", help="Number of sales to generate")
+        parser.add_argument("--days", type=int, default=365, help="Spread live records over this many days")
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--seed", type=int, default=0, help="Random seed (same seed, same data)")
+
+    def handle(self, *args, **options):
+        rows = SCALES[options["scale"]]
+        planned = ", ".join(f"{count} {kind}" for kind, count in row_counts(rows).items())
+        self.stdout.write(f"Seeding {planned}")
+
+        started = time.perf_counter()
+        try:
+            created = seed_benchmark_data(
+                rows,
+                days=options["days"],
+                batch_size=options["batch_size"],
+                seed=options["seed"],
+                log=self.stdout.write,
+            )
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        summary = ", ".join(f"{count} {kind}" for kind, count in created.items())
+        self.stdout.write(self.style.SUCCESS(f"Created {summary} in {time.perf_counter() - started:.1f}s"))
@@ -0,0 +1,49 @@
+import sqlite3
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from inventory.routers import REPORTING
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy the primary SQLite database into the reporting SQLite database "
+        "(local stand-in for a read replica; use the database's own replication in production)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--interval", type=float, help="Keep copying every N seconds instead of once")
+        parser.add_argument("--pages", type=int, default=1024, help="Pages copied per step (writers are blocked only per step)")
+
+    def handle(self, *args, **options):
+        if REPORTING not in connections.databases:
+            raise CommandError("No reporting database configured (set REPORTING_DATABASE_URL)")
+        source, target = connections[DEFAULT_DB_ALIAS], connections[REPORTING]
+        if source.vendor != "sqlite" or target.vendor != "sqlite":
+            raise CommandError("sync_reporting_db only copies SQLite to SQLite")
+        if str(source.settings_dict["NAME"]) == str(target.settings_dict["NAME"]):
+            raise CommandError("The reporting database is the primary database")
+
+        interval = options["interval"]
+        while True:
+            started = time.perf_counter()
+            self.copy(source, target.settings_dict["NAME"], options["pages"])
+            self.stdout.write(f"Reporting database synced in {time.perf_counter() - started:.2f} s")
+            if not interval:
+                return
+            time.sleep(interval)
+
+    def copy(self, source, target_name, pages):
+        """
+        Online backup: a consistent snapshot of the primary, copied while
+        the application keeps writing to it.
+        """
+        source.ensure_connection()
+        # A separate connection: Django's own "reporting" connection may be
+        # in use by readers of this process, and is read-only by intent
+        target = sqlite3.connect(str(target_name))
+        try:
+            source.connection.backup(target, pages=pages)
+        finally:
+            target.close()
+            source.close()
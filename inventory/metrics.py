@@ -0,0 +1,297 @@
+import atexit
+import json
+import os
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from django.conf import settings
+from django.db import connections
+
+# ---------------------------------------------------------
+# REQUEST METRICS
+# ---------------------------------------------------------
+# Every worker process aggregates its own counters and histograms in
+# memory and regularly writes them to METRICS_DIR/<pid>-<start>.json.
+# /metrics merges the files of all workers (including ones that have
+# exited, so totals never go backwards) into the Prometheus text format.
+# Only processes that serve requests (those that loaded MetricsMiddleware)
+# write a file: manage.py commands, the job worker and the preloading
+# gunicorn master keep their numbers to themselves.
+#
+#   inventory_http_requests_total{view, method, status}
+#   inventory_http_request_duration_seconds{view, method}   histogram
+#   inventory_db_queries_per_request{view}                  histogram
+#   inventory_db_query_duration_seconds_total{view}
+#
+# Signal receivers add their own series when SIGNAL_METRICS is on (see
+# inventory/instrumentation.py).
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+HISTOGRAMS = {
+    'inventory_http_request_duration_seconds': LATENCY_BUCKETS,
+    'inventory_db_queries_per_request': QUERY_BUCKETS,
+    'inventory_signal_receiver_duration_seconds': LATENCY_BUCKETS,
+}
+HELP = {
+    'inventory_http_requests_total': 'Requests handled, by view, method and status class.',
+    'inventory_http_request_duration_seconds': 'Time to produce the response, by view and method.',
+    'inventory_db_queries_per_request': 'Database queries issued per request, by view.',
+    'inventory_db_query_duration_seconds_total': 'Time spent in database queries, by view.',
+    'inventory_signal_receiver_calls_total': 'Signal receiver calls, by receiver and sender.',
+    'inventory_signal_receiver_duration_seconds': 'Receiver wall time including nested saves, by receiver and sender.',
+    'inventory_signal_receiver_queries_total': 'Queries issued by receivers (including nested saves), by receiver and sender.',
+    'inventory_profiles_captured_total': 'Requests captured by the sampling profiler.',
+}
+
+UNRESOLVED = '<unresolved>'
+
+
+def label_string(**labels):
+    def escape(value):
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return ','.join(f'{name}="{escape(value)}"' for name, value in labels.items())
+
+
+class Registry:
+    """
+    This process's counters and histograms, keyed by metric name and
+    then by rendered label string, e.g. 'view="dashboard",method="GET"'.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.serving = False
+        self.reset()
+
+    def reset(self):
+        self.pid = os.getpid()
+        self.file_name = f"{self.pid}-{int(time.time() * 1000)}.json"
+        self.counters = {}
+        self.histograms = {}
+        self.flushed_at = 0.0
+
+    def check_fork(self):
+        # A forked worker starts with a copy of its parent's numbers
+        if os.getpid() != self.pid:
+            self.reset()
+
+    def inc(self, name, labels, value=1):
+        with self.lock:
+            self.check_fork()
+            series = self.counters.setdefault(name, {})
+            series[labels] = series.get(labels, 0) + value
+
+    def observe(self, name, labels, value):
+        buckets = HISTOGRAMS[name]
+        with self.lock:
+            self.check_fork()
+            series = self.histograms.setdefault(name, {})
+            histogram = series.get(labels)
+            if histogram is None:
+                histogram = series[labels] = {'buckets': [0] * len(buckets), 'sum': 0, 'count': 0}
+            for position, bound in enumerate(buckets):
+                if value <= bound:
+                    histogram['buckets'][position] += 1
+                    break
+            histogram['sum'] += value
+            histogram['count'] += 1
+
+    def snapshot(self):
+        with self.lock:
+            self.check_fork()
+            return json.loads(json.dumps({'counters': self.counters, 'histograms': self.histograms}))
+
+    def flush(self, force=False):
+        """
+        Write this process's numbers to METRICS_DIR (at most every METRICS_FLUSH_SECONDS).
+        """
+        directory = metrics_dir()
+        if directory is None or not self.serving:
+            return
+        now = time.monotonic()
+        if not force and now - self.flushed_at < settings.METRICS_FLUSH_SECONDS:
+            return
+        self.flushed_at = now
+        snapshot = self.snapshot()
+        if not snapshot['counters'] and not snapshot['histograms']:
+            return  # e.g. the gunicorn master, which never handles a request
+        path = directory / self.file_name
+        temporary = path.with_suffix('.tmp')
+        try:
+            directory.mkdir(parents=True, exist_ok=True)
+            temporary.write_text(json.dumps(snapshot))
+            os.replace(temporary, path)  # readers never see a half-written file
+        except OSError:
+            pass  # metrics must never break a request; retried on the next flush
+
+
+registry = Registry()
+atexit.register(lambda: registry.flush(force=True))
+
+
+def metrics_dir():
+    directory = getattr(settings, 'METRICS_DIR', None)
+    return Path(directory) if directory else None
+
+
+def merge(target, snapshot):
+    for name, series in snapshot.get('counters', {}).items():
+        merged = target['counters'].setdefault(name, {})
+        for labels, value in series.items():
+            merged[labels] = merged.get(labels, 0) + value
+    for name, series in snapshot.get('histograms', {}).items():
+        merged = target['histograms'].setdefault(name, {})
+        for labels, histogram in series.items():
+            current = merged.get(labels)
+            if current is None:
+                merged[labels] = {'buckets': list(histogram['buckets']), 'sum': histogram['sum'], 'count': histogram['count']}
+                continue
+            current['buckets'] = [a + b for a, b in zip(current['buckets'], histogram['buckets'])]
+            current['sum'] += histogram['sum']
+            current['count'] += histogram['count']
+
+
+def collect():
+    """
+    Numbers of every worker: the metrics files, or just this process
+    when METRICS_DIR is not configured.
+    """
+    directory = metrics_dir()
+    if directory is None:
+        return registry.snapshot()
+
+    registry.flush(force=True)
+    totals = {'counters': {}, 'histograms': {}}
+    for path in directory.glob('*.json'):
+        try:
+            merge(totals, json.loads(path.read_text()))
+        except (OSError, ValueError):
+            continue  # removed or replaced while reading
+    return totals
+
+
+def number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render(totals):
+    """
+    Prometheus text exposition format (version 0.0.4).
+    """
+    lines = []
+    for name in sorted(totals['counters']):
+        lines.append(f"# HELP {name} {HELP.get(name, name)}")
+        lines.append(f"# TYPE {name} counter")
+        for labels, value in sorted(totals['counters'][name].items()):
+            lines.append(f"{name}{{{labels}}} {number(value)}")
+    for name in sorted(totals['histograms']):
+        bounds = HISTOGRAMS.get(name)
+        if bounds is None:
+            continue
+        lines.append(f"# HELP {name} {HELP.get(name, name)}")
+        lines.append(f"# TYPE {name} histogram")
+        for labels, histogram in sorted(totals['histograms'][name].items()):
+            cumulative = 0
+            for bound, observed in zip(bounds, histogram['buckets']):
+                cumulative += observed
+                lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {histogram["count"]}')
+            lines.append(f"{name}_sum{{{labels}}} {number(histogram['sum'])}")
+            lines.append(f"{name}_count{{{labels}}} {histogram['count']}")
+    return '\n'.join(lines) + '\n'
+
+
+# ---------------------------------------------------------
+# QUERY WRAPPERS ACROSS THREADS
+# ---------------------------------------------------------
+# connection.execute_wrapper() only sees the current thread's
+# connections. Queries a request hands to pool threads with their own
+# connections (the async dashboards, see reports.in_own_connection) are
+# still the request's: wrapping_queries() also records its wrapper in a
+# context variable, which follows the request into those threads, and
+# inherited_wrappers() installs it on their connections. Wrappers must
+# therefore be thread-safe.
+
+active_wrappers = ContextVar('inventory_query_wrappers', default=())
+
+
+@contextmanager
+def wrapping_queries(wrapper):
+    """
+    Install `wrapper` on every connection of this thread and of the
+    pool threads working on its behalf.
+    """
+    token = active_wrappers.set(active_wrappers.get() + (wrapper,))
+    try:
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(wrapper))
+            yield wrapper
+    finally:
+        active_wrappers.reset(token)
+
+
+@contextmanager
+def inherited_wrappers():
+    """
+    In a pool thread: install the wrappers of the code that handed it work.
+    """
+    with ExitStack() as stack:
+        for wrapper in active_wrappers.get():
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(wrapper))
+        yield
+
+
+class QueryTimer:
+    """
+    Database execute wrapper counting queries and their total time.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            with self.lock:
+                self.duration += time.perf_counter() - started
+                self.count += 1
+
+
+class MetricsMiddleware:
+    """
+    Records latency, query count and database time per URL name.
+    Keep it first in MIDDLEWARE so the whole stack is timed.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        registry.serving = True
+
+    def __call__(self, request):
+        timer = QueryTimer()
+        started = time.perf_counter()
+        with wrapping_queries(timer):
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match and match.view_name else UNRESOLVED
+        registry.inc(
+            'inventory_http_requests_total',
+            label_string(view=view, method=request.method, status=f"{response.status_code // 100}xx"),
+        )
+        registry.observe('inventory_http_request_duration_seconds', label_string(view=view, method=request.method), elapsed)
+        registry.observe('inventory_db_queries_per_request', label_string(view=view), timer.count)
+        registry.inc('inventory_db_query_duration_seconds_total', label_string(view=view), timer.duration)
+        registry.flush()
+        return response
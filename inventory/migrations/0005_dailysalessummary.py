@@ -0,0 +1,67 @@
+# Generated by Django 4.2.7 on 2026-10-16 23:49
+
+from django.db import migrations, models
+from django.db.models import Sum, F, DecimalField, ExpressionWrapper
+from django.db.models.functions import TruncDate
+import django.db.models.deletion
+
+
+def backfill_daily_sales(apps, schema_editor):
+    StockOut = apps.get_model('inventory', 'StockOut')
+    DailySalesSummary = apps.get_model('inventory', 'DailySalesSummary')
+    money = DecimalField(max_digits=14, decimal_places=2)
+
+    rows = (
+        StockOut.objects.using(schema_editor.connection.alias)
+        .annotate(day=TruncDate('date'))
+        .values('day', 'product_id', 'payment_method')
+        .annotate(
+            units=Sum('quantity'),
+            revenue=Sum(ExpressionWrapper(F('quantity') * F('selling_price'), output_field=money)),
+            cost=Sum(ExpressionWrapper(F('quantity') * F('cost_at_sale'), output_field=money)),
+        )
+        .order_by()
+    )
+    DailySalesSummary.objects.using(schema_editor.connection.alias).bulk_create(
+        [
+            DailySalesSummary(
+                date=row['day'],
+                product_id=row['product_id'],
+                payment_method=row['payment_method'],
+                units=row['units'],
+                revenue=row['revenue'],
+                cost=row['cost'],
+                profit=row['revenue'] - row['cost'],
+            )
+            for row in rows
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0004_historicalsale'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySalesSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('payment_method', models.CharField(choices=[('cash', 'Cash'), ('transfer', 'Bank Transfer')], max_length=20)),
+                ('units', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0.0, max_digits=14)),
+                ('cost', models.DecimalField(decimal_places=2, default=0.0, max_digits=14)),
+                ('profit', models.DecimalField(decimal_places=2, default=0.0, max_digits=14)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='inventory.product')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='dailysalessummary',
+            constraint=models.UniqueConstraint(fields=('date', 'product', 'payment_method'), name='unique_daily_sales_summary'),
+        ),
+        migrations.RunPython(backfill_daily_sales, migrations.RunPython.noop),
+    ]
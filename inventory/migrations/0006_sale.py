@@ -0,0 +1,30 @@
+# Generated by Django 4.2.7 on 2026-10-16 23:51
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0005_dailysalessummary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Sale',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('payment_method', models.CharField(choices=[('cash', 'Cash'), ('transfer', 'Bank Transfer')], max_length=20)),
+                ('reference', models.CharField(blank=True, max_length=100, null=True)),
+                ('date', models.DateTimeField(auto_now_add=True)),
+                ('bank_account', models.ForeignKey(blank=True, help_text='Account receiving the payment (if Transfer)', null=True, on_delete=django.db.models.deletion.SET_NULL, to='inventory.bankaccount')),
+                ('bank_transaction', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='sale_record', to='inventory.banktransaction')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='stockout',
+            name='sale',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='lines', to='inventory.sale'),
+        ),
+    ]
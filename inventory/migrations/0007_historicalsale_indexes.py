@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-16 23:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0006_sale'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='historicalsale',
+            index=models.Index(fields=['date', 'id'], name='hist_sale_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='historicalsale',
+            index=models.Index(fields=['sku', 'date', 'id'], name='hist_sale_sku_date_idx'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 4.2.7 on 2026-10-16 23:59
+
+from django.db import migrations, models
+from django.db.models import Max
+import django.db.models.deletion
+
+
+def seed_checkpoints(apps, schema_editor):
+    """
+    Trust today's balances as the starting point for every existing account.
+    """
+    db = schema_editor.connection.alias
+    BankAccount = apps.get_model('inventory', 'BankAccount')
+    BalanceCheckpoint = apps.get_model('inventory', 'BalanceCheckpoint')
+    BalanceCheckpoint.objects.using(db).bulk_create([
+        BalanceCheckpoint(
+            bank_account_id=account.pk,
+            as_of_transaction_id=account.last_transaction_id or 0,
+            balance=account.balance,
+        )
+        for account in BankAccount.objects.using(db).annotate(last_transaction_id=Max('transactions__id'))
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0007_historicalsale_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BalanceCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('as_of_transaction_id', models.BigIntegerField(default=0)),
+                ('balance', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('bank_account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='checkpoints', to='inventory.bankaccount')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['bank_account', 'as_of_transaction_id'], name='checkpoint_account_txn_idx')],
+            },
+        ),
+        migrations.RunPython(seed_checkpoints, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 4.2.7 on 2026-10-17 00:29
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0010_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SalesFact',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(choices=[('live', 'Live sale'), ('historical', 'Historical sale')], max_length=10)),
+                ('source_id', models.BigIntegerField(help_text='Primary key of the StockOut or HistoricalSale')),
+                ('date', models.DateField()),
+                ('month', models.DateField(help_text="First day of the sale's month")),
+                ('sku', models.CharField(max_length=50)),
+                ('product_name', models.CharField(max_length=100)),
+                ('brand', models.CharField(blank=True, max_length=50)),
+                ('size', models.CharField(blank=True, max_length=10)),
+                ('color', models.CharField(blank=True, max_length=30)),
+                ('payment_method', models.CharField(blank=True, max_length=20)),
+                ('quantity', models.PositiveIntegerField()),
+                ('revenue', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('cost', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('profit', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('product', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='inventory.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['month', 'brand', 'size'], name='sales_fact_month_brand_idx'), models.Index(fields=['brand', 'size', 'month'], name='sales_fact_brand_size_idx'), models.Index(fields=['size', 'month'], name='sales_fact_size_month_idx'), models.Index(fields=['sku', 'date'], name='sales_fact_sku_date_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='salesfact',
+            constraint=models.UniqueConstraint(fields=('source', 'source_id'), name='unique_sales_fact_source'),
+        ),
+    ]
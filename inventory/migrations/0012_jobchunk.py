@@ -0,0 +1,31 @@
+# Generated by Django 4.2.7 on 2026-10-17 00:42
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0011_salesfact'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='job',
+            name='result',
+        ),
+        migrations.CreateModel(
+            name='JobChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.PositiveIntegerField()),
+                ('data', models.BinaryField()),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chunks', to='inventory.job')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='jobchunk',
+            constraint=models.UniqueConstraint(fields=('job', 'number'), name='unique_job_chunk'),
+        ),
+    ]
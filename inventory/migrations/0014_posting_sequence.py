@@ -0,0 +1,76 @@
+# Generated by Django 4.2.7 on 2026-10-17 01:30
+
+from django.db import migrations, models
+
+
+def number_postings(apps, schema_editor):
+    """
+    Number every account's existing transactions in id order, and move
+    each checkpoint from its transaction id to the matching sequence.
+    """
+    db = schema_editor.connection.alias
+    BankAccount = apps.get_model('inventory', 'BankAccount')
+    BankTransaction = apps.get_model('inventory', 'BankTransaction')
+    BalanceCheckpoint = apps.get_model('inventory', 'BalanceCheckpoint')
+
+    for account in BankAccount.objects.using(db).only('pk'):
+        transactions = BankTransaction.objects.using(db).filter(bank_account_id=account.pk).order_by('pk').only('pk')
+        batch, sequence = [], 0
+        for bank_transaction in transactions.iterator(chunk_size=2000):
+            sequence += 1
+            bank_transaction.sequence = sequence
+            batch.append(bank_transaction)
+            if len(batch) >= 2000:
+                BankTransaction.objects.using(db).bulk_update(batch, ['sequence'])
+                batch = []
+        if batch:
+            BankTransaction.objects.using(db).bulk_update(batch, ['sequence'])
+        BankAccount.objects.using(db).filter(pk=account.pk).update(posted_sequence=sequence)
+
+        for checkpoint in BalanceCheckpoint.objects.using(db).filter(bank_account_id=account.pk):
+            checkpoint.as_of_sequence = BankTransaction.objects.using(db).filter(
+                bank_account_id=account.pk, pk__lte=checkpoint.as_of_transaction_id
+            ).count()
+            checkpoint.save(update_fields=['as_of_sequence'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0013_cacheversion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bankaccount',
+            name='posted_sequence',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='banktransaction',
+            name='sequence',
+            field=models.BigIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='balancecheckpoint',
+            name='as_of_sequence',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.RunPython(number_postings, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='balancecheckpoint',
+            name='checkpoint_account_txn_idx',
+        ),
+        migrations.RemoveField(
+            model_name='balancecheckpoint',
+            name='as_of_transaction_id',
+        ),
+        migrations.AddIndex(
+            model_name='balancecheckpoint',
+            index=models.Index(fields=['bank_account', 'as_of_sequence'], name='checkpoint_account_seq_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='banktransaction',
+            index=models.Index(fields=['bank_account', 'sequence'], name='bank_txn_account_seq_idx'),
+        ),
+    ]
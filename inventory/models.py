@@ -52,6 +52,9 @@ class StockIn(models.Model):
 class BankAccount(models.Model):
     name = models.CharField(max_length=100)
     balance = models.DecimalField(max_digits=12, decimal_places=2, default=0.00)
+    # Number of transactions posted to `balance`; each posting takes the
+    # next one under this row's lock (see inventory/reconcile.py)
+    posted_sequence = models.BigIntegerField(default=0, editable=False)
 
     def __str__(self):
         return f"{self.name} (${self.balance})"
@@ -78,10 +81,37 @@ class BankTransaction(models.Model):
     description = models.CharField(max_length=255)
     reference = models.CharField(max_length=100, blank=True, null=True)
     date = models.DateTimeField(auto_now_add=True)
+    # Position among the account's postings, in commit order (empty until posted)
+    sequence = models.BigIntegerField(null=True, blank=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['bank_account', 'sequence'], name='bank_txn_account_seq_idx'),
+        ]
 
     def __str__(self):
         return f"{self.date.strftime('%Y-%m-%d')} - {self.category} - {self.amount}"
 
+class BalanceCheckpoint(models.Model):
+    """
+    A verified BankAccount balance as of a given posting.
+    Reconciling replays only the transactions posted after the latest checkpoint:
+        Balance = checkpoint.balance + signed sum of transactions with sequence > as_of_sequence
+    """
+    bank_account = models.ForeignKey(BankAccount, on_delete=models.CASCADE, related_name='checkpoints')
+    # Last posting sequence included in `balance` (0 = before any transaction)
+    as_of_sequence = models.BigIntegerField(default=0)
+    balance = models.DecimalField(max_digits=12, decimal_places=2)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['bank_account', 'as_of_sequence'], name='checkpoint_account_seq_idx'),
+        ]
+
+    def __str__(self):
+        return f"CHECKPOINT: {self.bank_account_id} @ {self.as_of_sequence} = {self.balance}"
+
 class OwnerDrawing(models.Model):
     """
     Tracks money taken out by the owner.
@@ -142,15 +172,57 @@ class StockIn(models.Model):
         return f"IN: {self.product.name} (+{self.quantity})"
 
 
-class StockOut(models.Model):
+class Sale(models.Model):
+    """
+    A checkout receipt: one customer, one payment, many StockOut lines.
+    """
     PAYMENT_METHODS = [
         ('cash', 'Cash'),
         ('transfer', 'Bank Transfer'),
     ]
 
+    payment_method = models.CharField(max_length=20, choices=PAYMENT_METHODS)
+    bank_account = models.ForeignKey(
+        BankAccount,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        help_text="Account receiving the payment (if Transfer)"
+    )
+    reference = models.CharField(max_length=100, blank=True, null=True)
+    date = models.DateTimeField(auto_now_add=True)
+
+    # One aggregated deposit per receipt for transfer payments
+    bank_transaction = models.OneToOneField(
+        BankTransaction,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='sale_record'
+    )
+
+    def total_sale(self):
+        return sum(line.total_sale() for line in self.lines.all())
+
+    def __str__(self):
+        return f"SALE #{self.pk} ({self.date.strftime('%Y-%m-%d')})"
+
+
+class StockOut(models.Model):
+    PAYMENT_METHODS = Sale.PAYMENT_METHODS
+
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField()
     selling_price = models.DecimalField(max_digits=10, decimal_places=2)
+
+    # Receipt this line belongs to (empty for single-item sales)
+    sale = models.ForeignKey(
+        Sale,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='lines'
+    )
     
     # New: Lock in the cost at the moment of sale
     # This is critical for accurate historical profit reports
@@ -210,6 +282,14 @@ class HistoricalSale(models.Model):
     
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Keyset pagination (newest first) and date-range filters
+            models.Index(fields=['date', 'id'], name='hist_sale_date_id_idx'),
+            # SKU filter combined with the same ordering
+            models.Index(fields=['sku', 'date', 'id'], name='hist_sale_sku_date_idx'),
+        ]
+
     @property
     def total_revenue(self):
         return self.quantity * self.selling_price
@@ -224,3 +304,176 @@ class HistoricalSale(models.Model):
 
     def __str__(self):
         return f"HIST: {self.product_name} ({self.date})"
+
+
+class DailySalesSummary(models.Model):
+    """
+    Pre-aggregated sales per day, product and payment method.
+    Maintained incrementally as each StockOut is recorded, edited or
+    deleted, so reports read one row per day/product instead of every
+    individual sale.
+    Rebuild with: python manage.py rebuild_sales_summary
+    """
+    date = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='daily_sales')
+    payment_method = models.CharField(max_length=20, choices=StockOut.PAYMENT_METHODS)
+
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0.00)
+    cost = models.DecimalField(max_digits=14, decimal_places=2, default=0.00)
+    profit = models.DecimalField(max_digits=14, decimal_places=2, default=0.00)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['date', 'product', 'payment_method'],
+                name='unique_daily_sales_summary',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.date} - {self.product_id} ({self.payment_method}): {self.units}"
+
+
+class SalesFact(models.Model):
+    """
+    One row per sale line, live (StockOut) or legacy (HistoricalSale), in
+    a single flat shape for ad-hoc analytics: the product's attributes are
+    copied in and revenue / cost / profit precomputed, so grouping by
+    brand, size or month never joins Product or multiplies per row.
+    Maintained on write (see inventory/facts.py).
+    Backfill with: python manage.py backfill_sales_facts
+    """
+    LIVE = 'live'
+    HISTORICAL = 'historical'
+    SOURCES = [
+        (LIVE, 'Live sale'),
+        (HISTORICAL, 'Historical sale'),
+    ]
+
+    source = models.CharField(max_length=10, choices=SOURCES)
+    source_id = models.BigIntegerField(help_text="Primary key of the StockOut or HistoricalSale")
+    date = models.DateField()
+    month = models.DateField(help_text="First day of the sale's month")
+
+    # Historical sales are linked by SKU when the product still exists
+    product = models.ForeignKey(Product, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    sku = models.CharField(max_length=50)
+    product_name = models.CharField(max_length=100)
+    brand = models.CharField(max_length=50, blank=True)
+    size = models.CharField(max_length=10, blank=True)
+    color = models.CharField(max_length=30, blank=True)
+    payment_method = models.CharField(max_length=20, blank=True)
+
+    quantity = models.PositiveIntegerField()
+    revenue = models.DecimalField(max_digits=14, decimal_places=2)
+    cost = models.DecimalField(max_digits=14, decimal_places=2)
+    profit = models.DecimalField(max_digits=14, decimal_places=2)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['source', 'source_id'], name='unique_sales_fact_source'),
+        ]
+        indexes = [
+            # Month ranges grouped by month, brand and size
+            models.Index(fields=['month', 'brand', 'size'], name='sales_fact_month_brand_idx'),
+            # One brand (and size) across all months
+            models.Index(fields=['brand', 'size', 'month'], name='sales_fact_brand_size_idx'),
+            models.Index(fields=['size', 'month'], name='sales_fact_size_month_idx'),
+            models.Index(fields=['sku', 'date'], name='sales_fact_sku_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.source} #{self.source_id}: {self.sku} x{self.quantity} ({self.date})"
+
+
+class Job(models.Model):
+    """
+    A queued background job (large export, multi-year report).
+    Enqueued by the web process, run by: python manage.py run_worker
+    The finished file is stored gzip-compressed in JobChunk rows.
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    kind = models.CharField(max_length=30)
+    params = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUSES, default=QUEUED)
+    progress = models.PositiveSmallIntegerField(default=0, help_text="Percent complete")
+    message = models.CharField(max_length=255, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    worker = models.CharField(max_length=100, blank=True)
+
+    result_name = models.CharField(max_length=100, blank=True)
+    content_type = models.CharField(max_length=100, blank=True)
+
+    created_by = models.ForeignKey('auth.User', on_delete=models.SET_NULL, null=True, blank=True, related_name='jobs')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Workers claim the oldest queued job
+            models.Index(fields=['status', 'created_at'], name='job_status_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"JOB #{self.pk} {self.kind} ({self.status})"
+
+    @property
+    def finished(self):
+        return self.status in (self.DONE, self.FAILED)
+
+
+class JobChunk(models.Model):
+    """
+    One piece of a job's gzip-compressed result file, so the file is
+    written and downloaded a chunk at a time instead of as one value.
+    """
+    job = models.ForeignKey(Job, on_delete=models.CASCADE, related_name='chunks')
+    number = models.PositiveIntegerField()
+    data = models.BinaryField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['job', 'number'], name='unique_job_chunk'),
+        ]
+
+    def __str__(self):
+        return f"JOB #{self.job_id} chunk {self.number}"
+
+class CacheVersion(models.Model):
+    """
+    Version counter of a summary cache namespace (inventory/cache.py),
+    used when the cache backend cannot increment atomically.
+    """
+    namespace = models.CharField(max_length=50, unique=True)
+    version = models.BigIntegerField()
+
+    def __str__(self):
+        return f"{self.namespace}: v{self.version}"
+
+class IdempotencyKey(models.Model):
+    """
+    Client-generated key of an offline sale applied by the batch sync
+    endpoint (inventory/api.py). A retried sale with the same key gets
+    the stored result instead of being recorded a second time.
+    """
+    key = models.CharField(max_length=64, unique=True)
+    # SHA-256 of the sale as first sent: a different sale under a reused key is refused
+    request_hash = models.CharField(max_length=64)
+    sale = models.ForeignKey(Sale, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_by = models.ForeignKey('auth.User', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.key} -> Sale #{self.sale_id}"
@@ -0,0 +1,81 @@
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+# ---------------------------------------------------------
+# KEYSET (CURSOR) PAGINATION
+# ---------------------------------------------------------
+# Pages are fetched with "WHERE (date, id) < (cursor)" instead of OFFSET,
+# so page 1000 costs the same index range scan as page 1.
+# Ordering is newest first over a unique key such as ('date', 'id').
+
+CURSOR_SEPARATOR = '~'
+
+
+def encode_cursor(obj, fields):
+    return CURSOR_SEPARATOR.join(str(getattr(obj, field)) for field in fields)
+
+
+def decode_cursor(model, fields, cursor):
+    """
+    Turn a cursor string back into typed field values.
+    Returns None for missing or malformed cursors (i.e. start from the top).
+    """
+    if not cursor:
+        return None
+    parts = cursor.split(CURSOR_SEPARATOR)
+    if len(parts) != len(fields):
+        return None
+    try:
+        return [model._meta.get_field(field).to_python(part) for field, part in zip(fields, parts)]
+    except ValidationError:
+        return None
+
+
+def keyset_q(fields, values, lookup):
+    """
+    Row-value comparison (a, b) < (x, y) spelled out as
+    a < x OR (a = x AND b < y), which every backend can index.
+    """
+    condition = Q()
+    for position, field in enumerate(fields):
+        equal = {fields[i]: values[i] for i in range(position)}
+        condition |= Q(**equal, **{f"{field}__{lookup}": values[position]})
+    return condition
+
+
+def keyset_page(queryset, fields, after=None, before=None, size=50):
+    """
+    One page of `queryset` ordered by `fields` descending.
+    Pass the `next_cursor` of a page as `after` to go forward,
+    or its `prev_cursor` as `before` to go back.
+
+    Returns a dict with 'items', 'next_cursor' and 'prev_cursor'.
+    """
+    model = queryset.model
+    after_values = decode_cursor(model, fields, after)
+    before_values = decode_cursor(model, fields, before)
+
+    if before_values and not after_values:
+        # Walk backwards (ascending) from the cursor, then flip the page
+        rows = list(
+            queryset.filter(keyset_q(fields, before_values, 'gt'))
+            .order_by(*fields)[:size + 1]
+        )
+        has_more = len(rows) > size
+        items = rows[:size][::-1]
+        return {
+            'items': items,
+            'prev_cursor': encode_cursor(items[0], fields) if has_more else None,
+            'next_cursor': encode_cursor(items[-1], fields) if items else None,
+        }
+
+    if after_values:
+        queryset = queryset.filter(keyset_q(fields, after_values, 'lt'))
+    rows = list(queryset.order_by(*[f"-{field}" for field in fields])[:size + 1])
+    has_more = len(rows) > size
+    items = rows[:size]
+    return {
+        'items': items,
+        'prev_cursor': encode_cursor(items[0], fields) if after_values and items else None,
+        'next_cursor': encode_cursor(items[-1], fields) if has_more else None,
+    }
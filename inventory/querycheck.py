@@ -0,0 +1,175 @@
+import logging
+import re
+import sys
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from .metrics import wrapping_queries
+
+logger = logging.getLogger(__name__)
+
+# ---------------------------------------------------------
+# N+1 QUERY DETECTOR
+# ---------------------------------------------------------
+# Development / staging aid (QUERY_CHECK = "warn" or "strict").
+# Every query of a request is reduced to a fingerprint (literals and
+# IN-lists replaced by placeholders) and tagged with the template line
+# and the project code line that issued it. The same fingerprint
+# QUERY_CHECK_THRESHOLD or more times in one request is a likely N+1,
+# e.g. {{ sale.product.name }} inside a {% for %}.
+# QUERY_BUDGETS caps the total queries of individual views;
+# QUERY_CHECK_BATCH_VIEWS lists views that repeat queries per item on purpose.
+# "warn" logs problems; "strict" raises QueryCheckFailed (a 500, or a
+# failing test).
+
+STRING = re.compile(r"'(?:[^']|'')*'")
+NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+PLACEHOLDER = re.compile(r"%s|\?")
+IN_LIST = re.compile(r"\bIN \((?:\s*\?\s*,?)+\)", re.IGNORECASE)
+WHITESPACE = re.compile(r"\s+")
+COLUMN_LIST = re.compile(r"^SELECT (?:DISTINCT )?.+? FROM ", re.IGNORECASE)
+TRANSACTION_STATEMENTS = ('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT', 'BEGIN', 'COMMIT', 'ROLLBACK')
+
+# Wrappers around every query; the real caller is further up the stack
+SKIPPED_FILES = {
+    __file__,
+    str(Path(__file__).with_name('metrics.py')),
+    str(Path(__file__).with_name('instrumentation.py')),
+}
+
+
+class QueryCheckFailed(Exception):
+    pass
+
+
+def fingerprint(sql):
+    sql = STRING.sub('?', sql)
+    sql = NUMBER.sub('?', sql)
+    sql = PLACEHOLDER.sub('?', sql)
+    sql = IN_LIST.sub('IN (...)', sql)
+    return WHITESPACE.sub(' ', sql).strip()
+
+
+def summary(key, length=200):
+    """
+    Fingerprint with the column list elided, so the FROM/WHERE part shows.
+    """
+    key = COLUMN_LIST.sub('SELECT ... FROM ', key)
+    return key if len(key) <= length else key[:length] + '...'
+
+
+def query_origin():
+    """
+    (template line, project code line) that issued the current query.
+    """
+    project_root = str(settings.BASE_DIR)
+    template = code = None
+    frame = sys._getframe(2)
+    while frame is not None and not (template and code):
+        if template is None and frame.f_code.co_name == 'render_annotated':
+            node = frame.f_locals.get('self')
+            token, origin = getattr(node, 'token', None), getattr(node, 'origin', None)
+            if token is not None and origin is not None:
+                template = f"{origin.template_name or origin.name}:{token.lineno}"
+        elif code is None:
+            filename = frame.f_code.co_filename
+            if filename.startswith(project_root) and 'site-packages' not in filename and filename not in SKIPPED_FILES:
+                code = f"{Path(filename).relative_to(project_root)}:{frame.f_lineno} in {frame.f_code.co_name}"
+        frame = frame.f_back
+    return template, code
+
+
+class QueryCollector:
+    """
+    Database execute wrapper grouping a request's queries by fingerprint.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.groups = {}  # fingerprint -> {'count', 'sql', 'origins'}
+        self.lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        if not sql.lstrip().upper().startswith(TRANSACTION_STATEMENTS):
+            key, origin = fingerprint(sql), query_origin()
+            with self.lock:
+                self.count += 1
+                group = self.groups.setdefault(key, {'count': 0, 'sql': sql, 'origins': Counter()})
+                group['count'] += 1
+                group['origins'][origin] += 1
+        return execute(sql, params, many, context)
+
+    def repeated(self, threshold):
+        """
+        Fingerprints issued at least `threshold` times, most frequent first.
+        """
+        return sorted(
+            ((key, group) for key, group in self.groups.items() if group['count'] >= threshold),
+            key=lambda item: -item[1]['count'],
+        )
+
+    def problems(self, budget=None, threshold=None, check_repeats=True):
+        threshold = threshold or settings.QUERY_CHECK_THRESHOLD
+        problems = []
+        if budget is not None and self.count > budget:
+            problems.append(f"{self.count} queries, budget is {budget}")
+        for key, group in (self.repeated(threshold) if check_repeats else []):
+            (template, code), _ = group['origins'].most_common(1)[0]
+            where = ', '.join(part for part in (template and f"template {template}", code) if part) or 'unknown origin'
+            problems.append(f"likely N+1: {group['count']} x {summary(key)} (from {where})")
+        return problems
+
+
+def collecting(collector):
+    # Includes queries the request runs in pool threads (see metrics.wrapping_queries)
+    return wrapping_queries(collector)
+
+
+@contextmanager
+def query_budget(budget=None, threshold=None):
+    """
+    Test helper: fail if the block issues more than `budget` queries
+    or repeats a query `threshold` times.
+
+        with query_budget(10):
+            self.client.get(reverse('dashboard'))
+    """
+    with collecting(QueryCollector()) as collector:
+        yield collector
+    problems = collector.problems(budget, threshold)
+    if problems:
+        raise AssertionError("Query check failed:\n  " + "\n  ".join(problems))
+
+
+class QueryCheckMiddleware:
+    """
+    Checks each request against QUERY_BUDGETS (by URL name) and for
+    repeated queries. Removes itself unless QUERY_CHECK is "warn" or "strict".
+    """
+
+    def __init__(self, get_response):
+        self.mode = getattr(settings, 'QUERY_CHECK', 'off')
+        if self.mode not in ('warn', 'strict'):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with collecting(QueryCollector()) as collector:
+            response = self.get_response(request)
+
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else None
+        response['X-Query-Count'] = str(collector.count)
+        problems = collector.problems(
+            settings.QUERY_BUDGETS.get(view),
+            check_repeats=view not in getattr(settings, 'QUERY_CHECK_BATCH_VIEWS', ()),
+        )
+        if problems:
+            message = f"{request.method} {request.path} ({view or 'unresolved'}):\n  " + "\n  ".join(problems)
+            if self.mode == 'strict':
+                raise QueryCheckFailed(message)
+            logger.warning(message)
+        return response
@@ -0,0 +1,170 @@
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import Case, When, F, Sum, Count, DecimalField
+from django.db.models.functions import Coalesce
+from .models import BankAccount, BankTransaction, BalanceCheckpoint
+from .services import signed_amount, adjust_balance, post_bank_transaction
+
+# ---------------------------------------------------------
+# BANK BALANCE RECONCILIATION
+# ---------------------------------------------------------
+# A BalanceCheckpoint records a verified balance as of a posting.
+# Verifying an account replays only the transactions posted after its
+# latest checkpoint, so an audit costs O(recent activity), not O(history).
+# Edits and deletes of transactions already covered by a checkpoint
+# shift that checkpoint by the same delta (see shift_checkpoints).
+#
+# The watermark is the account's posting sequence, not the transaction
+# id: ids are handed out before the posting waits for the account row
+# lock, so a lower id can commit after a higher one. A sequence is only
+# taken under that lock (services.post_bank_transaction), and the
+# reconcile holds the same lock, so every sequence up to the account's
+# posted_sequence is committed and included in its balance.
+
+MONEY = DecimalField(max_digits=14, decimal_places=2)
+
+SIGNED_AMOUNT = Case(
+    When(transaction_type='in', then=F('amount')),
+    When(transaction_type='out', then=-F('amount')),
+    default=Decimal('0.00'),
+    output_field=MONEY,
+)
+
+
+def latest_checkpoint(account_id):
+    return (
+        BalanceCheckpoint.objects.filter(bank_account_id=account_id)
+        .order_by('-as_of_sequence', '-pk')
+        .first()
+    )
+
+
+def shift_checkpoints(account_id, sequence, delta):
+    """
+    A transaction that checkpoints already include was edited or deleted:
+    move those checkpoints by the same amount so they stay true.
+    """
+    if account_id and sequence is not None and delta:
+        BalanceCheckpoint.objects.filter(
+            bank_account_id=account_id, as_of_sequence__gte=sequence
+        ).update(balance=F('balance') + delta)
+
+
+def record_transaction_change(bank_transaction, old, new):
+    """
+    Apply an edit (old and new), or a delete (new is None), of a posted
+    BankTransaction to the balances and checkpoints, under the accounts'
+    row locks. `old` / `new` are (account_id, transaction_type, amount)
+    tuples. A transaction moved to another account is posted there
+    afresh, after that account's checkpoints.
+    """
+    old_account, new_account = old[0], new[0] if new else None
+    removed = signed_amount(old[1], old[2])
+    with transaction.atomic():
+        list(
+            BankAccount.objects.select_for_update()
+            .filter(pk__in={old_account, new_account} - {None})
+            .order_by('pk')
+            .values_list('pk', flat=True)
+        )
+        if new_account == old_account:
+            delta = signed_amount(new[1], new[2]) - removed
+            adjust_balance(old_account, delta)
+            shift_checkpoints(old_account, bank_transaction.sequence, delta)
+            return
+        adjust_balance(old_account, -removed)
+        shift_checkpoints(old_account, bank_transaction.sequence, -removed)
+        if new:
+            post_bank_transaction(bank_transaction)
+
+
+def number_unposted(account_ids=None):
+    """
+    Give transactions written without a posting (bulk inserts, such as
+    the benchmark data) the next sequences of their accounts, in id
+    order. Their amounts are not applied: reconcile with repair=True
+    afterwards. Returns the number of transactions numbered.
+    """
+    accounts = BankAccount.objects.order_by('pk')
+    if account_ids:
+        accounts = accounts.filter(pk__in=account_ids)
+    numbered = 0
+    for account_id in accounts.values_list('pk', flat=True):
+        with transaction.atomic():
+            sequence = BankAccount.objects.select_for_update().values_list('posted_sequence', flat=True).get(pk=account_id)
+            unposted = BankTransaction.objects.filter(bank_account_id=account_id, sequence__isnull=True).order_by('pk').only('pk')
+            batch = []
+            for bank_transaction in unposted.iterator(chunk_size=2000):
+                sequence += 1
+                bank_transaction.sequence = sequence
+                batch.append(bank_transaction)
+            BankTransaction.objects.bulk_update(batch, ['sequence'], batch_size=2000)
+            BankAccount.objects.filter(pk=account_id).update(posted_sequence=sequence)
+            numbered += len(batch)
+    return numbered
+
+
+def replay(account_id):
+    """
+    Expected balance from the latest checkpoint plus the transactions
+    posted after it. Returns (expected balance, checkpoint, transactions replayed).
+    """
+    checkpoint = latest_checkpoint(account_id)
+    base = checkpoint.balance if checkpoint else Decimal('0.00')
+    as_of = checkpoint.as_of_sequence if checkpoint else 0
+
+    recent = BankTransaction.objects.filter(bank_account_id=account_id, sequence__gt=as_of).aggregate(
+        delta=Coalesce(Sum(SIGNED_AMOUNT), Decimal('0.00'), output_field=MONEY),
+        replayed=Count('pk'),
+    )
+    expected = (base + recent['delta']).quantize(Decimal('0.01'))
+    return expected, checkpoint, recent['replayed'] or 0
+
+
+def reconcile_account(account_id, repair=False, checkpoint=False):
+    """
+    Verify one account's stored balance against its replayed balance.
+    repair: overwrite a wrong stored balance with the replayed one.
+    checkpoint: save a new checkpoint once the balance is verified (or repaired).
+    """
+    with transaction.atomic():
+        # Lock the account so postings wait until we are done
+        account = BankAccount.objects.select_for_update().get(pk=account_id)
+        expected, previous, replayed = replay(account_id)
+        stored = account.balance
+        ok = stored == expected
+
+        repaired = False
+        if repair and not ok:
+            account.balance = expected
+            account.save(update_fields=['balance'])
+            repaired = True
+
+        new_checkpoint = None
+        if checkpoint and (ok or repaired) and (previous is None or account.posted_sequence > previous.as_of_sequence):
+            new_checkpoint = BalanceCheckpoint.objects.create(
+                bank_account=account, as_of_sequence=account.posted_sequence, balance=expected
+            )
+
+    return {
+        'account': account.pk,
+        'name': account.name,
+        'stored_balance': stored,
+        'expected': expected,
+        'difference': stored - expected,
+        'ok': ok,
+        'repaired': repaired,
+        'replayed_transactions': replayed,
+        'checkpoint_as_of': (new_checkpoint or previous).as_of_sequence if (new_checkpoint or previous) else None,
+        'checkpoint_created': new_checkpoint is not None,
+    }
+
+
+def reconcile_all(repair=False, checkpoint=False, account_ids=None):
+    accounts = BankAccount.objects.order_by('pk')
+    if account_ids:
+        accounts = accounts.filter(pk__in=account_ids)
+    return [
+        reconcile_account(account_id, repair=repair, checkpoint=checkpoint)
+        for account_id in accounts.values_list('pk', flat=True)
+    ]
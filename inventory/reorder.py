@@ -0,0 +1,127 @@
+import math
+from datetime import timedelta
+from decimal import Decimal
+import numpy as np
+from django.db.models import OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from .models import Product, StockIn, DailySalesSummary
+
+# ---------------------------------------------------------
+# REORDER PLANNER
+# ---------------------------------------------------------
+# Two queries for the whole catalogue (units sold per rolling window,
+# and products with their latest supplier), then every product is
+# planned at once with NumPy arrays indexed by product.
+
+# Rolling windows (days) and how much each counts towards the velocity.
+# Recent sales weigh most, longer windows smooth out spikes.
+WINDOWS = (7, 30, 90)
+WINDOW_WEIGHTS = (0.5, 0.3, 0.2)
+
+DEFAULT_LEAD_TIME_DAYS = 7
+DEFAULT_COVER_DAYS = 30
+UNKNOWN_SUPPLIER = 'Unknown supplier'
+
+
+def units_sold(today):
+    """
+    {product_id: [units in each window]} from the daily rollup, in one grouped query.
+    """
+    windows = {
+        f'units_{days}': Coalesce(Sum('units', filter=Q(date__gt=today - timedelta(days=days))), 0)
+        for days in WINDOWS
+    }
+    rows = (
+        DailySalesSummary.objects.filter(date__gt=today - timedelta(days=max(WINDOWS)))
+        .values('product_id')
+        .annotate(**windows)
+        .order_by()
+    )
+    return {row['product_id']: [row[f'units_{days}'] for days in WINDOWS] for row in rows}
+
+
+def catalogue():
+    latest_supplier = (
+        StockIn.objects.filter(product=OuterRef('pk'))
+        .order_by('-date', '-pk')
+        .values('supplier')[:1]
+    )
+    return list(
+        Product.objects.annotate(supplier=Subquery(latest_supplier))
+        .order_by('pk')
+        .values_list('pk', 'sku', 'name', 'quantity', 'reorder_level', 'average_cost', 'supplier')
+    )
+
+
+def reorder_plan(lead_time_days=DEFAULT_LEAD_TIME_DAYS, cover_days=DEFAULT_COVER_DAYS, include_all=False):
+    """
+    Suggested purchase orders, grouped by each product's latest supplier.
+
+    velocity       = weighted units/day over the rolling windows
+    days_of_cover  = quantity / velocity
+    target stock   = velocity * (lead time + cover days), and always above
+                     reorder_level so the product leaves the low-stock list
+    suggested      = target - quantity (rounded up, never negative)
+    """
+    today = timezone.localdate()
+    products = catalogue()
+    sold = units_sold(today)
+
+    count = len(products)
+    ids = np.fromiter((row[0] for row in products), dtype=np.int64, count=count)
+    quantity = np.fromiter((row[3] for row in products), dtype=np.float64, count=count)
+    reorder_level = np.fromiter((row[4] for row in products), dtype=np.float64, count=count)
+    average_cost = np.fromiter((row[5] for row in products), dtype=np.float64, count=count)
+
+    # units[i, w] = units of product i sold in window w (ids are sorted, so searchsorted finds rows)
+    units = np.zeros((count, len(WINDOWS)), dtype=np.float64)
+    if sold and count:
+        sold_ids = np.fromiter(sold.keys(), dtype=np.int64, count=len(sold))
+        rows = np.searchsorted(ids, sold_ids)
+        known = (rows < count) & (ids[np.minimum(rows, count - 1)] == sold_ids)
+        units[rows[known]] = np.array(list(sold.values()), dtype=np.float64)[known]
+
+    velocity = (units / np.array(WINDOWS, dtype=np.float64)) @ np.array(WINDOW_WEIGHTS, dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        days_of_cover = np.where(velocity > 0, quantity / velocity, np.inf)
+    target = np.maximum(np.ceil(velocity * (lead_time_days + cover_days)), reorder_level + 1)
+    suggested = np.maximum(target - quantity, 0).astype(np.int64)
+    order_value = suggested * average_cost
+
+    selected = np.arange(count) if include_all else np.flatnonzero(suggested > 0)
+    # Most urgent (least cover) first
+    selected = selected[np.argsort(days_of_cover[selected], kind='stable')]
+
+    suppliers = {}
+    for i in selected:
+        pk, sku, name, qty, level, cost, supplier = products[i]
+        group = suppliers.setdefault(supplier or UNKNOWN_SUPPLIER, {
+            'supplier': supplier or UNKNOWN_SUPPLIER,
+            'lines': [],
+            'total_units': 0,
+            'total_value': Decimal('0.00'),
+        })
+        value = Decimal(str(round(float(order_value[i]), 2))).quantize(Decimal('0.01'))
+        group['lines'].append({
+            'product_id': pk,
+            'sku': sku,
+            'name': name,
+            'quantity': qty,
+            'reorder_level': level,
+            'velocity_per_day': round(float(velocity[i]), 3),
+            'days_of_cover': None if math.isinf(days_of_cover[i]) else round(float(days_of_cover[i]), 1),
+            'suggested_quantity': int(suggested[i]),
+            'order_value': value,
+        })
+        group['total_units'] += int(suggested[i])
+        group['total_value'] += value
+
+    return {
+        'generated_at': timezone.now(),
+        'lead_time_days': lead_time_days,
+        'cover_days': cover_days,
+        'windows': list(WINDOWS),
+        'products_considered': count,
+        'suppliers': sorted(suppliers.values(), key=lambda group: -group['total_value']),
+    }
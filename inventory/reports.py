@@ -0,0 +1,314 @@
+import asyncio
+from datetime import date, timedelta
+from decimal import Decimal
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+from django.db.models import Sum, Count, F, Value, DecimalField, ExpressionWrapper
+from django.db.models.functions import Coalesce, TruncDay, TruncWeek, TruncMonth
+from django.utils import timezone
+from .models import Product, StockIn, BankAccount, BankTransaction, OwnerDrawing, HistoricalSale, DailySalesSummary
+from .cache import cached, REPORTS
+from .metrics import inherited_wrappers
+
+# ---------------------------------------------------------
+# DATABASE-SIDE AGGREGATES
+# ---------------------------------------------------------
+# Every total is computed by the database in a single query per table,
+# so the dashboard never loads individual rows into Python.
+
+MONEY = DecimalField(max_digits=14, decimal_places=2)
+ZERO = Value(Decimal('0.00'), output_field=MONEY)
+CENT = Decimal('0.01')
+
+
+def money(expression):
+    """
+    Wrap an arithmetic expression so the database returns a Decimal.
+    """
+    return ExpressionWrapper(expression, output_field=MONEY)
+
+
+def money_sum(expression):
+    """
+    SUM() of a money expression, returning 0.00 instead of NULL on empty tables.
+    """
+    return Coalesce(Sum(money(expression)), ZERO, output_field=MONEY)
+
+
+def product_totals():
+    return Product.objects.aggregate(
+        total_products=Count('id'),
+        total_stock=Coalesce(Sum('quantity'), 0),
+        total_inventory_value=money_sum(F('quantity') * F('average_cost')),
+    )
+
+
+def stock_in_totals():
+    return StockIn.objects.aggregate(
+        total_inventory_added=Coalesce(Sum('quantity'), 0),
+    )
+
+
+def sales_totals():
+    """
+    Live sales totals, read from the DailySalesSummary rollup
+    rather than scanning every StockOut row.
+    """
+    return DailySalesSummary.objects.aggregate(
+        total_sales=money_sum(F('revenue')),
+        total_profit=money_sum(F('profit')),
+    )
+
+
+def bank_totals():
+    return BankAccount.objects.aggregate(
+        bank_account_count=Count('id'),
+        total_bank_balance=money_sum(F('balance')),
+    )
+
+
+def drawings_totals():
+    return OwnerDrawing.objects.aggregate(
+        total_drawings=money_sum(F('amount')),
+    )
+
+
+def historical_totals(queryset=None):
+    """
+    Revenue and profit of legacy sales.
+    Accepts a (filtered) HistoricalSale queryset; defaults to all records.
+    """
+    if queryset is None:
+        queryset = HistoricalSale.objects.all()
+    return queryset.aggregate(
+        total_historical_sales=money_sum(F('quantity') * F('selling_price')),
+        total_historical_profit=money_sum((F('selling_price') - F('unit_cost')) * F('quantity')),
+    )
+
+
+def quantize_money(totals):
+    """
+    Round every Decimal in an aggregate result to cents.
+    (Backends differ in the scale they return for products of decimals.)
+    """
+    return {
+        key: value.quantize(CENT) if isinstance(value, Decimal) else value
+        for key, value in totals.items()
+    }
+
+
+DASHBOARD_AGGREGATES = [
+    product_totals,
+    stock_in_totals,
+    sales_totals,
+    bank_totals,
+    drawings_totals,
+    historical_totals,
+]
+
+
+def dashboard_totals():
+    """
+    All dashboard summary numbers, one aggregate query per source table.
+    """
+    totals = {}
+    for aggregate in DASHBOARD_AGGREGATES:
+        totals.update(aggregate())
+    return quantize_money(totals)
+
+
+def bank_accounts():
+    return list(BankAccount.objects.all())
+
+
+def recent_bank_transactions(recent=50):
+    return list(BankTransaction.objects.select_related('bank_account').order_by('-date')[:recent])
+
+
+def bank_summary_payload(accounts, recent_transactions):
+    return {
+        'accounts': accounts,
+        'recent_transactions': recent_transactions,
+        'total_balance': sum((account.balance for account in accounts), Decimal('0.00')),
+    }
+
+
+def bank_summary(recent=50):
+    """
+    Accounts, latest transactions and the combined balance
+    for the bank dashboard, as plain lists so they can be cached.
+    """
+    return bank_summary_payload(bank_accounts(), recent_bank_transactions(recent))
+
+
+# ---------------------------------------------------------
+# CONCURRENT AGGREGATES (ASYNC VIEWS)
+# ---------------------------------------------------------
+# The summary queries are independent, so the async views run each one
+# in its own worker thread, on that thread's own database connection,
+# and gather the results: the page waits for the slowest query rather
+# than for the sum of all of them.
+
+
+def in_own_connection(function):
+    """
+    Awaitable version of `function` that runs in a pool thread.
+    Stale connections of that thread are closed before and after,
+    as Django does around every request. The caller's query wrappers
+    (metrics, query budgets, benchmarks) count its queries too.
+    """
+    def run(*args, **kwargs):
+        close_old_connections()
+        try:
+            with inherited_wrappers():
+                return function(*args, **kwargs)
+        finally:
+            close_old_connections()
+    return sync_to_async(run, thread_sensitive=False)
+
+
+async def dashboard_totals_concurrently():
+    """
+    dashboard_totals(), with the per-table aggregates run concurrently.
+    """
+    results = await asyncio.gather(*(in_own_connection(aggregate)() for aggregate in DASHBOARD_AGGREGATES))
+    totals = {}
+    for result in results:
+        totals.update(result)
+    return quantize_money(totals)
+
+
+async def bank_summary_concurrently(recent=50):
+    accounts, recent_transactions = await asyncio.gather(
+        in_own_connection(bank_accounts)(),
+        in_own_connection(recent_bank_transactions)(recent),
+    )
+    return bank_summary_payload(accounts, recent_transactions)
+
+
+# ---------------------------------------------------------
+# PERIOD PROFIT & LOSS
+# ---------------------------------------------------------
+# Live sales (the daily rollup, costed at cost_at_sale) and legacy
+# HistoricalSale rows are grouped per period by the database and
+# combined with UNION ALL into a single series.
+# Periods that have ended only change when past sales are imported or
+# rebuilt (which bumps the 'reports' cache version), so they are cached;
+# only the current, still open period is recomputed on every request.
+
+PERIODS = {
+    'day': TruncDay,
+    'week': TruncWeek,
+    'month': TruncMonth,
+}
+CLOSED_PERIOD_TIMEOUT = 60 * 60 * 24
+
+
+def period_start(day, period):
+    """
+    First day of the period containing `day` (weeks start on Monday, like TruncWeek).
+    """
+    if period == 'week':
+        return day - timedelta(days=day.weekday())
+    if period == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def default_start(end, period):
+    """
+    Start of the default range: 30 days, 26 weeks or 12 months ending with `end`.
+    """
+    if period == 'month':
+        months = end.year * 12 + end.month - 1 - 11
+        return date(months // 12, months % 12 + 1, 1)
+    if period == 'week':
+        return period_start(end, 'week') - timedelta(weeks=25)
+    return end - timedelta(days=29)
+
+
+def period_rows(period, start, end):
+    """
+    Units, revenue, COGS and profit per period between two dates (inclusive).
+    """
+    trunc = PERIODS[period]
+    live = (
+        DailySalesSummary.objects.filter(date__range=(start, end))
+        .annotate(period=trunc('date'))
+        .values('period')
+        .annotate(
+            units=Coalesce(Sum('units'), 0),
+            revenue=money_sum(F('revenue')),
+            cogs=money_sum(F('cost')),
+        )
+        .order_by()
+    )
+    legacy = (
+        HistoricalSale.objects.filter(date__range=(start, end))
+        .annotate(period=trunc('date'))
+        .values('period')
+        .annotate(
+            units=Coalesce(Sum('quantity'), 0),
+            revenue=money_sum(F('quantity') * F('selling_price')),
+            cogs=money_sum(F('quantity') * F('unit_cost')),
+        )
+        .order_by()
+    )
+
+    # A period with both live and legacy sales comes back as two rows
+    series = {}
+    for row in live.union(legacy, all=True):
+        totals = series.setdefault(row['period'], {'units': 0, 'revenue': Decimal('0.00'), 'cogs': Decimal('0.00')})
+        totals['units'] += row['units']
+        totals['revenue'] += row['revenue']
+        totals['cogs'] += row['cogs']
+
+    return [pnl_row(day, totals) for day, totals in sorted(series.items())]
+
+
+def pnl_row(period, totals):
+    revenue = totals['revenue'].quantize(CENT)
+    cogs = totals['cogs'].quantize(CENT)
+    profit = revenue - cogs
+    return {
+        'period': period,
+        'units': totals['units'],
+        'revenue': revenue,
+        'cogs': cogs,
+        'profit': profit,
+        'margin': (profit * 100 / revenue).quantize(Decimal('0.1')) if revenue else None,
+    }
+
+
+def profit_and_loss(period='month', start=None, end=None):
+    """
+    Revenue, COGS and profit per day, week or month from `start` to
+    `end` (inclusive; see default_start, ending today).
+
+    Returns a dict with 'period', 'start', 'end', 'rows' and 'totals'.
+    """
+    if period not in PERIODS:
+        raise ValueError(f"Unknown period '{period}'")
+    today = timezone.localdate()
+    end = end or today
+    start = start or default_start(end, period)
+
+    open_start = period_start(today, period)
+    rows = []
+    if start < open_start:
+        closed_end = min(end, open_start - timedelta(days=1))
+        rows += cached(
+            REPORTS,
+            f'pnl:{period}:{start}:{closed_end}',
+            lambda: period_rows(period, start, closed_end),
+            timeout=CLOSED_PERIOD_TIMEOUT,
+        )
+    if end >= open_start:
+        rows += period_rows(period, max(start, open_start), end)
+
+    totals = pnl_row(None, {
+        'units': sum(row['units'] for row in rows),
+        'revenue': sum((row['revenue'] for row in rows), Decimal('0.00')),
+        'cogs': sum((row['cogs'] for row in rows), Decimal('0.00')),
+    })
+    return {'period': period, 'start': start, 'end': end, 'rows': rows, 'totals': totals}
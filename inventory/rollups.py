@@ -0,0 +1,192 @@
+from collections import defaultdict
+from decimal import Decimal
+from django.db import transaction, IntegrityError
+from django.db.models import Sum, F
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from .models import StockOut, DailySalesSummary
+from .reports import money_sum
+from .cache import bump, DASHBOARD, REPORTS
+
+# ---------------------------------------------------------
+# DAILY SALES ROLLUP
+# ---------------------------------------------------------
+
+
+def summary_deltas(stock_outs):
+    """
+    Collapse sales into one delta per (date, product, payment method).
+    """
+    deltas = defaultdict(lambda: {
+        'units': 0,
+        'revenue': Decimal('0.00'),
+        'cost': Decimal('0.00'),
+    })
+    for sale in stock_outs:
+        key = (timezone.localdate(sale.date), sale.product_id, sale.payment_method)
+        delta = deltas[key]
+        delta['units'] += sale.quantity
+        delta['revenue'] += sale.quantity * sale.selling_price
+        delta['cost'] += sale.quantity * sale.cost_at_sale
+    return deltas
+
+
+def bump_bucket(key, delta, create=True):
+    """
+    Add one delta to its bucket with UPDATE ... SET col = col + delta,
+    creating the bucket on the first sale of the day (unless create=False).
+    """
+    date, product_id, payment_method = key
+    profit = delta['revenue'] - delta['cost']
+    bucket = DailySalesSummary.objects.filter(
+        date=date, product_id=product_id, payment_method=payment_method
+    )
+    changes = {
+        'units': F('units') + delta['units'],
+        'revenue': F('revenue') + delta['revenue'],
+        'cost': F('cost') + delta['cost'],
+        'profit': F('profit') + profit,
+    }
+    if bucket.update(**changes) or not create:
+        return
+    try:
+        # The savepoint lets us fall back to UPDATE if another till won the race
+        with transaction.atomic():
+            DailySalesSummary.objects.create(
+                date=date,
+                product_id=product_id,
+                payment_method=payment_method,
+                units=delta['units'],
+                revenue=delta['revenue'],
+                cost=delta['cost'],
+                profit=profit,
+            )
+    except IntegrityError:
+        bucket.update(**changes)
+
+
+def record_sales(stock_outs):
+    """
+    Add newly created sales to DailySalesSummary.
+    Call inside the same transaction that saved the sales.
+
+    A single sale bumps its bucket in place. A batch (e.g. a cart checkout)
+    locks all of its buckets in one query and writes them back with one
+    bulk_update and one bulk_create, so the cost does not grow per line.
+    """
+    deltas = summary_deltas(stock_outs)
+    if len(deltas) == 1:
+        bump_bucket(*next(iter(deltas.items())))
+        return
+
+    with transaction.atomic():
+        product_ids = {product_id for _, product_id, _ in deltas}
+        dates = {date for date, _, _ in deltas}
+        existing = {
+            (row.date, row.product_id, row.payment_method): row
+            for row in DailySalesSummary.objects.select_for_update().filter(
+                date__in=dates, product_id__in=product_ids
+            )
+        }
+
+        changed, missing = [], {}
+        for key, delta in deltas.items():
+            row = existing.get(key)
+            if row is None:
+                missing[key] = delta
+                continue
+            row.units += delta['units']
+            row.revenue += delta['revenue']
+            row.cost += delta['cost']
+            row.profit = row.revenue - row.cost
+            changed.append(row)
+
+        if changed:
+            DailySalesSummary.objects.bulk_update(changed, ['units', 'revenue', 'cost', 'profit'])
+
+        if missing:
+            try:
+                with transaction.atomic():
+                    DailySalesSummary.objects.bulk_create([
+                        DailySalesSummary(
+                            date=date,
+                            product_id=product_id,
+                            payment_method=payment_method,
+                            units=delta['units'],
+                            revenue=delta['revenue'],
+                            cost=delta['cost'],
+                            profit=delta['revenue'] - delta['cost'],
+                        )
+                        for (date, product_id, payment_method), delta in missing.items()
+                    ])
+            except IntegrityError:
+                # Another till created some of these buckets meanwhile
+                for key, delta in missing.items():
+                    bump_bucket(key, delta)
+
+
+def record_sale_change(old, new):
+    """
+    Apply an edit (old and new), or a delete (new is None), of a recorded
+    StockOut as deltas: the old sale is taken out of its bucket and the
+    new one added to its own (which differs if the date, product or
+    payment method changed).
+    """
+    deltas = summary_deltas([new] if new else [])
+    for key, delta in summary_deltas([old]).items():
+        for name, value in delta.items():
+            deltas[key][name] -= value
+    for key, delta in deltas.items():
+        if any(delta.values()):
+            # Only a sale moving into a bucket may need to create it
+            bump_bucket(key, delta, create=delta['units'] > 0)
+
+
+def rebuild_daily_summary(start=None, end=None, batch_size=1000):
+    """
+    Recompute DailySalesSummary from StockOut, optionally limited to
+    an inclusive date range. Returns the number of summary rows written.
+    """
+    sales = StockOut.objects.all()
+    summaries = DailySalesSummary.objects.all()
+    if start:
+        sales = sales.filter(date__date__gte=start)
+        summaries = summaries.filter(date__gte=start)
+    if end:
+        sales = sales.filter(date__date__lte=end)
+        summaries = summaries.filter(date__lte=end)
+
+    rows = (
+        sales.annotate(day=TruncDate('date'))
+        .values('day', 'product_id', 'payment_method')
+        .annotate(
+            units=Sum('quantity'),
+            revenue=money_sum(F('quantity') * F('selling_price')),
+            cost=money_sum(F('quantity') * F('cost_at_sale')),
+        )
+        .order_by()
+    )
+
+    written = 0
+    with transaction.atomic():
+        summaries.delete()
+        batch = []
+        for row in rows.iterator(chunk_size=batch_size):
+            batch.append(DailySalesSummary(
+                date=row['day'],
+                product_id=row['product_id'],
+                payment_method=row['payment_method'],
+                units=row['units'],
+                revenue=row['revenue'],
+                cost=row['cost'],
+                profit=row['revenue'] - row['cost'],
+            ))
+            if len(batch) >= batch_size:
+                DailySalesSummary.objects.bulk_create(batch)
+                written += len(batch)
+                batch = []
+        if batch:
+            DailySalesSummary.objects.bulk_create(batch)
+            written += len(batch)
+        bump(DASHBOARD, REPORTS)
+    return written
@@ -0,0 +1,111 @@
+import asyncio
+import functools
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from .cache import is_shared, last_changed, ANY
+
+# ---------------------------------------------------------
+# REPORTING DATABASE ROUTER
+# ---------------------------------------------------------
+# With REPORTING_DATABASE_URL set, read-only analytics (dashboards,
+# exports, the historical list, reports) can read from a "reporting"
+# copy of the database so they do not compete with the till. Only code
+# inside reporting_reads() / @reporting_view is routed there, and only
+# for inventory models; every write, signal cascade and ordinary page
+# stays on the primary.
+#
+# Staleness guard: the copy lags behind the primary, so for
+# REPORTING_MAX_LAG seconds after any write (the last cache bump, see
+# inventory/cache.py) reads stay on the primary. That also keeps a
+# summary computed from a stale copy out of the freshly bumped cache.
+# Reads inside a transaction on the primary stay there as well, so
+# code always sees its own writes.
+#
+# The last-write time must be one every process sees, since the write
+# may have been handled by another worker, a management command or the
+# job worker. With a per-process cache (locmem) nothing is routed to
+# the reporting database at all.
+
+REPORTING = 'reporting'
+
+reporting_alias = ContextVar('inventory_reporting_alias', default=None)
+
+
+def reporting_configured():
+    return REPORTING in settings.DATABASES
+
+
+def fresh_reporting_alias():
+    """
+    'reporting' if it is configured and there was no write within
+    REPORTING_MAX_LAG seconds, else None (read from the primary).
+    """
+    if not reporting_configured() or not is_shared():
+        return None
+    if time.time() - last_changed(ANY) < settings.REPORTING_MAX_LAG:
+        return None
+    return REPORTING
+
+
+@contextmanager
+def reads_from(alias):
+    token = reporting_alias.set(alias)
+    try:
+        yield alias
+    finally:
+        reporting_alias.reset(token)
+
+
+def reporting_reads():
+    """
+    Route the block's inventory reads to the reporting database when it
+    is configured and fresh. Yields the alias used ('reporting' or None).
+    The decision is taken once, on entry; threads started by
+    sync_to_async inside the block inherit it.
+    """
+    return reads_from(fresh_reporting_alias())
+
+
+def reporting_view(view):
+    """
+    Run a (sync or async) read-only view inside reporting_reads().
+    """
+    if asyncio.iscoroutinefunction(view):
+        @functools.wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            # The freshness check reads the cache, which may be the database
+            with reads_from(await sync_to_async(fresh_reporting_alias)()):
+                return await view(request, *args, **kwargs)
+        return async_wrapper
+
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        with reporting_reads():
+            return view(request, *args, **kwargs)
+    return wrapper
+
+
+class ReportingRouter:
+    def db_for_read(self, model, **hints):
+        alias = reporting_alias.get()
+        if alias is None or model._meta.app_label != 'inventory':
+            return None
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if {obj1._state.db, obj2._state.db} <= {DEFAULT_DB_ALIAS, REPORTING}:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The copy gets its schema from the primary (replication or sync_reporting_db)
+        return db != REPORTING
@@ -0,0 +1,250 @@
+from collections import Counter
+from decimal import Decimal, ROUND_HALF_UP
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import F, Case, When
+from .models import Product, BankAccount, BankTransaction, Sale, StockOut, StockIn
+from .rollups import record_sales
+from .facts import record_live_facts, FACT_PRODUCT_FIELDS
+from .cache import bump, DASHBOARD, STOCK
+
+# ---------------------------------------------------------
+# INVENTORY SERVICE
+# ---------------------------------------------------------
+# All stock and balance changes go through here so that two tills
+# touching the same product (or account) at once never lose an update.
+
+
+class InsufficientStock(Exception):
+    """
+    Raised when a sale asks for more units than are on the shelf.
+    """
+    def __init__(self, product_id, requested):
+        self.product_id = product_id
+        self.requested = requested
+        super().__init__(f"Not enough stock for product #{product_id} (requested {requested}).")
+
+
+def weighted_average_cost(current_qty, current_avg, incoming_qty, incoming_cost):
+    """
+    Moving weighted average after receiving a batch:
+        New Avg = (Current Qty * Current Avg + Incoming Qty * Unit Cost) / New Qty
+    Rounded to cents exactly as it is stored on Product.average_cost.
+    """
+    new_total_qty = current_qty + incoming_qty
+    if new_total_qty <= 0:
+        return Decimal('0.00')
+    total_value = current_qty * Decimal(current_avg) + incoming_qty * Decimal(incoming_cost)
+    return (total_value / new_total_qty).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+
+def receive_stock(stock_in):
+    """
+    Apply a StockIn to its product:
+    1. Lock the product row (SELECT ... FOR UPDATE)
+    2. Recalculate the weighted average cost
+    3. Save only quantity and average_cost
+    """
+    with transaction.atomic():
+        product = (
+            Product.objects.select_for_update()
+            .only('quantity', 'average_cost')
+            .get(pk=stock_in.product_id)
+        )
+        product.average_cost = weighted_average_cost(
+            product.quantity, product.average_cost, stock_in.quantity, stock_in.unit_cost
+        )
+        product.quantity += stock_in.quantity
+        product.save(update_fields=['quantity', 'average_cost'])
+
+    # Keep the caller's in-memory product in step with the database
+    stock_in.product.quantity = product.quantity
+    stock_in.product.average_cost = product.average_cost
+    return product
+
+
+def release_stock(product_id, quantity):
+    """
+    Take units off the shelf in a single conditional statement:
+        UPDATE product SET quantity = quantity - n WHERE id = ? AND quantity >= n
+    Raises InsufficientStock (leaving stock untouched) if the shelf is short.
+    """
+    updated = Product.objects.filter(pk=product_id, quantity__gte=quantity).update(
+        quantity=F('quantity') - quantity
+    )
+    if not updated:
+        raise InsufficientStock(product_id, quantity)
+
+
+def signed_amount(transaction_type, amount):
+    """
+    Effect of a transaction on its account: +amount for 'in', -amount for 'out'.
+    """
+    if transaction_type == 'in':
+        return amount
+    if transaction_type == 'out':
+        return -amount
+    return Decimal('0.00')
+
+
+def adjust_balance(account_id, delta):
+    """
+    Move a BankAccount balance in place: balance = balance + delta.
+    """
+    if account_id and delta:
+        BankAccount.objects.filter(pk=account_id).update(balance=F('balance') + delta)
+
+
+def post_bank_transaction(bank_transaction):
+    """
+    Apply a new BankTransaction to its account's balance and number it
+    with the account's next posting sequence, in one transaction:
+        UPDATE account SET balance = balance + amount, posted_sequence = posted_sequence + 1
+    The UPDATE takes the account row lock before the number is read, so
+    sequences follow commit order and a reconcile (which takes the same
+    lock) never checkpoints past a posting still in flight.
+    """
+    account_id = bank_transaction.bank_account_id
+    with transaction.atomic():
+        BankAccount.objects.filter(pk=account_id).update(
+            balance=F('balance') + signed_amount(bank_transaction.transaction_type, bank_transaction.amount),
+            posted_sequence=F('posted_sequence') + 1,
+        )
+        sequence = BankAccount.objects.filter(pk=account_id).values_list('posted_sequence', flat=True).first()
+        BankTransaction.objects.filter(pk=bank_transaction.pk).update(sequence=sequence)
+    bank_transaction.sequence = sequence
+
+
+def checkout(lines, payment_method, bank_account=None, reference=None):
+    """
+    Record a multi-line cart as one Sale receipt.
+    `lines` is a list of (product_id, quantity, selling_price).
+
+    The whole cart is written with a fixed number of statements:
+    1. Lock every product in the cart with one SELECT ... FOR UPDATE
+    2. Decrement all quantities with one UPDATE ... CASE
+    3. Insert all StockOut lines (and their SalesFact rows) with one bulk INSERT each
+    4. Post one aggregated BankTransaction for transfer payments
+    Raises InsufficientStock (nothing is written) if any line is short.
+    """
+    wanted = Counter()
+    for product_id, quantity, _ in lines:
+        wanted[product_id] += quantity
+
+    with transaction.atomic():
+        products = (
+            Product.objects.select_for_update()
+            .filter(pk__in=wanted)
+            .order_by('pk')  # consistent lock order avoids deadlocks between tills
+            .only('quantity', 'average_cost', *FACT_PRODUCT_FIELDS)
+            .in_bulk()
+        )
+        for product_id, quantity in wanted.items():
+            product = products.get(product_id)
+            if product is None or product.quantity < quantity:
+                raise InsufficientStock(product_id, quantity)
+
+        Product.objects.filter(pk__in=wanted).update(quantity=Case(
+            *[When(pk=product_id, then=F('quantity') - quantity) for product_id, quantity in wanted.items()]
+        ))
+
+        sale = Sale.objects.create(
+            payment_method=payment_method,
+            bank_account=bank_account,
+            reference=reference,
+        )
+        # bulk_create skips the per-line StockOut signals; their work is done here in bulk
+        stock_outs = StockOut.objects.bulk_create([
+            StockOut(
+                sale=sale,
+                product_id=product_id,
+                quantity=quantity,
+                selling_price=selling_price,
+                cost_at_sale=products[product_id].average_cost,
+                payment_method=payment_method,
+                bank_account=bank_account,
+                reference=reference,
+            )
+            for product_id, quantity, selling_price in lines
+        ])
+        record_sales(stock_outs)
+        record_live_facts(stock_outs, products)
+
+        if payment_method == 'transfer' and bank_account:
+            sale.bank_transaction = BankTransaction.objects.create(
+                bank_account=bank_account,
+                transaction_type='in',
+                category='sale',
+                amount=sum(line.total_sale() for line in stock_outs),
+                description=f"Sale #{sale.pk} ({len(stock_outs)} lines)",
+                reference=reference,
+                date=sale.date
+            )
+            sale.save(update_fields=['bank_transaction'])
+
+        # The bulk-created lines fire no signals of their own
+        bump(DASHBOARD, STOCK)
+    return sale
+
+
+def receive_delivery(lines, supplier, bank_account=None):
+    """
+    Receive a whole supplier delivery at once.
+    `lines` is a list of (product_id, quantity, unit_cost) in manifest order.
+
+    Produces exactly what saving one StockIn per line would (same average
+    cost after every line, rounded the same way), but with:
+    1. One SELECT ... FOR UPDATE for every product in the delivery
+    2. One bulk UPDATE of quantity / average_cost
+    3. One bulk INSERT of the StockIn rows
+    4. One consolidated bank debit instead of one per line
+    Raises ValidationError (nothing is written) if a product was deleted
+    after the manifest was read.
+    """
+    with transaction.atomic():
+        products = (
+            Product.objects.select_for_update()
+            .filter(pk__in={product_id for product_id, _, _ in lines})
+            .order_by('pk')
+            .only('quantity', 'average_cost')
+            .in_bulk()
+        )
+        missing = sorted({product_id for product_id, _, _ in lines} - products.keys())
+        if missing:
+            ids = ', '.join(f"#{product_id}" for product_id in missing)
+            raise ValidationError(f"Product(s) {ids} were deleted while the delivery was being received. Nothing was saved.")
+        # Fold the lines into each product in manifest order, like the per-row signal
+        for product_id, quantity, unit_cost in lines:
+            product = products[product_id]
+            product.average_cost = weighted_average_cost(
+                product.quantity, product.average_cost, quantity, unit_cost
+            )
+            product.quantity += quantity
+        Product.objects.bulk_update(products.values(), ['quantity', 'average_cost'])
+
+        # bulk_create skips the per-row StockIn signals; their work is done above
+        stock_ins = StockIn.objects.bulk_create([
+            StockIn(
+                product_id=product_id,
+                quantity=quantity,
+                unit_cost=unit_cost,
+                supplier=supplier,
+                bank_account=bank_account,
+            )
+            for product_id, quantity, unit_cost in lines
+        ])
+
+        if bank_account and stock_ins:
+            BankTransaction.objects.create(
+                bank_account=bank_account,
+                transaction_type='out',
+                category='inventory',
+                amount=sum(stock_in.quantity * stock_in.unit_cost for stock_in in stock_ins),
+                description=f"Stock Delivery: {supplier} ({len(stock_ins)} lines)",
+                reference=f"StockIn #{stock_ins[0].pk}-#{stock_ins[-1].pk}",
+                date=stock_ins[0].date
+            )
+
+        # The bulk-created receipts fire no signals of their own
+        bump(DASHBOARD, STOCK)
+    return stock_ins
@@ -1,46 +1,24 @@
 from django.db.models.signals import pre_save, post_save
 from django.dispatch import receiver
+from .instrumentation import instrumented
 from .models import StockIn, StockOut
-from decimal import Decimal
+from .rollups import record_sales, record_sale_change
+from .services import receive_stock, release_stock, post_bank_transaction
 
 @receiver(post_save, sender=StockIn)
+@instrumented
 def process_stock_in(sender, instance, created, **kwargs):
     """
     When stock adds:
     1. Calculate new Weighted Average Cost
     2. Increase Product Quantity
+    Both happen under a row lock (see services.receive_stock).
     """
     if created:
-        product = instance.product
-        
-        # WE MUST HANDLE THE MATH CAREFULLY
-        # Incoming Value = Qty * Unit Cost
-        # Current Value = Current Qty * Current Current Avg Cost
-        # New Qty = Current Qty + Incoming Qty
-        # New Avg = (Current Value + Incoming Value) / New Qty
-        
-        current_qty = product.quantity
-        current_avg = product.average_cost
-        
-        incoming_qty = instance.quantity
-        incoming_cost = instance.unit_cost
-        
-        total_current_value = current_qty * current_avg
-        total_incoming_value = incoming_qty * incoming_cost
-        
-        new_total_qty = current_qty + incoming_qty
-        
-        if new_total_qty > 0:
-            new_average_cost = (total_current_value + total_incoming_value) / new_total_qty
-        else:
-            new_average_cost = Decimal('0.00')
-            
-        # Update Product
-        product.average_cost = new_average_cost
-        product.quantity = new_total_qty
-        product.save()
+        receive_stock(instance)
 
 @receiver(pre_save, sender=StockOut)
+@instrumented
 def lock_cost_basis(sender, instance, **kwargs):
     """
     BEFORE saving a sale:
@@ -51,21 +29,37 @@ def lock_cost_basis(sender, instance, **kwargs):
         # We lock the cost NOW, so future price changes don't affect this sale's profit record
         instance.cost_at_sale = product.average_cost
 
+@receiver(pre_save, sender=StockOut)
+@instrumented
+def remember_previous_sale(sender, instance, **kwargs):
+    """
+    BEFORE an edit: keep the stored sale, so post_save can move
+    the daily sales rollup by the difference.
+    """
+    instance._previous = None
+    if not instance._state.adding and instance.pk:
+        instance._previous = (
+            StockOut.objects.filter(pk=instance.pk)
+            .only('date', 'product', 'payment_method', 'quantity', 'selling_price', 'cost_at_sale')
+            .first()
+        )
+
 @receiver(post_save, sender=StockOut)
+@instrumented
 def process_stock_out(sender, instance, created, **kwargs):
     """
     When stock leaves:
     1. Decrease Product Quantity
-    2. If Transfer, add to Bank Balance
+    2. Add the sale to the daily sales rollup
+    3. If Transfer, add to Bank Balance
+    Edits only move the rollup by the difference.
     """
     if created:
-        product = instance.product
-        if product.quantity >= instance.quantity:
-            product.quantity -= instance.quantity
-            product.save()
-        else:
-            product.quantity = 0 
-            product.save()
+        # Single conditional UPDATE; raises InsufficientStock (rolling back
+        # the surrounding transaction) if another till sold the last units.
+        release_stock(instance.product_id, instance.quantity)
+
+        record_sales([instance])
             
         # Bank Logic
         if instance.payment_method == 'transfer' and instance.bank_account:
@@ -78,28 +72,67 @@ def process_stock_out(sender, instance, created, **kwargs):
                 reference=instance.reference,
                 date=instance.date
             )
+    elif getattr(instance, '_previous', None):
+        record_sale_change(instance._previous, instance)
 
 # ---------------------------------------------------------
 # NEW BANKING SIGNALS
 # ---------------------------------------------------------
 
-from .models import BankAccount, BankTransaction, OwnerDrawing
+from django.db.models.signals import post_delete
+from .models import BankAccount, BankTransaction, OwnerDrawing, BalanceCheckpoint
+from .reconcile import record_transaction_change
+
+@receiver(pre_save, sender=BankTransaction)
+@instrumented
+def remember_previous_transaction(sender, instance, **kwargs):
+    """
+    BEFORE an edit: keep the stored account / type / amount,
+    so post_save can apply the difference.
+    """
+    instance._previous = None
+    if not instance._state.adding and instance.pk:
+        instance._previous = (
+            BankTransaction.objects.filter(pk=instance.pk)
+            .values_list('bank_account_id', 'transaction_type', 'amount')
+            .first()
+        )
 
 @receiver(post_save, sender=BankTransaction)
+@instrumented
 def update_bank_balance(sender, instance, created, **kwargs):
     """
     Update BankAccount balance when a transaction is saved.
-    Note: Ideally we should handle updates/deletes too, but for now we focus on creation.
+    Creations add the amount; edits apply only the difference
+    (to the balance and to any checkpoint that already includes it).
     """
     if created:
-        account = instance.bank_account
-        if instance.transaction_type == 'in':
-            account.balance += instance.amount
-        elif instance.transaction_type == 'out':
-            account.balance -= instance.amount
-        account.save()
+        post_bank_transaction(instance)
+    elif getattr(instance, '_previous', None):
+        current = (instance.bank_account_id, instance.transaction_type, instance.amount)
+        record_transaction_change(instance, instance._previous, current)
+
+@receiver(post_delete, sender=BankTransaction)
+@instrumented
+def reverse_bank_transaction(sender, instance, **kwargs):
+    """
+    Deleting a transaction takes its effect back out of the balance.
+    """
+    removed = (instance.bank_account_id, instance.transaction_type, instance.amount)
+    record_transaction_change(instance, removed, None)
+
+@receiver(post_save, sender=BankAccount)
+@instrumented
+def create_opening_checkpoint(sender, instance, created, **kwargs):
+    """
+    The initial balance of a new account is its first checkpoint,
+    as it has no transaction of its own.
+    """
+    if created:
+        BalanceCheckpoint.objects.create(bank_account=instance, as_of_sequence=0, balance=instance.balance)
 
 @receiver(post_save, sender=StockIn)
+@instrumented
 def create_transaction_from_stock_in(sender, instance, created, **kwargs):
     """
     If a Bank Account was selected for purchase, deduct money.
@@ -119,6 +152,7 @@ def create_transaction_from_stock_in(sender, instance, created, **kwargs):
         )
 
 @receiver(post_save, sender=OwnerDrawing)
+@instrumented
 def create_transaction_from_drawing(sender, instance, created, **kwargs):
     """
     When OwnerDrawing is created, create a corresponding BankTransaction (Withdrawal).
@@ -139,6 +173,107 @@ def create_transaction_from_drawing(sender, instance, created, **kwargs):
         instance.bank_transaction = transaction
         instance.save()
 
+# ---------------------------------------------------------
+# SALES FACT SIGNALS
+# ---------------------------------------------------------
+# Keep the SalesFact table in step with single-row writes. Bulk writers
+# (services.checkout, the historical import) record their facts themselves.
+from .models import Product, HistoricalSale
+from .facts import LIVE, HISTORICAL, live_fact, historical_fact, products_by_sku, save_fact, delete_fact, refresh_product_facts
+
+@receiver(post_save, sender=StockOut)
+@instrumented
+def record_stock_out_fact(sender, instance, created, **kwargs):
+    fact = live_fact(instance, instance.product)
+    if created:
+        fact.save()
+    else:
+        save_fact(fact)
+
+@receiver(post_save, sender=HistoricalSale)
+@instrumented
+def record_historical_sale_fact(sender, instance, created, **kwargs):
+    fact = historical_fact(instance, products_by_sku([instance.sku]).get(instance.sku))
+    if created:
+        fact.save()
+    else:
+        save_fact(fact)
+
+@receiver(post_delete, sender=StockOut)
+@instrumented
+def remove_sale_from_rollup(sender, instance, **kwargs):
+    """
+    Deleting a sale (directly, or with its receipt or product)
+    takes it back out of the daily sales rollup.
+    """
+    record_sale_change(instance, None)
+
+@receiver(post_delete, sender=StockOut)
+@receiver(post_delete, sender=HistoricalSale)
+@instrumented
+def remove_sales_fact(sender, instance, **kwargs):
+    delete_fact(LIVE if sender is StockOut else HISTORICAL, instance.pk)
+
+@receiver(post_save, sender=Product)
+@instrumented
+def update_product_facts(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Catalogue edits (name, brand, size, ...) are copied onto the
+    product's past sales. Stock movements do not touch them.
+    """
+    if created or (update_fields and set(update_fields) <= {'quantity', 'average_cost'}):
+        return
+    refresh_product_facts(instance)
+
+# ---------------------------------------------------------
+# CACHE INVALIDATION SIGNALS
+# ---------------------------------------------------------
+from .cache import bump, DASHBOARD, BANK, PRODUCTS, STOCK, REPORTS
+
+@receiver([post_save, post_delete], sender=Product)
+@receiver([post_save, post_delete], sender=StockIn)
+@receiver([post_save, post_delete], sender=StockOut)
+@instrumented
+def invalidate_stock_cache(sender, **kwargs):
+    """
+    Stock movements change the dashboard and the product stock API.
+    Sales can also be edited or deleted in a closed P&L period.
+    """
+    if sender is StockOut:
+        bump(DASHBOARD, STOCK, REPORTS)
+    else:
+        bump(DASHBOARD, STOCK)
+
+@receiver([post_save, post_delete], sender=HistoricalSale)
+@instrumented
+def invalidate_dashboard_cache(sender, **kwargs):
+    """
+    Legacy sales feed the dashboard's historical totals and can land in
+    any (closed) period of the P&L report.
+    """
+    bump(DASHBOARD, REPORTS)
+
+@receiver([post_save, post_delete], sender=Product)
+@instrumented
+def invalidate_product_index(sender, update_fields=None, **kwargs):
+    """
+    Catalogue edits make every worker rebuild its autocomplete index.
+    Stock movements (quantity / average cost only) do not.
+    """
+    if update_fields and set(update_fields) <= {'quantity', 'average_cost'}:
+        return
+    bump(PRODUCTS)
+
+@receiver([post_save, post_delete], sender=BankAccount)
+@receiver([post_save, post_delete], sender=BankTransaction)
+@receiver([post_save, post_delete], sender=OwnerDrawing)
+@instrumented
+def invalidate_bank_cache(sender, **kwargs):
+    """
+    Money movements change both the bank dashboard and the main dashboard.
+    """
+    bump(DASHBOARD, BANK)
+
 # ---------------------------------------------------------
 # INITIAL SETUP SIGNALS
 # ---------------------------------------------------------
@@ -0,0 +1,204 @@
+import csv
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal, InvalidOperation
+from django.utils import timezone
+from .importers import ImportFormatError, MAX_REPORTED_ERRORS
+from .models import BankTransaction
+
+# ---------------------------------------------------------
+# BANK STATEMENT MATCHING
+# ---------------------------------------------------------
+# Matches the lines of a bank's CSV statement to the BankTransaction
+# ledger of one account, and reports what is left over on either side.
+#
+# The statement is read row by row into compact tuples. The ledger for
+# the statement's date range (plus the window) is loaded with one query
+# into hash indexes keyed on (account, amount in cents, reference) and
+# (account, amount in cents), each holding transactions per day. A
+# statement line probes the days around its own date, nearest first, so
+# matching is O(lines x window) instead of comparing every line with
+# every transaction.
+#
+# Lines are matched by reference first (sale references, "StockIn #12",
+# owner draws), then the rest by amount alone. Each transaction matches
+# at most once.
+#
+# Statement columns: date, amount (signed: deposits positive), or
+# credit and debit instead of amount; reference and description optional.
+
+DEFAULT_WINDOW_DAYS = 3
+
+
+def normalize_reference(value):
+    return ' '.join((value or '').upper().split())
+
+
+def parse_money(value):
+    amount = Decimal((value or '').strip().replace(',', '') or '0')
+    if not amount.is_finite() or amount.as_tuple().exponent < -2:
+        raise InvalidOperation
+    return amount
+
+
+def statement_cents(row):
+    if 'amount' in row:
+        amount = parse_money(row['amount'])
+    else:
+        amount = parse_money(row.get('credit')) - parse_money(row.get('debit'))
+    return int(amount * 100)
+
+
+def cents_to_amount(cents):
+    return Decimal(cents).scaleb(-2)
+
+
+def read_statement(stream):
+    """
+    Parse a statement CSV stream.
+
+    Returns (lines, error_count, errors): lines as
+    (line number, date, signed amount in cents, reference, description),
+    errors as (line number, message) for the first failures.
+    """
+    reader = csv.DictReader(stream)
+    fields = set(reader.fieldnames or [])
+    if 'date' not in fields or not ('amount' in fields or {'credit', 'debit'} <= fields):
+        raise ImportFormatError("Missing column(s): date and amount (or credit and debit)")
+
+    lines, errors, error_count = [], [], 0
+    for line_number, row in enumerate(reader, start=2):
+        try:
+            day = date.fromisoformat((row.get('date') or '').strip()[:10])
+        except ValueError:
+            message = "date: Enter a date as YYYY-MM-DD."
+        else:
+            try:
+                cents = statement_cents(row)
+            except InvalidOperation:
+                message = "amount: Enter an amount with at most 2 decimal places."
+            else:
+                lines.append((
+                    line_number, day, cents,
+                    (row.get('reference') or '').strip(), (row.get('description') or '').strip(),
+                ))
+                continue
+        error_count += 1
+        if len(errors) < MAX_REPORTED_ERRORS:
+            errors.append((line_number, message))
+    return lines, error_count, errors
+
+
+def ledger_index(account_id, start, end):
+    """
+    The account's transactions dated start..end (inclusive), indexed.
+
+    Returns (rows, by_reference, by_amount):
+      rows          {pk: (pk, date, signed amount in cents, reference, description)}
+      by_reference  {(account, cents, reference): {date: [pk, ...]}}
+      by_amount     {(account, cents): {date: [pk, ...]}}
+    pk lists are newest first, so pop() takes the oldest transaction.
+    """
+    rows, by_reference, by_amount = {}, {}, {}
+    transactions = BankTransaction.objects.filter(
+        bank_account_id=account_id,
+        date__gte=timezone.make_aware(datetime.combine(start, time.min)),
+        date__lt=timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min)),
+    ).order_by('-pk').values_list('pk', 'transaction_type', 'amount', 'reference', 'description', 'date')
+
+    for pk, transaction_type, amount, reference, description, moment in transactions.iterator(chunk_size=5000):
+        cents = int(amount * 100) * (1 if transaction_type == 'in' else -1)
+        day = timezone.localtime(moment).date()
+        rows[pk] = (pk, day, cents, reference or '', description)
+        by_amount.setdefault((account_id, cents), {}).setdefault(day, []).append(pk)
+        key = normalize_reference(reference)
+        if key:
+            by_reference.setdefault((account_id, cents, key), {}).setdefault(day, []).append(pk)
+    return rows, by_reference, by_amount
+
+
+def take(index, key, day, offsets, matched):
+    """
+    Oldest unmatched transaction under `key` dated nearest to `day`.
+    """
+    days = index.get(key)
+    if not days:
+        return None
+    for offset in offsets:
+        pks = days.get(day + offset)
+        while pks:
+            pk = pks.pop()
+            if pk not in matched:
+                return pk
+    return None
+
+
+def match_statement(stream, account, window_days=DEFAULT_WINDOW_DAYS):
+    """
+    Match a statement CSV stream against `account`'s ledger.
+
+    Returns a dict: {'lines', 'matched', 'matched_by_reference',
+    'matched_by_amount', 'matches', 'unmatched_statement',
+    'unmatched_ledger', 'start', 'end', 'error_count', 'errors'}.
+    'matches' lists (statement line number, transaction id);
+    'unmatched_statement' (line number, date, amount, reference, description);
+    'unmatched_ledger' (transaction id, date, amount, reference, description)
+    for transactions between start and end, the statement's dates widened
+    by the window.
+    """
+    lines, error_count, errors = read_statement(stream)
+    result = {
+        'lines': len(lines) + error_count,
+        'matched': 0,
+        'matched_by_reference': 0,
+        'matched_by_amount': 0,
+        'matches': [],
+        'unmatched_statement': [],
+        'unmatched_ledger': [],
+        'start': None,
+        'end': None,
+        'error_count': error_count,
+        'errors': errors,
+    }
+    if not lines:
+        return result
+
+    window = timedelta(days=window_days)
+    start = min(line[1] for line in lines) - window
+    end = max(line[1] for line in lines) + window
+    rows, by_reference, by_amount = ledger_index(account.pk, start, end)
+    # 0, -1, +1, -2, +2, ...: the nearest date wins
+    offsets = [timedelta(days=offset) for offset in sorted(range(-window_days, window_days + 1), key=abs)]
+
+    # References first, so an amount-only match cannot take a
+    # transaction that a later line identifies by reference
+    matched, by_reference_matches, leftover = set(), [], []
+    for line in lines:
+        line_number, day, cents, reference, _ = line
+        key = normalize_reference(reference)
+        pk = take(by_reference, (account.pk, cents, key), day, offsets, matched) if key else None
+        if pk is None:
+            leftover.append(line)
+            continue
+        matched.add(pk)
+        by_reference_matches.append((line_number, pk))
+    result['matched_by_reference'] = len(by_reference_matches)
+
+    by_amount_matches = []
+    for line_number, day, cents, reference, description in leftover:
+        pk = take(by_amount, (account.pk, cents), day, offsets, matched)
+        if pk is None:
+            result['unmatched_statement'].append((line_number, day, cents_to_amount(cents), reference, description))
+            continue
+        matched.add(pk)
+        by_amount_matches.append((line_number, pk))
+    result['matched_by_amount'] = len(by_amount_matches)
+
+    result['matches'] = sorted(by_reference_matches + by_amount_matches)
+    result['matched'] = len(matched)
+    result['unmatched_ledger'] = [
+        (pk, day, cents_to_amount(cents), reference, description)
+        for pk, day, cents, reference, description in sorted(rows.values())
+        if pk not in matched
+    ]
+    result['start'], result['end'] = start, end
+    return result
@@ -0,0 +1,73 @@
+/* Search-as-you-type for AutocompleteSelect widgets (inventory/widgets.py) */
+(function () {
+    function setup(box) {
+        var hidden = box.querySelector('input[type="hidden"]');
+        var input = box.querySelector('.autocomplete-input');
+        var list = box.querySelector('.autocomplete-results');
+        var timer = null;
+        var request = 0;
+
+        function clear() {
+            list.innerHTML = '';
+        }
+
+        function choose(item) {
+            hidden.value = item.id;
+            input.value = item.text;
+            clear();
+            box.dispatchEvent(new CustomEvent('autocomplete:select', { detail: item, bubbles: true }));
+        }
+
+        function search() {
+            var query = input.value.trim();
+            var current = ++request;
+            if (!query) {
+                clear();
+                return;
+            }
+            fetch(box.dataset.url + '?q=' + encodeURIComponent(query), { credentials: 'same-origin' })
+                .then(function (response) { return response.json(); })
+                .then(function (data) {
+                    if (current !== request) {
+                        return; // a newer search is on its way
+                    }
+                    clear();
+                    data.results.forEach(function (item) {
+                        var li = document.createElement('li');
+                        li.textContent = item.text;
+                        li.addEventListener('mousedown', function (event) {
+                            event.preventDefault();
+                            choose(item);
+                        });
+                        list.appendChild(li);
+                    });
+                });
+        }
+
+        input.addEventListener('input', function () {
+            hidden.value = '';
+            clearTimeout(timer);
+            timer = setTimeout(search, 150);
+        });
+        input.addEventListener('blur', clear);
+    }
+
+    function init() {
+        document.querySelectorAll('.autocomplete').forEach(setup);
+
+        // Pre-fill an empty price box with the list price of the chosen product
+        document.addEventListener('autocomplete:select', function (event) {
+            var row = event.target.closest('tr') || event.target.closest('form');
+            var price = row && row.querySelector('input[name$="selling_price"]');
+            if (price && !price.value && event.detail.selling_price) {
+                price.value = event.detail.selling_price;
+            }
+        });
+    }
+
+    if (document.readyState === 'loading') {
+        document.addEventListener('DOMContentLoaded', init);
+    } else {
+        init();
+    }
+})();
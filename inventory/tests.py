@@ -1,3 +1,1391 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import tempfile
+import threading
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import OperationalError, connection, connections, transaction
+from django.db.models import QuerySet
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import http_date
+from . import importers
+from .api import apply_offline_sales
+from .cache import bump_now, cached, get_version, stats as summary_cache_stats, DASHBOARD, BANK, REPORTS, STOCK
+from .exports import EXPORTS
+from .facts import backfill_sales_facts, sales_totals
+from .importers import ImportFormatError, import_historical_sales
+from .instrumentation import instrumented
+from .jobs import claim_next, enqueue, requeue_stale, run_job
+from .lookup import product_index, search_products
+from .metrics import MetricsMiddleware, Registry, label_string
+from .models import Product, BankAccount, BankTransaction, DailySalesSummary, HistoricalSale, IdempotencyKey
+from .models import CacheVersion, Job, JobChunk, Sale, SalesFact, StockIn, StockOut
+from .pagination import keyset_page
+from .querycheck import query_budget
+from .reconcile import reconcile_account
+from .reorder import reorder_plan, UNKNOWN_SUPPLIER
+from .reports import DASHBOARD_AGGREGATES, profit_and_loss
+from .rollups import rebuild_daily_summary
+from .routers import REPORTING, ReportingRouter, fresh_reporting_alias, reads_from, reporting_reads, reporting_view
+from .services import InsufficientStock, checkout, post_bank_transaction, receive_delivery, release_stock
+from .statements import match_statement
+from .views import DASHBOARD_LOW_STOCK_LIMIT, PRODUCT_LIST_PAGE_SIZE
+from .warmup import TEMPLATE_DIR, report_first_request, warm_up
 
-# Create your tests here.
+
+def make_product(sku, quantity=10, average_cost='100.00', selling_price='150.00'):
+    return Product.objects.create(
+        name=f"Helmet {sku}", sku=sku, brand="Shoei", model="X", size="M", color="Black",
+        quantity=quantity, average_cost=Decimal(average_cost), selling_price=Decimal(selling_price),
+    )
+
+
+def checkout_data(lines, payment_method='cash', bank_account=None):
+    data = {
+        'payment_method': payment_method,
+        'bank_account': bank_account.pk if bank_account else '',
+        'reference': 'T-1',
+        'lines-TOTAL_FORMS': str(len(lines)),
+        'lines-INITIAL_FORMS': '0',
+    }
+    for number, (product, quantity) in enumerate(lines):
+        data[f'lines-{number}-product'] = product.pk
+        data[f'lines-{number}-quantity'] = quantity
+        data[f'lines-{number}-selling_price'] = ''
+    return data
+
+
+# ---------------------------------------------------------
+# QUERY BUDGETS
+# ---------------------------------------------------------
+# Each view must stay within its QUERY_BUDGETS entry whatever the size of
+# the cart, delivery or catalogue. The dashboards run their aggregates on
+# pool threads (reports.in_own_connection), whose connections cannot see
+# a TestCase transaction, hence TransactionTestCase for them.
+
+# Pages render without running collectstatic first
+PLAIN_STATIC = override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+
+
+@PLAIN_STATIC
+class QueryBudgetTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('clerk', password='secret')
+        self.client.force_login(self.user)
+        self.account = BankAccount.objects.create(name="Main", balance=Decimal('1000.00'))
+        self.products = [make_product(f"SKU-{number}") for number in range(20)]
+
+    def test_checkout(self):
+        for size in (1, 20):
+            lines = [(product, 1) for product in self.products[:size]]
+            with query_budget(settings.QUERY_BUDGETS['checkout']):
+                response = self.client.post(
+                    reverse('checkout'), checkout_data(lines, 'transfer', self.account)
+                )
+            self.assertRedirects(response, reverse('dashboard'), fetch_redirect_response=False)
+
+    def test_receive_delivery(self):
+        for size in (1, 20):
+            manifest = "sku,quantity,unit_cost\n" + "".join(
+                f"{product.sku},5,90.00\n" for product in self.products[:size]
+            )
+            with query_budget(settings.QUERY_BUDGETS['receive_delivery']):
+                response = self.client.post(reverse('receive_delivery'), {
+                    'supplier': "Acme",
+                    'bank_account': self.account.pk,
+                    'file': SimpleUploadedFile('manifest.csv', manifest.encode(), content_type='text/csv'),
+                })
+            self.assertRedirects(response, reverse('dashboard'), fetch_redirect_response=False)
+
+    def test_api_products(self):
+        with query_budget(settings.QUERY_BUDGETS['api_products']):
+            response = self.client.get(reverse('api_products'))
+        self.assertEqual(response.status_code, 200)
+
+
+@PLAIN_STATIC
+class DashboardQueryBudgetTests(TransactionTestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.user = User.objects.create_user('clerk', password='secret')
+        self.client.force_login(self.user)
+        account = BankAccount.objects.create(name="Main", balance=Decimal('1000.00'))
+        for number in range(10):
+            make_product(f"SKU-{number}")
+        self.client.post(reverse('checkout'), checkout_data(
+            [(product, 1) for product in Product.objects.all()], 'transfer', account
+        ))
+
+    def assert_within_budget(self, view):
+        budget = settings.QUERY_BUDGETS[view]
+        # Cold: every aggregate runs, including those on the pool threads
+        bump_now(DASHBOARD, BANK)
+        with query_budget(budget) as cold:
+            response = self.client.get(reverse(view))
+        self.assertEqual(response.status_code, 200)
+        # Warm: served from the cache
+        with query_budget(budget) as warm:
+            response = self.client.get(reverse(view))
+        self.assertEqual(response.status_code, 200)
+        self.assertLess(warm.count, cold.count)
+        return cold
+
+    def test_dashboard(self):
+        cold = self.assert_within_budget('dashboard')
+        # The aggregates' own queries are counted, not just the request thread's
+        self.assertGreaterEqual(cold.count, len(DASHBOARD_AGGREGATES))
+
+    def test_bank_dashboard(self):
+        self.assert_within_budget('bank_dashboard')
+
+
+# ---------------------------------------------------------
+# STOCK, CHECKOUT AND DELIVERY
+# ---------------------------------------------------------
+
+class StockTests(TestCase):
+    def setUp(self):
+        self.product = make_product("SKU-1", quantity=3)
+
+    def test_release_stock_decrements(self):
+        release_stock(self.product.pk, 2)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 1)
+
+    def test_release_stock_refuses_oversell(self):
+        with self.assertRaises(InsufficientStock):
+            release_stock(self.product.pk, 4)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 3)
+
+    def test_oversold_sale_is_not_saved(self):
+        with self.assertRaises(InsufficientStock), transaction.atomic():
+            StockOut.objects.create(product=self.product, quantity=4, selling_price=Decimal('150.00'), payment_method='cash')
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 3)
+        self.assertFalse(StockOut.objects.exists())
+        self.assertFalse(SalesFact.objects.exists())
+
+
+class CheckoutTests(TestCase):
+    def setUp(self):
+        self.account = BankAccount.objects.create(name="Main", balance=Decimal('1000.00'))
+        self.first = make_product("SKU-1", quantity=5)
+        self.second = make_product("SKU-2", quantity=5, average_cost='80.00')
+
+    def test_transfer_cart(self):
+        sale = checkout(
+            [(self.first.pk, 2, Decimal('150.00')), (self.second.pk, 1, Decimal('120.00')), (self.first.pk, 1, Decimal('140.00'))],
+            'transfer', bank_account=self.account, reference="R-1",
+        )
+        self.first.refresh_from_db()
+        self.second.refresh_from_db()
+        self.assertEqual((self.first.quantity, self.second.quantity), (2, 4))
+
+        lines = sale.lines.order_by('pk')
+        self.assertEqual([line.cost_at_sale for line in lines], [Decimal('100.00'), Decimal('80.00'), Decimal('100.00')])
+        self.assertEqual(SalesFact.objects.filter(source=SalesFact.LIVE).count(), 3)
+
+        # One bank entry for the whole cart
+        self.assertEqual(BankTransaction.objects.count(), 1)
+        self.assertEqual(sale.bank_transaction.amount, Decimal('560.00'))
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.balance, Decimal('1560.00'))
+
+    def test_cash_cart_posts_nothing_to_the_bank(self):
+        checkout([(self.first.pk, 1, Decimal('150.00'))], 'cash')
+        self.assertFalse(BankTransaction.objects.exists())
+
+    def test_short_line_writes_nothing(self):
+        with self.assertRaises(InsufficientStock):
+            checkout([(self.first.pk, 1, Decimal('150.00')), (self.second.pk, 6, Decimal('120.00'))], 'transfer', bank_account=self.account)
+        self.first.refresh_from_db()
+        self.second.refresh_from_db()
+        self.assertEqual((self.first.quantity, self.second.quantity), (5, 5))
+        self.assertFalse(Sale.objects.exists())
+        self.assertFalse(BankTransaction.objects.exists())
+
+
+class DeliveryTests(TestCase):
+    LINES = [(0, 4, '90.00'), (1, 7, '55.55'), (0, 3, '101.10'), (0, 1, '0.01')]
+
+    def receive(self, per_row):
+        Product.objects.all().delete()
+        products = [make_product("SKU-1", quantity=2, average_cost='100.00'), make_product("SKU-2", quantity=0, average_cost='0.00')]
+        account = BankAccount.objects.create(name="Main", balance=Decimal('1000.00'))
+        lines = [(products[index].pk, quantity, Decimal(cost)) for index, quantity, cost in self.LINES]
+        if per_row:
+            for product_id, quantity, unit_cost in lines:
+                StockIn.objects.create(product_id=product_id, quantity=quantity, unit_cost=unit_cost, supplier="Acme", bank_account=account)
+        else:
+            receive_delivery(lines, "Acme", bank_account=account)
+        account.refresh_from_db()
+        stock = [Product.objects.values_list('quantity', 'average_cost').get(pk=product.pk) for product in products]
+        return stock, account.balance
+
+    def test_matches_per_row_receipts(self):
+        self.assertEqual(self.receive(per_row=False), self.receive(per_row=True))
+
+    def test_one_bank_debit(self):
+        self.receive(per_row=False)
+        self.assertEqual(BankTransaction.objects.count(), 1)
+        self.assertEqual(StockIn.objects.count(), len(self.LINES))
+
+
+# ---------------------------------------------------------
+# BANK BALANCES
+# ---------------------------------------------------------
+
+class BankBalanceTests(TestCase):
+    def setUp(self):
+        self.account = BankAccount.objects.create(name="Main", balance=Decimal('100.00'))
+        self.other = BankAccount.objects.create(name="Spare", balance=Decimal('0.00'))
+
+    def post(self, transaction_type, amount, account=None):
+        return BankTransaction.objects.create(
+            bank_account=account or self.account, transaction_type=transaction_type,
+            category='expense', amount=Decimal(amount), description="Test",
+        )
+
+    def balances(self):
+        return list(BankAccount.objects.order_by('pk').values_list('balance', flat=True))
+
+    def test_create_edit_delete(self):
+        entry = self.post('in', '50.00')
+        self.assertEqual(self.balances(), [Decimal('150.00'), Decimal('0.00')])
+
+        entry.amount = Decimal('20.00')
+        entry.transaction_type = 'out'
+        entry.save()
+        self.assertEqual(self.balances(), [Decimal('80.00'), Decimal('0.00')])
+
+        entry.bank_account = self.other
+        entry.save()
+        self.assertEqual(self.balances(), [Decimal('100.00'), Decimal('-20.00')])
+
+        entry.delete()
+        self.assertEqual(self.balances(), [Decimal('100.00'), Decimal('0.00')])
+
+    def test_reconcile(self):
+        self.post('in', '50.00')
+        self.post('out', '30.00')
+        result = reconcile_account(self.account.pk, checkpoint=True)
+        self.assertTrue(result['ok'])
+        self.assertEqual(result['replayed_transactions'], 2)
+        self.assertTrue(result['checkpoint_created'])
+
+        # Edits behind the checkpoint shift it, so the account still verifies
+        entry = self.post('in', '10.00')
+        entry.amount = Decimal('15.00')
+        entry.save()
+        BankTransaction.objects.filter(transaction_type='out').get().delete()
+        result = reconcile_account(self.account.pk)
+        self.assertTrue(result['ok'])
+        self.assertEqual(result['expected'], Decimal('165.00'))
+        self.assertEqual(result['replayed_transactions'], 1)
+
+    def test_reconcile_repairs_drift(self):
+        self.post('in', '50.00')
+        BankAccount.objects.filter(pk=self.account.pk).update(balance=Decimal('999.00'))
+        result = reconcile_account(self.account.pk)
+        self.assertFalse(result['ok'])
+        self.assertEqual(result['difference'], Decimal('849.00'))
+
+        result = reconcile_account(self.account.pk, repair=True)
+        self.assertTrue(result['repaired'])
+        self.assertEqual(self.balances()[0], Decimal('150.00'))
+
+    def test_checkpoint_during_posting(self):
+        # The first transaction gets the lower id but is still waiting for
+        # the account lock when a later one posts and a checkpoint is taken.
+        deferred = []
+        with mock.patch('inventory.signals.post_bank_transaction', side_effect=deferred.append):
+            slow = self.post('in', '40.00')
+        fast = self.post('in', '5.00')
+        self.assertLess(slow.pk, fast.pk)
+
+        out = io.StringIO()
+        call_command('reconcile_bank_balances', '--checkpoint', account=[self.account.pk], stdout=out)
+        self.assertIn("checkpoint saved as of posting 1", out.getvalue())
+
+        post_bank_transaction(deferred[0])
+        self.assertEqual(deferred[0].sequence, 2)
+        result = reconcile_account(self.account.pk, repair=True)
+        self.assertTrue(result['ok'])
+        self.assertFalse(result['repaired'])
+        self.assertEqual(result['replayed_transactions'], 1)
+        self.assertEqual(self.balances()[0], Decimal('145.00'))
+
+
+# ---------------------------------------------------------
+# OFFLINE SALE SYNC
+# ---------------------------------------------------------
+
+class OfflineSyncTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('clerk', password='secret')
+        self.client.force_login(self.user)
+        self.product = make_product("SKU-1", quantity=5)
+
+    def sale(self, key, quantity=1):
+        return {
+            'idempotency_key': key, 'payment_method': 'cash', 'bank_account': None, 'reference': None,
+            'lines': [{'product': self.product.pk, 'quantity': quantity, 'selling_price': '150.00'}],
+        }
+
+    def sync(self, *sales):
+        response = self.client.post(reverse('api_sync_sales'), json.dumps({'sales': list(sales)}), content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def stock(self):
+        self.product.refresh_from_db()
+        return self.product.quantity
+
+    def test_retry_is_a_duplicate(self):
+        first = self.sync(self.sale('a'), self.sale('b', 2))
+        self.assertEqual(first['created'], 2)
+        retry = self.sync(self.sale('a'), self.sale('b', 2))
+        self.assertEqual(retry['duplicates'], 2)
+        self.assertEqual([result['sale'] for result in retry['results']], [result['sale'] for result in first['results']])
+        self.assertEqual(self.stock(), 2)
+        self.assertEqual(Sale.objects.count(), 2)
+
+    def test_reused_key_with_other_content_conflicts(self):
+        self.sync(self.sale('a'))
+        result = self.sync(self.sale('a', 2))
+        self.assertEqual(result['results'][0]['status'], 'conflict')
+        self.assertEqual(result['failed'], 1)
+        self.assertEqual(self.stock(), 4)
+
+    def test_failed_sale_can_be_resent(self):
+        result = apply_offline_sales([self.sale('a', 9), self.sale('b')], self.user)
+        self.assertEqual([item['status'] for item in result], ['error', 'created'])
+        self.assertEqual(self.stock(), 4)
+        self.assertFalse(IdempotencyKey.objects.filter(key='a').exists())
+
+        result = apply_offline_sales([self.sale('a', 4)], self.user)
+        self.assertEqual(result[0]['status'], 'created')
+        self.assertEqual(self.stock(), 0)
+
+
+# ---------------------------------------------------------
+# DASHBOARD AND PRODUCT LIST
+# ---------------------------------------------------------
+
+@PLAIN_STATIC
+class DashboardProductsTests(TransactionTestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.client.force_login(User.objects.create_user('clerk', password='secret'))
+
+    def test_dashboard_lists_a_bounded_low_stock_slice(self):
+        for number in range(DASHBOARD_LOW_STOCK_LIMIT + 5):
+            make_product(f"LOW-{number}", quantity=number % 5)
+        make_product("FULL-1", quantity=50)
+        response = self.client.get(reverse('dashboard'))
+        products = response.context['products']
+        self.assertEqual(len(products), DASHBOARD_LOW_STOCK_LIMIT)
+        self.assertTrue(response.context['more_low_stock'])
+        self.assertNotIn("FULL-1", [product.sku for product in products])
+        self.assertEqual([product.quantity for product in products], sorted(product.quantity for product in products))
+        self.assertContains(response, reverse('product_list'))
+
+    def test_product_list_pages(self):
+        for number in range(PRODUCT_LIST_PAGE_SIZE + 10):
+            make_product(f"SKU-{number}")
+        first = self.client.get(reverse('product_list'))
+        self.assertEqual(len(first.context['products']), PRODUCT_LIST_PAGE_SIZE)
+        second = self.client.get(reverse('product_list'), {'after': first.context['next_cursor']})
+        self.assertEqual(len(second.context['products']), 10)
+        self.assertIsNone(second.context['next_cursor'])
+        self.assertFalse(
+            {product.pk for product in first.context['products']} & {product.pk for product in second.context['products']}
+        )
+
+
+# ---------------------------------------------------------
+# DAILY SALES ROLLUP
+# ---------------------------------------------------------
+
+class DailySalesRollupTests(TestCase):
+    def setUp(self):
+        self.product = make_product("SKU-1", quantity=20)
+        self.other = make_product("SKU-2", quantity=20, average_cost='80.00')
+
+    def sell(self, quantity, product=None, payment_method='cash'):
+        return StockOut.objects.create(
+            product=product or self.product, quantity=quantity,
+            selling_price=Decimal('150.00'), payment_method=payment_method,
+        )
+
+    def buckets(self):
+        return {
+            (row.product_id, row.payment_method): (row.units, row.revenue, row.profit)
+            for row in DailySalesSummary.objects.all()
+        }
+
+    def assert_matches_rebuild(self):
+        incremental = self.buckets()
+        rebuild_daily_summary()
+        rebuilt = {key: value for key, value in self.buckets().items() if value[0]}
+        self.assertEqual({key: value for key, value in incremental.items() if value[0]}, rebuilt)
+
+    def test_sales_are_added(self):
+        self.sell(2)
+        self.sell(3)
+        self.assertEqual(self.buckets(), {(self.product.pk, 'cash'): (5, Decimal('750.00'), Decimal('250.00'))})
+
+    def test_edit_moves_the_difference(self):
+        sale = self.sell(2)
+        self.sell(1)
+        sale.quantity = 4
+        sale.save()
+        self.assertEqual(self.buckets()[(self.product.pk, 'cash')], (5, Decimal('750.00'), Decimal('250.00')))
+
+        sale.payment_method = 'transfer'
+        sale.product = self.other
+        sale.save()
+        buckets = self.buckets()
+        self.assertEqual(buckets[(self.product.pk, 'cash')], (1, Decimal('150.00'), Decimal('50.00')))
+        self.assertEqual(buckets[(self.other.pk, 'transfer')], (4, Decimal('600.00'), Decimal('200.00')))
+        self.assert_matches_rebuild()
+
+    def test_delete_takes_the_sale_out(self):
+        sale = self.sell(2)
+        self.sell(1)
+        sale.delete()
+        self.assertEqual(self.buckets()[(self.product.pk, 'cash')], (1, Decimal('150.00'), Decimal('50.00')))
+
+        # Lines deleted with their receipt are taken out too
+        receipt = checkout([(self.product.pk, 2, Decimal('150.00')), (self.other.pk, 1, Decimal('120.00'))], 'cash')
+        receipt.delete()
+        self.assert_matches_rebuild()
+
+    def test_sale_changes_invalidate_reports(self):
+        sale = self.sell(1)
+        before = get_version(REPORTS)
+        with self.captureOnCommitCallbacks(execute=True):
+            sale.quantity = 2
+            sale.save()
+        edited = get_version(REPORTS)
+        self.assertGreater(edited, before)
+        with self.captureOnCommitCallbacks(execute=True):
+            sale.delete()
+        self.assertGreater(get_version(REPORTS), edited)
+
+
+# ---------------------------------------------------------
+# HISTORICAL SALE IMPORT
+# ---------------------------------------------------------
+
+class HistoricalImportTests(TestCase):
+    HEADER = "date,sku,product_name,quantity,unit_cost,selling_price,reference\n"
+
+    def test_bad_rows_are_reported_and_skipped(self):
+        make_product("SKU-1")
+        stream = io.StringIO(
+            self.HEADER
+            + "2023-01-05,SKU-1,Helmet,2,100.00,150.00,A-1\n"
+            + "not a date,SKU-1,Helmet,2,100.00,150.00,\n"
+            + "2023-01-06,OLD-9,Visor,x,10.00,15.00,\n"
+            + "2023-01-07,OLD-9,Visor,1,10.00,15.00,\n"
+        )
+        batches = []
+        result = import_historical_sales(stream, batch_size=1, on_batch=lambda result: batches.append(result['created']))
+        self.assertEqual((result['rows'], result['created'], result['error_count']), (4, 2, 2))
+        self.assertEqual([line for line, _ in result['errors']], [3, 4])
+        self.assertIn("date", result['errors'][0][1])
+        self.assertIn("quantity", result['errors'][1][1])
+        self.assertEqual(batches, [1, 2])
+
+        self.assertEqual(HistoricalSale.objects.count(), 2)
+        facts = dict(SalesFact.objects.filter(source=SalesFact.HISTORICAL).values_list('sku', 'brand'))
+        self.assertEqual(facts, {"SKU-1": "Shoei", "OLD-9": ""})
+
+    def test_missing_columns_reject_the_file(self):
+        with self.assertRaisesMessage(ImportFormatError, "quantity"):
+            import_historical_sales(io.StringIO("date,sku,product_name,unit_cost,selling_price\n"))
+        self.assertFalse(HistoricalSale.objects.exists())
+
+
+@PLAIN_STATIC
+class DeliveryRaceTests(TestCase):
+    def test_product_deleted_after_parsing_is_a_form_error(self):
+        self.client.force_login(User.objects.create_user('clerk', password='secret'))
+        kept, deleted = make_product("SKU-1"), make_product("SKU-2")
+        deleted_id = deleted.pk
+        read = importers.read_delivery_manifest
+
+        def read_then_delete(stream):
+            parsed = read(stream)
+            deleted.delete()
+            return parsed
+
+        manifest = b"sku,quantity,unit_cost\nSKU-1,5,90.00\nSKU-2,5,90.00\n"
+        with mock.patch('inventory.views.read_delivery_manifest', read_then_delete):
+            response = self.client.post(reverse('receive_delivery'), {
+                'supplier': "Acme",
+                'file': SimpleUploadedFile('manifest.csv', manifest, content_type='text/csv'),
+            })
+        self.assertEqual(response.status_code, 200)
+        self.assertFormError(response.context['form'], 'file', [
+            f"Product(s) #{deleted_id} were deleted while the delivery was being received. Nothing was saved."
+        ])
+        kept.refresh_from_db()
+        self.assertEqual(kept.quantity, 10)
+        self.assertFalse(StockIn.objects.exists())
+
+
+# ---------------------------------------------------------
+# CSV EXPORTS
+# ---------------------------------------------------------
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('clerk', password='secret'))
+        self.main = BankAccount.objects.create(name="Main", balance=Decimal('1000.00'))
+        self.spare = BankAccount.objects.create(name="Spare", balance=Decimal('1000.00'))
+        for account, amount in ((self.main, '10.00'), (self.spare, '20.00'), (self.main, '30.00')):
+            BankTransaction.objects.create(
+                bank_account=account, transaction_type='in', category='sale', amount=Decimal(amount), description="Till",
+            )
+
+    def export(self, kind, **filters):
+        response = self.client.get(reverse('export_csv', args=[kind]), filters)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return list(csv.reader(io.StringIO(b"".join(response.streaming_content).decode())))
+
+    def test_streams_header_and_rows_in_order(self):
+        rows = self.export('bank_transactions')
+        self.assertEqual(rows[0], [label for _, label in EXPORTS['bank_transactions']['columns']])
+        self.assertEqual([(row[1], row[4]) for row in rows[1:]], [("Main", "10.00"), ("Spare", "20.00"), ("Main", "30.00")])
+
+    def test_filters(self):
+        self.assertEqual([row[4] for row in self.export('bank_transactions', account=self.main.pk)[1:]], ["10.00", "30.00"])
+        today = timezone.localdate()
+        self.assertEqual(len(self.export('bank_transactions', start=today, end=today)), 4)
+        self.assertEqual(len(self.export('bank_transactions', start=today + timedelta(days=1))), 1)
+
+    def test_rejects_bad_filters_and_unknown_exports(self):
+        self.assertEqual(self.client.get(reverse('export_csv', args=['sales']), {'start': 'soon'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('export_csv', args=['passwords'])).status_code, 404)
+
+
+# ---------------------------------------------------------
+# KEYSET PAGINATION
+# ---------------------------------------------------------
+
+class KeysetPaginationTests(TestCase):
+    FIELDS = ('date', 'id')
+
+    def setUp(self):
+        # Several sales per day, so pages break inside a date
+        day = timezone.localdate()
+        for number in range(11):
+            HistoricalSale.objects.create(
+                date=day - timedelta(days=number // 3), sku=f"OLD-{number % 2}", product_name="Visor",
+                quantity=1, unit_cost=Decimal('10.00'), selling_price=Decimal('15.00'),
+            )
+        self.expected = list(HistoricalSale.objects.order_by('-date', '-id').values_list('pk', flat=True))
+
+    def ids(self, page):
+        return [sale.pk for sale in page['items']]
+
+    def test_forward_and_back(self):
+        pages = [keyset_page(HistoricalSale.objects.all(), self.FIELDS, size=3)]
+        while pages[-1]['next_cursor']:
+            pages.append(keyset_page(HistoricalSale.objects.all(), self.FIELDS, after=pages[-1]['next_cursor'], size=3))
+        self.assertEqual([pk for page in pages for pk in self.ids(page)], self.expected)
+        self.assertEqual([len(page['items']) for page in pages], [3, 3, 3, 2])
+        self.assertIsNone(pages[0]['prev_cursor'])
+
+        # Walking back from the last page gives the same pages
+        page = pages[-1]
+        for previous in reversed(pages[:-1]):
+            page = keyset_page(HistoricalSale.objects.all(), self.FIELDS, before=page['prev_cursor'], size=3)
+            self.assertEqual(self.ids(page), self.ids(previous))
+        self.assertIsNone(page['prev_cursor'])
+
+    def test_malformed_cursor_starts_from_the_top(self):
+        for cursor in ("garbage", "2023-13-01~4", "~"):
+            page = keyset_page(HistoricalSale.objects.all(), self.FIELDS, after=cursor, size=3)
+            self.assertEqual(self.ids(page), self.expected[:3])
+
+    @PLAIN_STATIC
+    @mock.patch('inventory.views.HISTORICAL_SALES_PAGE_SIZE', 4)
+    def test_list_keeps_filters_across_pages(self):
+        self.client.force_login(User.objects.create_user('clerk', password='secret'))
+        first = self.client.get(reverse('historical_sales_list'), {'sku': "OLD-0"})
+        self.assertEqual(first.context['filter_query'], "sku=OLD-0")
+        second = self.client.get(reverse('historical_sales_list'), {'sku': "OLD-0", 'after': first.context['next_cursor']})
+        sales = first.context['sales'] + second.context['sales']
+        self.assertEqual(len(sales), HistoricalSale.objects.filter(sku="OLD-0").count())
+        self.assertEqual({sale.sku for sale in sales}, {"OLD-0"})
+
+
+# ---------------------------------------------------------
+# SUMMARY CACHE
+# ---------------------------------------------------------
+
+DATABASE_CACHE = override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'inventory_test_cache'},
+})
+
+
+@DATABASE_CACHE
+class DatabaseCacheVersionTests(TransactionTestCase):
+    def setUp(self):
+        call_command('createcachetable', verbosity=0)
+
+    def test_concurrent_bumps_are_all_counted(self):
+        start = get_version(DASHBOARD)
+        threads, bumps = 4, 25
+
+        def bump_many(barrier):
+            barrier.wait()
+            try:
+                for _ in range(bumps):
+                    while True:
+                        try:
+                            bump_now(DASHBOARD)
+                            break
+                        except OperationalError:
+                            # The in-memory test database reports "table is locked"
+                            # where a server database would wait; nothing was written
+                            time.sleep(0.001)
+            finally:
+                connection.close()
+
+        barrier = threading.Barrier(threads)
+        workers = [threading.Thread(target=bump_many, args=(barrier,)) for _ in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        # No bump lost (a retry after the change time failed to save may add one)
+        self.assertGreaterEqual(get_version(DASHBOARD), start + threads * bumps)
+        self.assertEqual(CacheVersion.objects.get(namespace=DASHBOARD).version, get_version(DASHBOARD))
+
+    def test_cached_reads_do_not_write(self):
+        cached(DASHBOARD, 'totals', lambda: {'total': 1})
+        hits = summary_cache_stats()['hits']
+        with CaptureQueriesContext(connection) as queries:
+            for _ in range(5):
+                self.assertEqual(cached(DASHBOARD, 'totals', lambda: {'total': 2}), {'total': 1})
+        self.assertFalse([query for query in queries if not query['sql'].lstrip().upper().startswith('SELECT')])
+        # The hits are still counted, when the stats are read
+        self.assertEqual(summary_cache_stats()['hits'], hits + 5)
+
+
+class CacheInvalidationTests(TransactionTestCase):
+    def test_writes_bump_once_committed(self):
+        start = get_version(STOCK)
+        with transaction.atomic():
+            make_product("SKU-1")
+            # A reader meanwhile must not cache pre-commit numbers under a new version
+            self.assertEqual(get_version(STOCK), start)
+        self.assertGreater(get_version(STOCK), start)
+
+    def test_rolled_back_writes_do_not_bump(self):
+        start = get_version(BANK)
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            BankAccount.objects.create(name="Main", balance=Decimal('1.00'))
+            raise RuntimeError
+        self.assertEqual(get_version(BANK), start)
+
+    def test_stale_payload_is_recomputed(self):
+        account = BankAccount.objects.create(name="Main", balance=Decimal('1.00'))
+        balance = lambda: str(BankAccount.objects.get(pk=account.pk).balance)
+        self.assertEqual(cached(BANK, 'balance', balance), "1.00")
+        BankTransaction.objects.create(
+            bank_account=account, transaction_type='in', category='sale', amount=Decimal('2.00'), description="Till",
+        )
+        self.assertEqual(cached(BANK, 'balance', balance), "3.00")
+
+
+# ---------------------------------------------------------
+# PRODUCT AUTOCOMPLETE
+# ---------------------------------------------------------
+
+class ProductLookupTests(TestCase):
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.air = Product.objects.create(
+                name="Shoei GT-Air", sku="SH-GTA-M", brand="Shoei", model="GT-Air", size="M", color="Black",
+                selling_price=Decimal('450.00'),
+            )
+            self.neotec = Product.objects.create(
+                name="Shoei Neotec", sku="SH-NEO-L", brand="Shoei", model="Neotec", size="L", color="White",
+                selling_price=Decimal('520.00'),
+            )
+            self.arai = Product.objects.create(
+                name="Arai RX-7V", sku="AR-RX7-M", brand="Arai", model="RX-7V", size="M", color="Red",
+                selling_price=Decimal('610.00'),
+            )
+
+    def skus(self, query):
+        return [result['sku'] for result in search_products(query)]
+
+    def test_prefix_search(self):
+        self.assertEqual(self.skus("sho"), ["SH-GTA-M", "SH-NEO-L"])
+        self.assertEqual(self.skus("SHOEI neo"), ["SH-NEO-L"])
+        self.assertEqual(self.skus("gt-air"), ["SH-GTA-M"])
+        self.assertEqual(self.skus("ar-rx"), ["AR-RX7-M"])
+        self.assertEqual(self.skus("shoei arai"), [])
+        self.assertEqual(self.skus("  "), [])
+
+    def test_catalogue_edits_rebuild_the_index(self):
+        self.assertEqual(self.skus("pista"), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.arai.name = "AGV Pista"
+            self.arai.save()
+        self.assertEqual(self.skus("pista"), ["AR-RX7-M"])
+
+    def test_stock_movements_keep_the_index(self):
+        index = product_index()
+        with self.captureOnCommitCallbacks(execute=True):
+            StockIn.objects.create(product=self.air, quantity=3, unit_cost=Decimal('300.00'), supplier="Acme")
+        self.assertIs(product_index(), index)
+
+    def test_unsignalled_changes_are_seen_after_max_age(self):
+        product_index()
+        Product.objects.filter(pk=self.arai.pk).update(name="AGV Pista")
+        with mock.patch('inventory.lookup.LOCAL_MAX_AGE', 0):
+            self.assertEqual(self.skus("pista"), ["AR-RX7-M"])
+
+    def test_lookup_view(self):
+        self.client.force_login(User.objects.create_user('clerk', password='secret'))
+        response = self.client.get(reverse('product_lookup'), {'q': "neo"})
+        self.assertEqual(response.json(), {'results': [
+            {'id': self.neotec.pk, 'text': "Shoei Neotec (SH-NEO-L)", 'sku': "SH-NEO-L", 'selling_price': "520.00"},
+        ]})
+
+
+# ---------------------------------------------------------
+# JSON API
+# ---------------------------------------------------------
+
+class ConditionalGetTests(TestCase):
+    NOW = 2000000000
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('clerk', password='secret'))
+        make_product("SKU-1")
+
+    def get(self, **headers):
+        return self.client.get(reverse('api_products'), **headers)
+
+    def at(self, seconds):
+        return mock.patch('time.time', return_value=self.NOW + seconds)
+
+    def test_etag(self):
+        first = self.get()
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            make_product("SKU-2")
+        changed = self.get(HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual(len(changed.json()['results']), 2)
+        self.assertNotEqual(changed['ETag'], first['ETag'])
+
+    def test_if_modified_since(self):
+        with self.at(0.2):
+            bump_now(STOCK)
+        # A write later in the same second would get the same date: no Last-Modified yet
+        with self.at(0.5):
+            self.assertNotIn('Last-Modified', self.get())
+        with self.at(1.3):
+            fetched = self.get()
+        self.assertEqual(fetched['Last-Modified'], http_date(self.NOW + 1))
+        with self.at(1.4):
+            self.assertEqual(self.get(HTTP_IF_MODIFIED_SINCE=fetched['Last-Modified']).status_code, 304)
+
+        with self.at(1.5):
+            bump_now(STOCK)
+        with self.at(2.5):
+            response = self.get(HTTP_IF_MODIFIED_SINCE=fetched['Last-Modified'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Last-Modified'], http_date(self.NOW + 2))
+
+
+# ---------------------------------------------------------
+# REORDER PLANNER
+# ---------------------------------------------------------
+
+@PLAIN_STATIC
+class ReorderPlanTests(TestCase):
+    def setUp(self):
+        today = timezone.localdate()
+        # 90 units two months ago: only the 90-day window sees them, 0.2 units/day
+        self.selling = make_product("SKU-SELL", average_cost='10.00')
+        StockIn.objects.create(product=self.selling, quantity=1, unit_cost=Decimal('10.00'), supplier="Acme")
+        DailySalesSummary.objects.create(
+            date=today - timedelta(days=60), product=self.selling, payment_method='cash', units=90,
+        )
+        # Sales older than every window are ignored
+        self.stale = make_product("SKU-STALE")
+        DailySalesSummary.objects.create(
+            date=today - timedelta(days=200), product=self.stale, payment_method='cash', units=500,
+        )
+        self.empty = make_product("SKU-EMPTY", average_cost='20.00')
+        Product.objects.filter(pk=self.selling.pk).update(quantity=3, average_cost=Decimal('10.00'))
+        Product.objects.filter(pk=self.stale.pk).update(quantity=20)
+        Product.objects.filter(pk=self.empty.pk).update(quantity=0, average_cost=Decimal('20.00'))
+
+    def lines(self, plan):
+        return {line['sku']: dict(line, supplier=group['supplier']) for group in plan['suppliers'] for line in group['lines']}
+
+    def test_plan(self):
+        plan = reorder_plan()
+        self.assertEqual(plan['products_considered'], 3)
+        lines = self.lines(plan)
+        self.assertEqual(set(lines), {"SKU-SELL", "SKU-EMPTY"})
+
+        selling = lines["SKU-SELL"]
+        self.assertEqual(selling['supplier'], "Acme")
+        self.assertEqual(selling['velocity_per_day'], 0.2)
+        self.assertEqual(selling['days_of_cover'], 15.0)
+        # ceil(0.2/day * (7 lead + 30 cover)) = 8 on hand, 3 already there
+        self.assertEqual(selling['suggested_quantity'], 5)
+        self.assertEqual(selling['order_value'], Decimal('50.00'))
+
+        # No sales: order just enough to clear the reorder level
+        empty = lines["SKU-EMPTY"]
+        self.assertEqual(empty['supplier'], UNKNOWN_SUPPLIER)
+        self.assertIsNone(empty['days_of_cover'])
+        self.assertEqual(empty['suggested_quantity'], 6)
+
+        # Groups by order value, most valuable first
+        self.assertEqual([group['supplier'] for group in plan['suppliers']], [UNKNOWN_SUPPLIER, "Acme"])
+
+    def test_include_all_sorts_by_cover(self):
+        plan = reorder_plan(lead_time_days=0, cover_days=10, include_all=True)
+        lines = self.lines(plan)
+        self.assertEqual(lines["SKU-SELL"]['suggested_quantity'], 3)
+        self.assertEqual(lines["SKU-STALE"]['suggested_quantity'], 0)
+        self.assertEqual(
+            [line['sku'] for line in plan['suppliers'][0]['lines']], ["SKU-STALE", "SKU-EMPTY"],
+        )
+
+    def test_view_and_command(self):
+        self.client.force_login(User.objects.create_user('clerk', password='secret'))
+        with query_budget(settings.QUERY_BUDGETS['reorder_plan']):
+            response = self.client.get(reverse('reorder_plan'), {'lead_time_days': 7, 'cover_days': 30})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "SKU-SELL")
+
+        out = io.StringIO()
+        call_command('reorder_plan', stdout=out)
+        self.assertIn("SKU-SELL", out.getvalue())
+        self.assertIn("3 products planned", out.getvalue())
+
+
+# ---------------------------------------------------------
+# PERIOD PROFIT & LOSS
+# ---------------------------------------------------------
+
+@PLAIN_STATIC
+class ProfitAndLossTests(TestCase):
+    TODAY = date(2026, 3, 15)
+
+    def setUp(self):
+        caches['default'].clear()
+        self.product = make_product("SKU-1")
+        self.legacy(date(2026, 1, 31), 1)
+        self.legacy(date(2026, 2, 1), 2)
+        self.live(date(2026, 2, 28), 1)
+        self.live(date(2026, 3, 1), 3)
+        today = mock.patch('django.utils.timezone.localdate', return_value=self.TODAY)
+        today.start()
+        self.addCleanup(today.stop)
+
+    def legacy(self, day, quantity):
+        HistoricalSale.objects.create(
+            date=day, sku="OLD-1", product_name="Old helmet", quantity=quantity,
+            unit_cost=Decimal('60.00'), selling_price=Decimal('100.00'),
+        )
+
+    def live(self, day, units):
+        DailySalesSummary.objects.create(
+            date=day, product=self.product, payment_method='cash', units=units,
+            revenue=Decimal('150.00') * units, cost=Decimal('100.00') * units, profit=Decimal('50.00') * units,
+        )
+
+    def series(self, report):
+        return [(str(row['period']), row['units'], row['revenue'], row['cogs']) for row in report['rows']]
+
+    def test_month_boundaries(self):
+        report = profit_and_loss('month', start=date(2026, 1, 1), end=date(2026, 3, 31))
+        self.assertEqual(self.series(report), [
+            ('2026-01-01', 1, Decimal('100.00'), Decimal('60.00')),
+            ('2026-02-01', 3, Decimal('350.00'), Decimal('220.00')),
+            ('2026-03-01', 3, Decimal('450.00'), Decimal('300.00')),
+        ])
+        self.assertEqual(report['totals']['profit'], Decimal('320.00'))
+
+    def test_week_boundaries(self):
+        # 2026-03-01 is a Sunday, the last day of the week starting 2026-02-23
+        self.live(date(2026, 3, 2), 1)
+        # ...and the open week (from Monday 2026-03-09) is computed apart from the closed ones
+        self.live(date(2026, 3, 9), 2)
+        report = profit_and_loss('week', start=date(2026, 2, 23), end=date(2026, 3, 15))
+        self.assertEqual([row[:2] for row in self.series(report)], [('2026-02-23', 4), ('2026-03-02', 1), ('2026-03-09', 2)])
+
+    def test_closed_periods_are_cached_until_reports_bump(self):
+        profit_and_loss('month', start=date(2026, 1, 1))
+        # Unsignalled writes: the open month is recomputed, closed ones are not
+        self.live(date(2026, 2, 10), 1)
+        self.live(date(2026, 3, 10), 1)
+        units = [row[1] for row in self.series(profit_and_loss('month', start=date(2026, 1, 1)))]
+        self.assertEqual(units, [1, 3, 4])
+
+        bump_now(REPORTS)
+        units = [row[1] for row in self.series(profit_and_loss('month', start=date(2026, 1, 1)))]
+        self.assertEqual(units, [1, 4, 4])
+
+    def test_default_range(self):
+        report = profit_and_loss('month')
+        self.assertEqual((report['start'], report['end']), (date(2025, 4, 1), self.TODAY))
+        self.assertEqual(profit_and_loss('day')['start'], date(2026, 2, 14))
+
+    def test_view(self):
+        self.client.force_login(User.objects.create_user('clerk', password='secret'))
+        with query_budget(settings.QUERY_BUDGETS['profit_and_loss']):
+            response = self.client.get(reverse('profit_and_loss'), {'period': 'month', 'start': '2026-01-01'})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "450.00")
+
+
+# ---------------------------------------------------------
+# REQUEST METRICS
+# ---------------------------------------------------------
+
+@PLAIN_STATIC
+class MetricsTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+        overridden = override_settings(METRICS_DIR=directory.name, METRICS_FLUSH_SECONDS=0)
+        overridden.enable()
+        self.addCleanup(overridden.disable)
+
+    def test_only_serving_processes_write_files(self):
+        command = Registry()
+        command.inc('inventory_http_requests_total', label_string(view="x", method="GET", status="2xx"))
+        command.flush(force=True)
+        self.assertEqual(list(self.directory.iterdir()), [])
+
+        # Loading the middleware marks a serving process, which has nothing to write until it has handled a request
+        server = Registry()
+        with mock.patch('inventory.metrics.registry', server):
+            MetricsMiddleware(lambda request: None)
+        self.assertTrue(server.serving)
+        server.flush(force=True)
+        self.assertEqual(list(self.directory.iterdir()), [])
+        server.inc('inventory_http_requests_total', label_string(view="x", method="GET", status="2xx"))
+        server.flush(force=True)
+        self.assertEqual([path.name for path in self.directory.iterdir()], [server.file_name])
+
+    def test_endpoint_merges_workers(self):
+        other = Registry()
+        other.serving = True
+        other.file_name = "other.json"
+        other.inc('inventory_http_requests_total', label_string(view="dashboard", method="GET", status="2xx"), 3)
+        other.flush(force=True)
+
+        # This worker, from zero
+        worker = Registry()
+        worker.serving = True
+        self.client.force_login(User.objects.create_user('clerk', password='secret'))
+        with mock.patch('inventory.metrics.registry', worker):
+            self.client.get(reverse('dashboard'))
+            response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        body = response.content.decode()
+        self.assertIn('inventory_http_requests_total{view="dashboard",method="GET",status="2xx"} 4', body)
+        self.assertIn('inventory_db_queries_per_request_count{view="dashboard"} 1', body)
+
+    def test_endpoint_needs_login_or_token(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 401)
+        with override_settings(METRICS_TOKEN="secret"):
+            response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION="Bearer secret")
+        self.assertEqual(response.status_code, 200)
+
+    def test_receivers_are_wrapped_only_when_enabled(self):
+        def receiver_function(sender, **kwargs):
+            BankAccount.objects.count()
+            return "done"
+
+        with mock.patch('inventory.instrumentation.ENABLED', False):
+            self.assertIs(instrumented(receiver_function), receiver_function)
+
+        worker = Registry()
+        with mock.patch('inventory.instrumentation.ENABLED', True), mock.patch('inventory.instrumentation.registry', worker):
+            wrapped = instrumented(receiver_function)
+            self.assertEqual(wrapped(BankAccount, instance=None), "done")
+        labels = label_string(receiver="receiver_function", sender="BankAccount")
+        snapshot = worker.snapshot()
+        self.assertEqual(snapshot['counters']['inventory_signal_receiver_calls_total'], {labels: 1})
+        self.assertEqual(snapshot['counters']['inventory_signal_receiver_queries_total'], {labels: 1})
+
+
+# ---------------------------------------------------------
+# BACKGROUND JOBS
+# ---------------------------------------------------------
+
+@PLAIN_STATIC
+class JobQueueTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('clerk', password='secret')
+        self.client.force_login(self.user)
+
+    def test_claim_takes_the_oldest_job_once(self):
+        first = enqueue('profit_and_loss', {'period': 'month'})
+        second = enqueue('profit_and_loss', {'period': 'week'})
+        self.assertEqual(claim_next("a:1"), first.pk)
+        self.assertEqual(claim_next("b:2"), second.pk)
+        self.assertIsNone(claim_next("a:1"))
+
+        first.refresh_from_db()
+        self.assertEqual((first.status, first.worker, first.attempts), (Job.RUNNING, "a:1", 1))
+
+    def test_claim_skips_a_job_another_worker_took(self):
+        taken = enqueue('profit_and_loss', {})
+        waiting = enqueue('profit_and_loss', {})
+        # Another worker claims the first job between our SELECT and UPDATE
+        update, raced = QuerySet.update, []
+
+        def racing_update(queryset, **kwargs):
+            if not raced:
+                raced.append(update(Job.objects.filter(pk=taken.pk), status=Job.RUNNING, worker="other"))
+            return update(queryset, **kwargs)
+
+        with mock.patch.object(QuerySet, 'update', racing_update):
+            self.assertEqual(claim_next("a:1"), waiting.pk)
+        self.assertEqual(Job.objects.get(pk=taken.pk).worker, "other")
+
+    def test_requeue_stale(self):
+        old = timezone.now() - timedelta(seconds=settings.JOB_STALE_AFTER + 60)
+        orphaned = enqueue('profit_and_loss', {})
+        exhausted = enqueue('profit_and_loss', {})
+        recent = enqueue('profit_and_loss', {})
+        Job.objects.filter(pk=orphaned.pk).update(status=Job.RUNNING, started_at=old, attempts=1, worker="dead:1")
+        Job.objects.filter(pk=exhausted.pk).update(status=Job.RUNNING, started_at=old, attempts=3, worker="dead:1")
+        Job.objects.filter(pk=recent.pk).update(status=Job.RUNNING, started_at=timezone.now(), attempts=1)
+
+        self.assertEqual(requeue_stale(), 2)
+        statuses = dict(Job.objects.values_list('pk', 'status'))
+        self.assertEqual(statuses, {orphaned.pk: Job.QUEUED, exhausted.pk: Job.FAILED, recent.pk: Job.RUNNING})
+        self.assertEqual(claim_next("a:2"), orphaned.pk)
+        self.assertEqual(Job.objects.get(pk=orphaned.pk).attempts, 2)
+
+    def test_run_and_download(self):
+        with mock.patch('inventory.jobs.CHUNK_SIZE', 64):
+            HistoricalSale.objects.bulk_create(
+                HistoricalSale(
+                    date=date(2025, 1, 1) + timedelta(days=number), sku="OLD-1", product_name="Old helmet",
+                    quantity=1, unit_cost=Decimal('60.00'), selling_price=Decimal('100.00'),
+                )
+                for number in range(40)
+            )
+            response = self.client.post(reverse('enqueue_profit_and_loss'), {'period': 'day', 'start': '2025-01-01', 'end': '2025-02-09'})
+            job = Job.objects.get()
+            self.assertRedirects(response, reverse('job_detail', args=[job.pk]), fetch_redirect_response=False)
+            self.assertIsNone(self.client.get(reverse('job_status', args=[job.pk])).json()['download_url'])
+
+            self.assertEqual(claim_next("a:1"), job.pk)
+            self.assertEqual(run_job(job.pk), Job.DONE)
+        self.assertGreater(JobChunk.objects.filter(job=job).count(), 1)
+
+        status = self.client.get(reverse('job_status', args=[job.pk])).json()
+        self.assertEqual((status['status'], status['progress']), (Job.DONE, 100))
+        response = self.client.get(status['download_url'])
+        rows = list(csv.reader(io.StringIO(b"".join(response.streaming_content).decode())))
+        self.assertEqual(rows[0][0], "Period")
+        self.assertEqual(len(rows), 1 + 40 + 1)
+        self.assertEqual(rows[-1][:3], ["Total", "40", "4000.00"])
+
+    def test_failed_job_keeps_no_file(self):
+        job = enqueue('export', {'kind': 'sales'})
+        claim_next("a:1")
+        failing = mock.patch.dict('inventory.jobs.HANDLERS', {'export': mock.Mock(side_effect=RuntimeError("disk full"))})
+        with failing, self.assertLogs('inventory.jobs', 'ERROR'):
+            self.assertEqual(run_job(job.pk), Job.FAILED)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.message), (Job.FAILED, "disk full"))
+        self.assertFalse(JobChunk.objects.filter(job=job).exists())
+        self.assertEqual(self.client.get(reverse('job_download', args=[job.pk])).status_code, 404)
+
+
+# ---------------------------------------------------------
+# WORKER WARM-UP
+# ---------------------------------------------------------
+
+class WarmUpTests(TestCase):
+    def test_warm_up(self):
+        timings = warm_up()
+        self.assertEqual(timings['templates'], len(list(TEMPLATE_DIR.rglob('*.html'))))
+        self.assertGreater(timings['urls'], 0)
+        self.assertEqual(timings['databases'], len(settings.DATABASES))
+
+    def test_first_request_is_reported_once(self):
+        log = mock.Mock()
+        report_first_request(log, time.perf_counter())
+        self.client.get(reverse('healthz'))
+        self.client.get(reverse('healthz'))
+        log.assert_called_once()
+        self.assertIn("First request took", log.call_args.args[0])
+
+    def test_healthz(self):
+        with query_budget(settings.QUERY_BUDGETS['healthz']):
+            response = self.client.get(reverse('healthz'))
+        self.assertEqual(response.content, b"ok\n")
+
+
+# ---------------------------------------------------------
+# BANK STATEMENT MATCHING
+# ---------------------------------------------------------
+
+@PLAIN_STATIC
+class StatementMatchingTests(TestCase):
+    STATEMENT = (
+        "date,amount,reference,description\n"
+        "2026-03-02,150.00,,Card deposit\n"
+        "2026-03-03,150.00,inv-8,Card deposit\n"
+        "2026-03-04,-90.00,StockIn  #12,Acme\n"
+        "2026-03-06,-40.00,,Cash withdrawal\n"
+        "2026-03-04,999.00,,Unknown\n"
+        "03/04/2026,1.00,,Bad date\n"
+    )
+
+    def setUp(self):
+        self.account = BankAccount.objects.create(name="Main", balance=Decimal('0.00'))
+        self.first = self.entry(date(2026, 3, 2), 'in', '150.00', "INV-7")
+        self.second = self.entry(date(2026, 3, 2), 'in', '150.00', "INV-8")
+        self.purchase = self.entry(date(2026, 3, 3), 'out', '90.00', "StockIn #12")
+        self.draw = self.entry(date(2026, 3, 5), 'out', '40.00')
+        self.old_draw = self.entry(date(2026, 3, 1), 'out', '40.00')
+        self.entry(date(2026, 3, 20), 'in', '10.00')  # outside the statement's dates
+
+    def entry(self, day, transaction_type, amount, reference=None):
+        entry = BankTransaction.objects.create(
+            bank_account=self.account, transaction_type=transaction_type, category='sale',
+            amount=Decimal(amount), reference=reference, description="Ledger",
+        )
+        BankTransaction.objects.filter(pk=entry.pk).update(
+            date=timezone.make_aware(datetime(day.year, day.month, day.day, 12))
+        )
+        return entry
+
+    def match(self, statement=STATEMENT, **options):
+        return match_statement(io.StringIO(statement), self.account, **options)
+
+    def test_reference_then_amount(self):
+        result = self.match()
+        # The reference line takes INV-8 although it comes second: the
+        # amount-only line then gets the other deposit of the same amount
+        self.assertEqual(result['matches'], [
+            (2, self.first.pk), (3, self.second.pk), (4, self.purchase.pk), (5, self.draw.pk),
+        ])
+        self.assertEqual((result['matched_by_reference'], result['matched_by_amount']), (2, 2))
+        self.assertEqual([line[0] for line in result['unmatched_statement']], [6])
+        self.assertEqual(result['unmatched_statement'][0][2], Decimal('999.00'))
+        self.assertEqual([row[0] for row in result['unmatched_ledger']], [self.old_draw.pk])
+        self.assertEqual((result['start'], result['end']), (date(2026, 2, 27), date(2026, 3, 9)))
+        self.assertEqual((result['lines'], result['error_count']), (6, 1))
+        self.assertEqual(result['errors'], [(7, "date: Enter a date as YYYY-MM-DD.")])
+
+    def test_window(self):
+        result = self.match(window_days=0)
+        self.assertEqual(result['matches'], [(2, self.first.pk)])
+        self.assertEqual([line[0] for line in result['unmatched_statement']], [3, 4, 5, 6])
+
+    def test_credit_and_debit_columns(self):
+        result = self.match("date,credit,debit\n2026-03-03,,90.00\n2026-03-05,,40.00\n")
+        self.assertEqual(result['matches'], [(2, self.purchase.pk), (3, self.draw.pk)])
+
+    def test_missing_columns(self):
+        with self.assertRaises(ImportFormatError):
+            self.match("date,reference\n2026-03-03,X\n")
+
+    def test_view(self):
+        self.client.force_login(User.objects.create_user('clerk', password='secret'))
+        with query_budget(settings.QUERY_BUDGETS['match_bank_statement']):
+            response = self.client.post(reverse('match_bank_statement'), {
+                'bank_account': self.account.pk,
+                'window_days': 3,
+                'file': SimpleUploadedFile('statement.csv', self.STATEMENT.encode(), content_type='text/csv'),
+            })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['result']['matched'], 4)
+        self.assertContains(response, "Unknown")
+
+
+# ---------------------------------------------------------
+# REPORTING DATABASE ROUTER
+# ---------------------------------------------------------
+
+class ReportingRouterTests(SimpleTestCase):
+    def setUp(self):
+        # A configured reporting database and a cache all processes share
+        for target in ('inventory.routers.reporting_configured', 'inventory.routers.is_shared'):
+            patcher = mock.patch(target, return_value=True)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.router = ReportingRouter()
+
+    def later(self, seconds):
+        return mock.patch('time.time', return_value=time.time() + seconds)
+
+    def test_primary_right_after_a_write(self):
+        bump_now(STOCK)
+        self.assertIsNone(fresh_reporting_alias())
+        with self.later(settings.REPORTING_MAX_LAG + 1):
+            self.assertEqual(fresh_reporting_alias(), REPORTING)
+            with reporting_reads() as alias:
+                self.assertEqual(alias, REPORTING)
+                self.assertEqual(self.router.db_for_read(Product), REPORTING)
+        with reporting_reads() as alias:
+            self.assertIsNone(alias)
+            self.assertIsNone(self.router.db_for_read(Product))
+
+    def test_not_configured_or_not_shared(self):
+        bump_now(STOCK)
+        with self.later(settings.REPORTING_MAX_LAG + 1):
+            with mock.patch('inventory.routers.reporting_configured', return_value=False):
+                self.assertIsNone(fresh_reporting_alias())
+            with mock.patch('inventory.routers.is_shared', return_value=False):
+                self.assertIsNone(fresh_reporting_alias())
+
+    def test_only_inventory_reads_outside_transactions(self):
+        self.assertIsNone(self.router.db_for_read(Product))
+        with reads_from(REPORTING):
+            self.assertEqual(self.router.db_for_read(Product), REPORTING)
+            self.assertIsNone(self.router.db_for_read(User))
+            self.assertEqual(self.router.db_for_write(Product), 'default')
+            # Inside a transaction on the primary, code sees its own writes
+            with mock.patch.object(connections['default'], 'in_atomic_block', True):
+                self.assertEqual(self.router.db_for_read(Product), 'default')
+        self.assertFalse(self.router.allow_migrate(REPORTING, 'inventory'))
+
+    def test_reporting_view(self):
+        view = reporting_view(lambda request: self.router.db_for_read(Product))
+        async_view = reporting_view(self.async_view)
+        bump_now(STOCK)
+        self.assertIsNone(view(None))
+        with self.later(settings.REPORTING_MAX_LAG + 1):
+            self.assertEqual(view(None), REPORTING)
+            self.assertEqual(async_to_sync(async_view)(None), REPORTING)
+
+    async def async_view(self, request):
+        return self.router.db_for_read(Product)
+
+
+# ---------------------------------------------------------
+# SALES FACT TABLE
+# ---------------------------------------------------------
+
+class SalesFactTests(TestCase):
+    def setUp(self):
+        self.shoei = make_product("SH-1", average_cost='100.00')
+        self.arai = Product.objects.create(
+            name="Arai RX-7V", sku="AR-1", brand="Arai", model="RX-7V", size="L", color="Red",
+            quantity=10, average_cost=Decimal('200.00'), selling_price=Decimal('300.00'),
+        )
+
+    def sell(self, product, quantity, price):
+        return StockOut.objects.create(product=product, quantity=quantity, selling_price=Decimal(price), payment_method='cash')
+
+    def legacy(self, day, sku, quantity=1):
+        return HistoricalSale.objects.create(
+            date=day, sku=sku, product_name="Legacy name", quantity=quantity,
+            unit_cost=Decimal('50.00'), selling_price=Decimal('80.00'),
+        )
+
+    def facts(self, source):
+        return SalesFact.objects.filter(source=source)
+
+    def test_written_with_each_sale(self):
+        sale = self.sell(self.shoei, 2, '150.00')
+        fact = self.facts(SalesFact.LIVE).get(source_id=sale.pk)
+        self.assertEqual(
+            (fact.sku, fact.brand, fact.size, fact.quantity, fact.revenue, fact.cost, fact.profit),
+            ("SH-1", "Shoei", "M", 2, Decimal('300.00'), Decimal('200.00'), Decimal('100.00')),
+        )
+        self.assertEqual(fact.month, fact.date.replace(day=1))
+
+        sale.quantity = 3
+        sale.save()
+        self.assertEqual(self.facts(SalesFact.LIVE).get(source_id=sale.pk).revenue, Decimal('450.00'))
+        sale.delete()
+        self.assertFalse(self.facts(SalesFact.LIVE).exists())
+
+        # Legacy sales borrow brand, size and color from the catalogue by SKU
+        known = self.legacy(date(2020, 5, 3), "AR-1")
+        unknown = self.legacy(date(2020, 5, 4), "GONE-1")
+        brands = dict(self.facts(SalesFact.HISTORICAL).values_list('source_id', 'brand'))
+        self.assertEqual(brands, {known.pk: "Arai", unknown.pk: ""})
+
+    def test_catalogue_edits_are_copied(self):
+        self.sell(self.arai, 1, '300.00')
+        self.legacy(date(2020, 5, 3), "AR-1")
+        self.arai.name = "Arai Quantic"
+        self.arai.color = "Blue"
+        self.arai.save()
+        self.assertEqual(
+            sorted(SalesFact.objects.values_list('source', 'product_name', 'color')),
+            [(SalesFact.HISTORICAL, "Legacy name", "Blue"), (SalesFact.LIVE, "Arai Quantic", "Blue")],
+        )
+
+    def test_backfill(self):
+        sales = [self.sell(self.shoei, 1, '150.00'), self.sell(self.arai, 1, '300.00')]
+        self.legacy(date(2020, 5, 3), "AR-1")
+        SalesFact.objects.filter(source_id=sales[1].pk, source=SalesFact.LIVE).delete()
+        SalesFact.objects.filter(source=SalesFact.HISTORICAL).delete()
+
+        self.assertEqual(backfill_sales_facts(), {SalesFact.LIVE: 1, SalesFact.HISTORICAL: 1})
+        self.assertEqual(backfill_sales_facts(), {SalesFact.LIVE: 0, SalesFact.HISTORICAL: 0})
+        self.assertEqual(SalesFact.objects.count(), 3)
+
+        # A rebuild rewrites every fact, e.g. after a bulk UPDATE bypassed the signals
+        StockOut.objects.filter(pk=sales[0].pk).update(quantity=4)
+        out = io.StringIO()
+        call_command('backfill_sales_facts', '--source', SalesFact.LIVE, '--rebuild', stdout=out)
+        self.assertIn("Wrote 2 live sales facts", out.getvalue())
+        self.assertEqual(self.facts(SalesFact.LIVE).get(source_id=sales[0].pk).quantity, 4)
+
+    def test_sales_totals(self):
+        self.sell(self.shoei, 2, '150.00')
+        self.sell(self.arai, 1, '300.00')
+        self.legacy(date(2020, 5, 3), "AR-1", quantity=3)
+        self.legacy(date(2020, 6, 30), "SH-1")
+
+        by_brand = {row['brand']: (row['units'], row['revenue']) for row in sales_totals(['brand'])}
+        self.assertEqual(by_brand, {"Arai": (4, Decimal('540.00')), "Shoei": (3, Decimal('380.00'))})
+
+        months = sales_totals(['month', 'source'], start=date(2020, 5, 3), end=date(2020, 6, 30))
+        self.assertEqual(
+            [(row['month'], row['source'], row['units']) for row in months],
+            [(date(2020, 5, 1), SalesFact.HISTORICAL, 3), (date(2020, 6, 1), SalesFact.HISTORICAL, 1)],
+        )
+        self.assertEqual([row['units'] for row in sales_totals(['size'], brand="Shoei", source=SalesFact.LIVE)], [2])
+        with self.assertRaises(ValueError):
+            sales_totals(['product_id'])
@@ -1,16 +1,40 @@
 from django.urls import path
-from . import views
+from . import views, api
 
 urlpatterns = [
     path('', views.dashboard, name='dashboard'),
     path('sales/add/', views.add_sale, name='add_sale'),
+    path('sales/checkout/', views.checkout, name='checkout'),
     path('stock/add/', views.add_stock, name='add_stock'),
+    path('stock/delivery/', views.receive_delivery, name='receive_delivery'),
+    path('products/', views.product_list, name='product_list'),
+    path('stock/reorder/', views.reorder_plan, name='reorder_plan'),
+    path('reports/pnl/', views.profit_and_loss, name='profit_and_loss'),
     path('bank/', views.bank_dashboard, name='bank_dashboard'),
+    path('cache/stats/', views.cache_stats, name='cache_stats'),
+    path('metrics', views.metrics, name='metrics'),
+    path('healthz', views.healthz, name='healthz'),
     path('bank/account/add/', views.add_bank_account, name='add_bank_account'),
     path('bank/add/', views.add_bank_transaction, name='add_bank_transaction'),
+    path('bank/reconcile/', views.reconcile_bank, name='reconcile_bank'),
+    path('bank/statement/', views.match_bank_statement, name='match_bank_statement'),
     path('owner/draw/', views.add_owner_drawing, name='add_owner_drawing'),
     path('login/', views.CustomLoginView.as_view(), name='login'),
     path('logout/', views.logout_view, name='logout'),
     path('history/', views.historical_sales_list, name='historical_sales_list'),
     path('history/add/', views.add_historical_sale, name='add_historical_sale'),
+    path('history/import/', views.import_historical_sales, name='import_historical_sales'),
+    path('lookup/products/', views.product_lookup, name='product_lookup'),
+    path('lookup/bank-accounts/', views.bank_account_lookup, name='bank_account_lookup'),
+    path('exports/', views.exports, name='exports'),
+    path('exports/<str:kind>.csv', views.export_csv, name='export_csv'),
+    path('jobs/', views.job_list, name='job_list'),
+    path('jobs/export/<str:kind>/', views.enqueue_export, name='enqueue_export'),
+    path('jobs/pnl/', views.enqueue_profit_and_loss, name='enqueue_profit_and_loss'),
+    path('jobs/<int:pk>/', views.job_detail, name='job_detail'),
+    path('jobs/<int:pk>/status/', views.job_status, name='job_status'),
+    path('jobs/<int:pk>/download/', views.job_download, name='job_download'),
+    path('api/products/', api.products, name='api_products'),
+    path('api/bank-accounts/', api.bank_accounts, name='api_bank_accounts'),
+    path('api/sales/sync/', api.sync_sales, name='api_sync_sales'),
 ]
@@ -1,11 +1,39 @@
+import asyncio
+import csv
+import functools
+import io
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, redirect, get_object_or_404
-from django.db.models import Sum, F
-from decimal import Decimal
+from django.urls import reverse
+from django.views.decorators.http import require_POST
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
+from django.db import transaction
+from django.db.models import F
 from django.contrib.auth.views import LoginView
 from django.contrib.auth import logout
 from django.contrib.auth.decorators import login_required
-from .models import Product, StockOut, StockIn, BankAccount, BankTransaction, OwnerDrawing, HistoricalSale
+from django.contrib.auth.views import redirect_to_login
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.utils.crypto import constant_time_compare
+from .models import Product, BankAccount, HistoricalSale, Job
 from .forms import SaleForm, StockInForm, BankTransactionForm, OwnerDrawingForm, HistoricalSaleForm, BankAccountForm
+from .forms import CheckoutForm, CheckoutLineFormSet, HistoricalSaleImportForm, DeliveryForm, ExportFilterForm
+from .forms import HistoricalSaleFilterForm, ReorderPlanForm, ProfitAndLossForm, BankStatementForm
+from .exports import EXPORTS, export_rows, stream_csv
+from .jobs import enqueue, read_result
+from .importers import import_historical_sales as import_csv, read_delivery_manifest, ImportFormatError
+from .reports import historical_totals, quantize_money, profit_and_loss as pnl_report
+from .reports import dashboard_totals_concurrently, bank_summary_concurrently, in_own_connection
+from .cache import acached, stats as summary_cache_stats, DASHBOARD, BANK
+from .metrics import collect as collect_metrics, render as render_metrics
+from .pagination import keyset_page
+from .lookup import search_products
+from .reconcile import reconcile_all
+from .routers import reporting_reads, reporting_view
+from .statements import match_statement, DEFAULT_WINDOW_DAYS
+from .reorder import reorder_plan as build_reorder_plan, DEFAULT_LEAD_TIME_DAYS, DEFAULT_COVER_DAYS
+from .services import InsufficientStock, checkout as checkout_cart, receive_delivery as receive_delivery_lines
 
 class CustomLoginView(LoginView):
     template_name = 'inventory/login.html'
@@ -14,71 +42,157 @@ def logout_view(request):
     logout(request)
     return redirect('login')
 
+def async_login_required(view):
+    """
+    login_required for async views (Django 4.2's decorator is sync-only).
+    The session and user are loaded in a thread, as they hit the database.
+    """
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if not await sync_to_async(lambda: request.user.is_authenticated)():
+            return redirect_to_login(request.get_full_path())
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+DASHBOARD_LOW_STOCK_LIMIT = 20
+
+PRODUCT_LIST_FIELDS = ('name', 'sku', 'brand', 'size', 'color', 'quantity', 'reorder_level')
+
+@async_login_required
+@reporting_view
+async def dashboard(request):
+    # All summary numbers are aggregated by the database, each table
+    # concurrently on its own connection, and cached until the next
+    # write (see inventory/cache.py). Meanwhile the emptiest low-stock
+    # products load; the whole catalogue is on the product list.
+    low_stock = (
+        Product.objects.filter(quantity__lte=F('reorder_level'))
+        .only(*PRODUCT_LIST_FIELDS)
+        .order_by('quantity', 'pk')[:DASHBOARD_LOW_STOCK_LIMIT + 1]
+    )
+    totals, products = await asyncio.gather(
+        acached(DASHBOARD, 'totals', dashboard_totals_concurrently),
+        in_own_connection(list)(low_stock),
+    )
+    context = dict(totals)
+    context['products'] = products[:DASHBOARD_LOW_STOCK_LIMIT]
+    context['more_low_stock'] = len(products) > DASHBOARD_LOW_STOCK_LIMIT
+
+    return await sync_to_async(render)(request, 'inventory/dashboard.html', context)
+
+@async_login_required
+@reporting_view
+async def bank_dashboard(request):
+    summary = await acached(BANK, 'summary', bank_summary_concurrently)
+
+    return await sync_to_async(render)(request, 'inventory/bank_dashboard.html', {
+        'accounts': summary['accounts'],
+        'recent_transactions': summary['recent_transactions'],
+        'total_balance': summary['total_balance']
+    })
+
 @login_required
-def dashboard(request):
-    products = Product.objects.all()
-    sales = StockOut.objects.all()
-    try:
-        stock_ins = StockIn.objects.all()
-    except Exception:
-        stock_ins = []
-    
-    # Bank Summary
-    bank_accounts = BankAccount.objects.all()
-    total_bank_balance = sum(acc.balance for acc in bank_accounts)
-    
-    # Owner Drawings
-    drawings = OwnerDrawing.objects.all()
-    total_drawings = sum(d.amount for d in drawings)
+@reporting_view
+def reorder_plan(request):
+    """
+    Suggested purchase orders per supplier, from recent sales velocity.
+    """
+    form = ReorderPlanForm(request.GET or None)
+    options = {key: value for key, value in form.cleaned_data.items() if value is not None} if form.is_valid() else {}
+    plan = build_reorder_plan(
+        lead_time_days=options.get('lead_time_days', DEFAULT_LEAD_TIME_DAYS),
+        cover_days=options.get('cover_days', DEFAULT_COVER_DAYS),
+        include_all=options.get('show_all', False),
+    )
+    return render(request, 'inventory/reorder_plan.html', {'form': form if form.is_bound else ReorderPlanForm(), 'plan': plan})
 
-    # Historical / Legacy Data
-    sales_hist = HistoricalSale.objects.all()
-    total_historical_sales = sum(s.total_revenue for s in sales_hist)
-    total_historical_profit = sum(s.profit for s in sales_hist)
+@login_required
+@reporting_view
+def profit_and_loss(request):
+    """
+    Revenue, COGS and profit per month/week/day, live and legacy sales combined.
+    """
+    form = ProfitAndLossForm(request.GET or None)
+    options = form.cleaned_data if form.is_valid() else {}
+    report = pnl_report(
+        period=options.get('period') or 'month',
+        start=options.get('start'),
+        end=options.get('end'),
+    )
+    return render(request, 'inventory/profit_and_loss.html', {'form': form if form.is_bound else ProfitAndLossForm(), 'report': report})
 
-    total_products = products.count()
-    
-    total_stock = sum(p.quantity for p in products)
-    total_inventory_value = sum(p.quantity * p.average_cost for p in products)
-    
-    # Check if stock_ins exist to avoid error if empty
-    if stock_ins:
-        total_inventory_added = sum(s.quantity for s in stock_ins)
-    else:
-        total_inventory_added = 0
-    
-    total_sales = sum(s.total_sale() for s in sales)
-    total_profit = sum(s.profit() for s in sales)
-
-    context = {
-        'products': products,
-        'total_products': total_products,
-        'total_stock': total_stock,
-        'total_inventory_value': total_inventory_value,
-        'total_inventory_added': total_inventory_added,
-        'total_sales': total_sales,
-        'total_profit': total_profit,
-        'bank_accounts': bank_accounts,
-        'total_bank_balance': total_bank_balance,
-        'total_drawings': total_drawings,
-        'total_historical_sales': total_historical_sales,
-        'total_historical_profit': total_historical_profit,
-    }
+@login_required
+def cache_stats(request):
+    """
+    Hit/miss counters of the summary cache, to check the hit ratio.
+    """
+    return JsonResponse(summary_cache_stats())
+
+def healthz(request):
+    """
+    Liveness probe for the load balancer: no session, no database.
+    """
+    return HttpResponse("ok\n", content_type='text/plain')
 
-    return render(request, 'inventory/dashboard.html', context)
+def metrics(request):
+    """
+    Per-view request metrics of all workers, in Prometheus text format.
+    Open to logged-in users, or to scrapers sending the METRICS_TOKEN.
+    """
+    token = settings.METRICS_TOKEN
+    authorization = request.headers.get('Authorization', '')
+    if not request.user.is_authenticated and not (
+        token and constant_time_compare(authorization, f"Bearer {token}")
+    ):
+        response = HttpResponse("Authentication required\n", status=401, content_type='text/plain')
+        response['WWW-Authenticate'] = 'Bearer'
+        return response
+    return HttpResponse(render_metrics(collect_metrics()), content_type='text/plain; version=0.0.4; charset=utf-8')
 
 @login_required
-def bank_dashboard(request):
-    accounts = BankAccount.objects.all()
-    # Get recent transactions
-    recent_transactions = BankTransaction.objects.select_related('bank_account').order_by('-date')[:50]
-    
-    total_balance = sum(a.balance for a in accounts)
+def reconcile_bank(request):
+    """
+    GET: verify every balance against its last checkpoint.
+    POST (repair=1, checkpoint=1): also fix mismatches / save new checkpoints.
+    """
+    if request.method == 'POST':
+        results = reconcile_all(
+            repair=request.POST.get('repair') == '1',
+            checkpoint=request.POST.get('checkpoint') == '1',
+        )
+    else:
+        results = reconcile_all()
+    return JsonResponse({'accounts': results, 'ok': all(result['ok'] for result in results)})
+
+@login_required
+def match_bank_statement(request):
+    """
+    Match an uploaded bank statement against an account's ledger and
+    list what is unmatched on either side.
+    """
+    result = None
+    if request.method == 'POST':
+        form = BankStatementForm(request.POST, request.FILES)
+        if form.is_valid():
+            stream = io.TextIOWrapper(form.cleaned_data['file'].file, encoding='utf-8-sig', newline='')
+            window_days = form.cleaned_data['window_days']
+            try:
+                result = match_statement(
+                    stream,
+                    form.cleaned_data['bank_account'],
+                    window_days=DEFAULT_WINDOW_DAYS if window_days is None else window_days,
+                )
+            except (ImportFormatError, UnicodeDecodeError, csv.Error) as exc:
+                form.add_error('file', str(exc))
+    else:
+        form = BankStatementForm(initial={'window_days': DEFAULT_WINDOW_DAYS})
 
-    return render(request, 'inventory/bank_dashboard.html', {
-        'accounts': accounts,
-        'recent_transactions': recent_transactions,
-        'total_balance': total_balance
+    return render(request, 'inventory/bank_statement.html', {
+        'form': form,
+        'result': result,
+        'shown_statement': result['unmatched_statement'][:100] if result else [],
+        'shown_ledger': result['unmatched_ledger'][:100] if result else [],
+        'shown_errors': result['errors'][:100] if result else [],
     })
 
 @login_required
@@ -119,41 +233,172 @@ def add_sale(request):
     if request.method == 'POST':
         form = SaleForm(request.POST)
         if form.is_valid():
-            form.save()  # signals will auto-update stock
-            return redirect('dashboard')
+            # Sale, stock, rollup and bank entries commit together
+            try:
+                with transaction.atomic():
+                    form.save()  # signals will auto-update stock
+            except InsufficientStock:
+                # Another till sold the remaining units after validation
+                form.add_error('quantity', "Not enough stock left for this sale.")
+            else:
+                return redirect('dashboard')
     else:
         form = SaleForm()
 
     return render(request, 'inventory/add_sale.html', {'form': form})
 
+@login_required
+def checkout(request):
+    """
+    Multi-item cart: one receipt, one stock update, one bank deposit.
+    """
+    if request.method == 'POST':
+        form = CheckoutForm(request.POST)
+        formset = CheckoutLineFormSet(request.POST, prefix='lines')
+        if form.is_valid() and formset.is_valid():
+            try:
+                checkout_cart(
+                    formset.lines,
+                    payment_method=form.cleaned_data['payment_method'],
+                    bank_account=form.cleaned_data['bank_account'],
+                    reference=form.cleaned_data['reference'],
+                )
+            except InsufficientStock:
+                # Another till sold the remaining units after validation
+                form.add_error(None, "Stock changed while checking out. Please review the cart.")
+            else:
+                return redirect('dashboard')
+    else:
+        form = CheckoutForm()
+        formset = CheckoutLineFormSet(prefix='lines')
+
+    return render(request, 'inventory/checkout.html', {'form': form, 'formset': formset})
+
 @login_required
 def add_stock(request):
     if request.method == 'POST':
         form = StockInForm(request.POST)
         if form.is_valid():
-            form.save()  # signals increase stock
+            with transaction.atomic():
+                form.save()  # signals increase stock
             return redirect('dashboard')
     else:
         form = StockInForm()
 
     return render(request, 'inventory/add_stock.html', {'form': form})
 
+@login_required
+def receive_delivery(request):
+    """
+    Receive a supplier manifest in one pass: one product update,
+    one StockIn insert and one bank debit for the whole delivery.
+    """
+    errors = []
+    if request.method == 'POST':
+        form = DeliveryForm(request.POST, request.FILES)
+        if form.is_valid():
+            stream = io.TextIOWrapper(form.cleaned_data['file'].file, encoding='utf-8-sig', newline='')
+            try:
+                lines, errors = read_delivery_manifest(stream)
+            except (ImportFormatError, UnicodeDecodeError, csv.Error) as exc:
+                form.add_error('file', str(exc))
+            else:
+                if not lines and not errors:
+                    form.add_error('file', "The manifest has no lines.")
+                elif not errors:
+                    try:
+                        receive_delivery_lines(
+                            lines,
+                            supplier=form.cleaned_data['supplier'],
+                            bank_account=form.cleaned_data['bank_account'],
+                        )
+                    except ValidationError as exc:
+                        form.add_error('file', exc)
+                    else:
+                        return redirect('dashboard')
+    else:
+        form = DeliveryForm()
+
+    return render(request, 'inventory/receive_delivery.html', {'form': form, 'errors': errors[:100], 'error_count': len(errors)})
+
+# ---------------------------------------------------------
+# AUTOCOMPLETE LOOKUPS
+# ---------------------------------------------------------
+
+LOOKUP_LIMIT = 20
+
+@login_required
+def product_lookup(request):
+    """
+    Prefix search over sku / name / brand / model, served from the
+    in-process index (see inventory/lookup.py).
+    """
+    return JsonResponse({'results': search_products(request.GET.get('q', ''), LOOKUP_LIMIT)})
+
+@login_required
+def bank_account_lookup(request):
+    accounts = BankAccount.objects.filter(name__icontains=request.GET.get('q', '').strip()).order_by('name')
+    return JsonResponse({'results': [
+        {'id': pk, 'text': name} for pk, name in accounts.values_list('pk', 'name')[:LOOKUP_LIMIT]
+    ]})
+
 # ---------------------------------------------------------
 # HISTORICAL / LEGACY SALES
 # ---------------------------------------------------------
 
+HISTORICAL_SALES_PAGE_SIZE = 50
+
 
 @login_required
+@reporting_view
 def historical_sales_list(request):
-    sales = HistoricalSale.objects.order_by('-date')
-    
-    total_revenue = sum(s.total_revenue for s in sales)
-    total_profit = sum(s.profit for s in sales)
-    
+    sales = HistoricalSale.objects.all()
+
+    filter_form = HistoricalSaleFilterForm(request.GET)
+    if filter_form.is_valid():
+        sales = filter_form.filter(sales)
+
+    # Keyset pagination on (date, id): every page is an index range scan
+    page = keyset_page(
+        sales,
+        ('date', 'id'),
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+        size=HISTORICAL_SALES_PAGE_SIZE,
+    )
+    totals = quantize_money(historical_totals(sales))
+
+    # Keep the filters when following next/previous links
+    filters = request.GET.copy()
+    filters.pop('after', None)
+    filters.pop('before', None)
+
     return render(request, 'inventory/historical_sales_list.html', {
-        'sales': sales,
-        'total_revenue': total_revenue,
-        'total_profit': total_profit,
+        'sales': page['items'],
+        'next_cursor': page['next_cursor'],
+        'prev_cursor': page['prev_cursor'],
+        'filter_form': filter_form,
+        'filter_query': filters.urlencode(),
+        'total_revenue': totals['total_historical_sales'],
+        'total_profit': totals['total_historical_profit'],
+    })
+
+PRODUCT_LIST_PAGE_SIZE = 50
+
+@login_required
+def product_list(request):
+    # Keyset pagination on id, newest products first
+    page = keyset_page(
+        Product.objects.only(*PRODUCT_LIST_FIELDS),
+        ('id',),
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+        size=PRODUCT_LIST_PAGE_SIZE,
+    )
+    return render(request, 'inventory/product_list.html', {
+        'products': page['items'],
+        'next_cursor': page['next_cursor'],
+        'prev_cursor': page['prev_cursor'],
     })
 
 @login_required
@@ -168,3 +413,132 @@ def add_historical_sale(request):
     
     return render(request, 'inventory/add_historical_sale.html', {'form': form})
 
+
+@login_required
+def import_historical_sales(request):
+    result = None
+    if request.method == 'POST':
+        form = HistoricalSaleImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            # Read the upload as text without loading it into memory
+            stream = io.TextIOWrapper(form.cleaned_data['file'].file, encoding='utf-8-sig', newline='')
+            try:
+                result = import_csv(stream, batch_size=form.cleaned_data['batch_size'])
+            except (ImportFormatError, UnicodeDecodeError, csv.Error) as exc:
+                form.add_error('file', str(exc))
+    else:
+        form = HistoricalSaleImportForm()
+
+    return render(request, 'inventory/import_historical_sales.html', {
+        'form': form,
+        'result': result,
+        'shown_errors': result['errors'][:100] if result else [],
+    })
+
+# ---------------------------------------------------------
+# EXPORTS
+# ---------------------------------------------------------
+
+@login_required
+def exports(request):
+    return render(request, 'inventory/exports.html', {
+        'form': ExportFilterForm(),
+        'job_form': ExportFilterForm(prefix='job'),
+    })
+
+@login_required
+def export_csv(request, kind):
+    """
+    Stream one export as CSV, filtered by ?start=&end=&account=.
+    """
+    if kind not in EXPORTS:
+        raise Http404("Unknown export")
+    form = ExportFilterForm(request.GET)
+    if not form.is_valid():
+        return HttpResponseBadRequest(form.errors.as_text())
+
+    # The rows are read while streaming, after the view has returned,
+    # so the reporting database (if fresh) is pinned here
+    with reporting_reads() as alias:
+        rows = export_rows(kind, form.cleaned_data['start'], form.cleaned_data['end'], form.cleaned_data['account'], using=alias)
+    response = StreamingHttpResponse(stream_csv(rows), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{kind}.csv"'
+    return response
+
+# ---------------------------------------------------------
+# BACKGROUND JOBS
+# ---------------------------------------------------------
+# Run by: python manage.py run_worker
+
+JOB_LIST_SIZE = 50
+
+def user_jobs(request):
+    return Job.objects.filter(created_by=request.user)
+
+def job_payload(job):
+    return {
+        'id': job.pk,
+        'kind': job.kind,
+        'status': job.status,
+        'progress': job.progress,
+        'message': job.message,
+        'created_at': job.created_at,
+        'finished_at': job.finished_at,
+        'download_url': reverse('job_download', args=[job.pk]) if job.status == Job.DONE else None,
+    }
+
+@login_required
+@require_POST
+def enqueue_export(request, kind):
+    if kind not in EXPORTS:
+        raise Http404("Unknown export")
+    form = ExportFilterForm(request.POST, prefix='job')
+    if not form.is_valid():
+        return HttpResponseBadRequest(form.errors.as_text())
+    data = form.cleaned_data
+    job = enqueue('export', {
+        'kind': kind,
+        'start': data['start'].isoformat() if data['start'] else None,
+        'end': data['end'].isoformat() if data['end'] else None,
+        'account': data['account'].pk if data['account'] else None,
+    }, request.user)
+    return redirect('job_detail', pk=job.pk)
+
+@login_required
+@require_POST
+def enqueue_profit_and_loss(request):
+    form = ProfitAndLossForm(request.POST)
+    if not form.is_valid():
+        return HttpResponseBadRequest(form.errors.as_text())
+    data = form.cleaned_data
+    job = enqueue('profit_and_loss', {
+        'period': data['period'] or 'month',
+        'start': data['start'].isoformat() if data['start'] else None,
+        'end': data['end'].isoformat() if data['end'] else None,
+    }, request.user)
+    return redirect('job_detail', pk=job.pk)
+
+@login_required
+def job_list(request):
+    jobs = user_jobs(request).order_by('-created_at')[:JOB_LIST_SIZE]
+    return render(request, 'inventory/jobs.html', {'jobs': jobs})
+
+@login_required
+def job_detail(request, pk):
+    job = get_object_or_404(user_jobs(request), pk=pk)
+    return render(request, 'inventory/job_detail.html', {'job': job})
+
+@login_required
+def job_status(request, pk):
+    """
+    Progress of one job, for polling.
+    """
+    job = get_object_or_404(user_jobs(request), pk=pk)
+    return JsonResponse(job_payload(job))
+
+@login_required
+def job_download(request, pk):
+    job = get_object_or_404(Job.objects.filter(created_by=request.user, status=Job.DONE), pk=pk)
+    response = StreamingHttpResponse(read_result(job), content_type=job.content_type)
+    response['Content-Disposition'] = f'attachment; filename="{job.result_name}"'
+    return response
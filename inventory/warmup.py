@@ -0,0 +1,109 @@
+import time
+from pathlib import Path
+from django.core.signals import request_started, request_finished
+from django.db import connections
+from django.template.loader import get_template
+from django.urls import get_resolver, reverse
+
+# ---------------------------------------------------------
+# WORKER WARM-UP
+# ---------------------------------------------------------
+# On the free Render plan the service sleeps when idle, so the first
+# request after a wake-up used to pay for importing the views, compiling
+# the templates and connecting to the database (TLS handshake included).
+# gunicorn.conf.py calls warm_up() in every freshly forked worker so that
+# work is done before the worker accepts traffic, and
+# report_first_request() to log how long the first real request still took.
+
+TEMPLATE_DIR = Path(__file__).with_name('templates')
+
+
+def load_urls():
+    """
+    Import the URLconf (and with it every view module) and build the
+    resolver's lookup tables, both of which Django defers to the first request.
+    """
+    reverse('dashboard')
+    return len(get_resolver().reverse_dict)
+
+
+def precompile_templates():
+    """
+    Load every inventory template, so the cached template loader holds
+    them compiled. Returns how many were loaded.
+    """
+    names = sorted(
+        path.relative_to(TEMPLATE_DIR).as_posix()
+        for path in TEMPLATE_DIR.rglob('*.html')
+    )
+    for name in names:
+        get_template(name)
+    return len(names)
+
+
+def open_connections():
+    """
+    Connect to every configured database and run a trivial query, so the
+    connection (persistent, see CONN_MAX_AGE) is ready for the first request.
+    """
+    for connection in connections.all():
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+    return len(connections.all())
+
+
+def timed(function):
+    started = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - started
+
+
+def warm_up(keep_connections=True):
+    """
+    Returns {'urls': count, 'urls_seconds': ..., 'templates': count, 'templates_seconds': ..., 'databases': count, 'database_seconds': ...}.
+
+    Connections belong to the thread that opened them. Unless requests
+    are served on this thread (gunicorn's sync worker), a connection
+    opened here cannot be reused: pass keep_connections=False to close
+    it again, which still pays the one-time driver setup before traffic
+    arrives.
+    """
+    urls, urls_seconds = timed(load_urls)
+    templates, templates_seconds = timed(precompile_templates)
+    databases, database_seconds = timed(open_connections)
+    if not keep_connections:
+        connections.close_all()
+    return {
+        'urls': urls,
+        'urls_seconds': urls_seconds,
+        'templates': templates,
+        'templates_seconds': templates_seconds,
+        'databases': databases,
+        'database_seconds': database_seconds,
+    }
+
+
+def report_first_request(log, booted_at):
+    """
+    Log the duration of this worker's first request, and how long after
+    boot (a time.perf_counter() value) it finished.
+    """
+    started = []
+
+    def on_started(sender, **kwargs):
+        if not started:
+            started.append(time.perf_counter())
+
+    def on_finished(sender, **kwargs):
+        if not started:
+            return
+        finished = time.perf_counter()
+        request_started.disconnect(dispatch_uid='warmup-first-request-started')
+        request_finished.disconnect(dispatch_uid='warmup-first-request-finished')
+        log(
+            f"First request took {(finished - started[0]) * 1000:.1f} ms "
+            f"({finished - booted_at:.2f} s after the worker booted)"
+        )
+
+    request_started.connect(on_started, weak=False, dispatch_uid='warmup-first-request-started')
+    request_finished.connect(on_finished, weak=False, dispatch_uid='warmup-first-request-finished')
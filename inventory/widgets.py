@@ -0,0 +1,32 @@
+from django import forms
+from django.urls import reverse
+
+class AutocompleteSelect(forms.Widget):
+    """
+    Search-as-you-type replacement for a <select>.
+    Renders a hidden input holding the chosen id and a text box that
+    queries a JSON lookup endpoint, so the page never lists every option.
+    """
+    template_name = 'inventory/widgets/autocomplete.html'
+
+    class Media:
+        js = ('inventory/autocomplete.js',)
+
+    def __init__(self, url_name, model, attrs=None):
+        super().__init__(attrs)
+        self.url_name = url_name
+        self.model = model
+
+    def label_for(self, value):
+        # Only needed when re-displaying a submitted form: one row by primary key
+        obj = self.model._default_manager.filter(pk=value).first() if str(value).isdigit() else None
+        return str(obj) if obj else ''
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        context['widget']['url'] = reverse(self.url_name)
+        context['widget']['label'] = self.label_for(value) if value not in (None, '') else ''
+        return context
+
+    def format_value(self, value):
+        return '' if value is None else str(value)
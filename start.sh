@@ -0,0 +1,19 @@
+#!/usr/bin/env bash
+# Start command of the Render web service: the job worker and gunicorn
+# share the one (free) instance.
+set -o errexit
+
+# Queued exports and reports (inventory/jobs.py) run in one pool process
+# next to the web workers, restarted if it stops. Set JOB_WORKER=off when
+# a separate worker service runs them instead (see render.yaml).
+if [ "${JOB_WORKER:-on}" != "off" ]; then
+    echo "Starting the job worker..."
+    (
+        while true; do
+            python manage.py run_worker --processes "${JOB_WORKER_PROCESSES:-1}" || true
+            sleep 5
+        done
+    ) &
+fi
+
+exec gunicorn -c gunicorn.conf.py helmet_inventory.wsgi:application